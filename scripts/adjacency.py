@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from spatial_index import join_within
+from parallel_join import parallel_join_within
+from stage_cache import evict
+
+
+# Where the CLI and pipeline persist the stop x crash matrices, one .npz per (crashes, stops, radius)
+ADJACENCY_DIR = 'data/adjacency'
+ADJACENCY_MAX_BYTES = 1024 ** 3
+
+
+def adjacency_key(crashes_xy, stops_xy, radius_ft):
+    """Key a matrix on the exact projected coordinates and radius it was built from."""
+    digest = hashlib.sha256()
+    for points_xy in (crashes_xy, stops_xy):
+        points_xy = np.ascontiguousarray(points_xy, dtype='float64')
+        digest.update(str(points_xy.shape).encode())
+        digest.update(points_xy.tobytes())
+    digest.update(repr(float(radius_ft)).encode())
+    return digest.hexdigest()[:32]
+
+
+def build_adjacency(crashes_xy, stops_xy, radius_ft, workers=None):
+    """Sparse CSR matrix with a row per stop and a column per crash, holding the distance in feet.
+
+    Every pair within `radius_ft` is stored, including crashes exactly on a stop (an explicit zero),
+    so the sparsity structure, not the values, says which pairs match.
+    """
+    if workers is None:
+        pairs = join_within(crashes_xy, stops_xy, radius_ft)
+    else:
+        pairs = parallel_join_within(crashes_xy, stops_xy, radius_ft, workers=workers)
+    # Sort by stop then crash so the CSR arrays can be filled directly, without summing duplicates
+    # (which would also drop the explicit zeros)
+    order = np.lexsort((pairs['crash_index'].to_numpy(), pairs['stop_index'].to_numpy()))
+    stop_index = pairs['stop_index'].to_numpy()[order]
+    indptr = np.zeros(len(stops_xy) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(stop_index, minlength=len(stops_xy)), out=indptr[1:])
+    return sparse.csr_matrix(
+        (pairs['distance_ft'].to_numpy()[order], pairs['crash_index'].to_numpy()[order], indptr),
+        shape=(len(stops_xy), len(crashes_xy))
+    )
+
+
+def load_adjacency(crashes_xy, stops_xy, radius_ft, workers=None, adjacency_dir=None,
+                   max_bytes=ADJACENCY_MAX_BYTES):
+    """Build the matrix for these points and radius, or with `adjacency_dir` reuse the one persisted there.
+
+    Without `adjacency_dir` nothing is written. Like the stage cache, the least recently used matrices
+    are deleted once the directory passes `max_bytes`.
+    """
+    if adjacency_dir is None:
+        return build_adjacency(crashes_xy, stops_xy, radius_ft, workers=workers)
+
+    path = os.path.join(adjacency_dir, f"adjacency-{adjacency_key(crashes_xy, stops_xy, radius_ft)}.npz")
+    if os.path.exists(path):
+        # Touch the matrix so eviction sees it as recently used
+        os.utime(path)
+        return sparse.load_npz(path)
+
+    adjacency = build_adjacency(crashes_xy, stops_xy, radius_ft, workers=workers)
+    os.makedirs(adjacency_dir, exist_ok=True)
+    # A temp file per writer, so concurrent builds of the same key cannot clobber each other before the rename
+    with tempfile.NamedTemporaryFile(dir=adjacency_dir, suffix='.tmp', delete=False) as f:
+        sparse.save_npz(f, adjacency, compressed=False)
+    os.replace(f.name, path)
+    evict(adjacency_dir, max_bytes, suffix='.npz')
+    return adjacency
+
+
+# ----------------------------
+# Per-stop metrics
+# ----------------------------
+def indicator(adjacency):
+    """The same structure with a 1 for every matched pair (distances ignored)."""
+    return sparse.csr_matrix(
+        (np.ones(adjacency.nnz), adjacency.indices, adjacency.indptr), shape=adjacency.shape
+    )
+
+
+def stop_counts(adjacency):
+    """Number of crashes matched to every stop."""
+    return np.diff(adjacency.indptr)
+
+
+def stop_sums(adjacency, values):
+    """Sum of any per-crash column(s) over the crashes matched to every stop, as one sparse product.
+
+    `values` is a vector or an (n_crashes, k) matrix (a DataFrame works too; gaps count as 0).
+    """
+    values = np.nan_to_num(np.asarray(values, dtype='float64'))
+    return indicator(adjacency) @ values
+
+
+def pairs(adjacency):
+    """The matched pairs as join_within returns them: crash_index, stop_index, distance_ft by crash then stop."""
+    stop_index = np.repeat(np.arange(adjacency.shape[0]), stop_counts(adjacency))
+    crash_index = adjacency.indices.astype(np.int64)
+    order = np.lexsort((stop_index, crash_index))
+    return pd.DataFrame({
+        'crash_index': crash_index[order],
+        'stop_index': stop_index[order],
+        'distance_ft': adjacency.data[order]
+    })
+
+
+def nearest_stops(adjacency):
+    """For every matched crash, the closest stop within the radius and its distance (ties go to the first stop)."""
+    matched = pairs(adjacency)
+    order = np.lexsort((matched['stop_index'].to_numpy(), matched['distance_ft'].to_numpy(), matched['crash_index'].to_numpy()))
+    matched = matched.iloc[order]
+    return matched[~matched['crash_index'].duplicated()].reset_index(drop=True)
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from adjacency import ADJACENCY_DIR
+from crash_store import read_crashes, read_bus_stops, source_digest
+from pipeline import AGGREGATE_COLUMNS
+from ranking import top_k
+
+
+# Fixed dtype of every exported array; names match the cleaned crash frame so a dict of arrays can
+# stand in for it in pipeline.join / pipeline.aggregate and the proximity functions
+ARRAY_DTYPES = {
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'x_ft': np.float64,
+    'y_ft': np.float64,
+    **{column: np.int16 for column in AGGREGATE_COLUMNS},
+    'crash_date': 'datetime64[D]'
+}
+
+# Describes the arrays and the CSV they were built from
+MANIFEST = 'manifest.json'
+
+
+def array_path(crash_file):
+    """Return the array directory that belongs to a crash CSV."""
+    return os.path.splitext(crash_file)[0] + '.arrays'
+
+
+def _file_name(column):
+    return column.replace(' ', '_') + '.npy'
+
+
+def arrays_exist(crash_file):
+    """Check whether arrays were exported from exactly this crash CSV."""
+    manifest_file = os.path.join(array_path(crash_file), MANIFEST)
+    if not os.path.isfile(manifest_file):
+        return False
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    return manifest.get('sha256') == source_digest(crash_file) and set(manifest['columns']) == set(ARRAY_DTYPES)
+
+
+def export_arrays(crash_file):
+    """Write the located crashes as one fixed-dtype .npy file per column (coordinates, x/y, counts, date)."""
+    crashes = read_crashes(crash_file, columns=['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft', 'CRASH DATE'] + AGGREGATE_COLUMNS)
+    # Same rows as pipeline.clean_data keeps, so positions line up with the cleaned frame
+    crashes, _ = pipeline.clean_data(crashes, pd.DataFrame(columns=['Latitude', 'Longitude']))
+    crashes['crash_date'] = pd.to_datetime(crashes['CRASH DATE'], format='%m/%d/%Y', errors='coerce')
+
+    output_dir = array_path(crash_file)
+    tmp_dir = output_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for column, dtype in ARRAY_DTYPES.items():
+        values = crashes[column]
+        if column in AGGREGATE_COLUMNS:
+            values = values.fillna(0)
+        np.save(os.path.join(tmp_dir, _file_name(column)), values.to_numpy().astype(dtype))
+
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump({
+            'source': os.path.basename(crash_file),
+            'sha256': source_digest(crash_file),
+            'rows': len(crashes),
+            'columns': {column: np.dtype(dtype).str for column, dtype in ARRAY_DTYPES.items()}
+        }, f, indent=2)
+
+    # Swap the finished directory in place so readers never see half an export
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    print(f"{len(crashes)} crashes exported to '{output_dir}'.")
+    return output_dir
+
+
+def load_arrays(crash_file, columns=None):
+    """Open the exported arrays read-only with mmap_mode='r', exporting them first if missing or stale.
+
+    Returns {column: array}. Nothing is read until it is touched, and every process that maps the
+    same files shares the operating system's page-cached copy.
+    """
+    if not arrays_exist(crash_file):
+        export_arrays(crash_file)
+    output_dir = array_path(crash_file)
+    columns = list(ARRAY_DTYPES) if columns is None else list(columns)
+    return {column: np.load(os.path.join(output_dir, _file_name(column)), mmap_mode='r') for column in columns}
+
+
+def run_arrays(crash_file, bus_stop_file, radius_ft=150, top_n=10, workers=None, adjacency_dir=ADJACENCY_DIR):
+    """pipeline.run_pipeline over the memory-mapped arrays: same result dict, no crash frame is built."""
+    crashes = load_arrays(crash_file, ['x_ft', 'y_ft'] + AGGREGATE_COLUMNS)
+    _, bus_stops = pipeline.clean_data(pd.DataFrame(columns=['LATITUDE', 'LONGITUDE']), read_bus_stops(bus_stop_file))
+    _, bus_stops = pipeline.project(pd.DataFrame(columns=['longitude', 'latitude']), bus_stops)
+
+    aggregates = pipeline.aggregate(crashes, bus_stops, pipeline.join(crashes, bus_stops, radius_ft, workers, adjacency_dir))
+    total_bus_stops = len(aggregates)
+    bus_stops_with_accidents = int(aggregates['has_accident'].sum())
+    return {
+        'aggregates': aggregates,
+        'top_stops': top_k(aggregates, metric='crash_count', k=top_n),
+        'summary': {
+            'total_crashes': len(crashes['x_ft']),
+            'total_bus_stops': total_bus_stops,
+            'bus_stops_with_accidents': bus_stops_with_accidents,
+            'bus_stops_without_accidents': total_bus_stops - bus_stops_with_accidents
+        }
+    }
+
+
+def main():
+    # File paths
+    crash_file = sys.argv[1] if len(sys.argv) > 1 else 'data/crash_collisions.csv'
+
+    # Export (or refresh) the arrays
+    export_arrays(crash_file)
+
+
+if __name__ == "__main__":
+    main()
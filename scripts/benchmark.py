@@ -0,0 +1,174 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import folium
+
+import pipeline
+from crash_store import ingest_crashes
+from pipeline import AGGREGATE_COLUMNS
+from synthetic_data import SIZES, SYNTHETIC_DIR, write_synthetic_data
+from bus_stop_accident_analysis import calculate_accidents_near_bus_stops
+from nyc_crashes_bus_stops import calculate_bus_stop_injury_distribution
+from grid_layer import add_crash_grid_layer
+from generate_heatmap import create_heatmap
+
+
+# Where result files are written
+RESULTS_DIR = 'outputs/benchmarks'
+
+# Sizes run when none are given (10M takes a while; ask for it explicitly)
+DEFAULT_SIZES = ['10k', '100k', '1M']
+
+# Crash columns loaded for the benchmarked stages
+CRASH_COLUMNS = pipeline.CRASH_COLUMNS + AGGREGATE_COLUMNS + ['NUMBER OF PERSONS INJURED', 'NUMBER OF PERSONS KILLED']
+
+
+def measure(func, *args, memory=True):
+    """Run `func` once for wall time and, with `memory`, once more under tracemalloc for its peak.
+
+    tracemalloc slows Python allocations down a lot, so time and memory come from separate runs.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    stats = {'seconds': round(time.perf_counter() - start, 4)}
+
+    if memory:
+        tracemalloc.start()
+        try:
+            func(*args)
+            stats['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+
+def _rows(value):
+    """Row count of a stage output, for frames, tuples of frames and arrays."""
+    if isinstance(value, tuple):
+        return [_rows(item) for item in value]
+    if hasattr(value, '__len__') and not isinstance(value, (str, dict)):
+        return len(value)
+    return None
+
+
+def _render_grid_map(crashes):
+    map_obj = folium.Map(location=[40.7128, -74.0060], zoom_start=12)
+    add_crash_grid_layer(map_obj, crashes)
+    return map_obj.get_root().render()
+
+
+def _render_heatmap(crashes, bus_stops, output_dir):
+    output_path = os.path.join(output_dir, 'heatmap.html')
+    create_heatmap(crashes, bus_stops, output_path=output_path)
+    return os.path.getsize(output_path)
+
+
+def benchmark_size(crash_file, bus_stop_file, memory=True):
+    """Time (and memory-profile) every pipeline stage and the analyses built on it for one input size."""
+    results = []
+
+    def stage(name, func, *args):
+        result, stats = measure(func, *args, memory=memory)
+        stats.update({'stage': name, 'rows_out': _rows(result)})
+        results.append(stats)
+        print(f"  {name:<24} {stats['seconds']:>9.3f}s" + (f" {stats['peak_mb']:>10.1f} MB" if memory else ''))
+        return result
+
+    stage('ingest', ingest_crashes, crash_file)
+    raw_crashes, raw_bus_stops = stage('load', pipeline.load_data, crash_file, bus_stop_file, CRASH_COLUMNS)
+    crashes, bus_stops = stage('clean', pipeline.clean_data, raw_crashes, raw_bus_stops)
+    crashes, bus_stops = stage('project', pipeline.project, crashes, bus_stops)
+    pairs = stage('join', lambda: pipeline.join(crashes, bus_stops, adjacency_dir=None))
+    stage('aggregate', pipeline.aggregate, crashes, bus_stops, pairs)
+
+    # Analyses and map builders on the same inputs. No adjacency_dir: every run (timed and traced)
+    # rebuilds the stop x crash matrix rather than loading one a previous run persisted
+    stage('accidents_near_bus_stops',
+          lambda: calculate_accidents_near_bus_stops(crashes, bus_stops.copy(), adjacency_dir=None))
+    stage('injury_distribution',
+          lambda: calculate_bus_stop_injury_distribution(raw_bus_stops, raw_crashes, adjacency_dir=None))
+    stage('grid_map', _render_grid_map, crashes)
+    with tempfile.TemporaryDirectory() as output_dir:
+        stage('heatmap', _render_heatmap, crashes, bus_stops, output_dir)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, memory=True, data_dir=SYNTHETIC_DIR, results_dir=RESULTS_DIR):
+    """Benchmark every stage at every size on synthetic data and write the results to a JSON file."""
+    # Generate only the inputs that are not there yet
+    missing = [size for size in sizes if not os.path.exists(os.path.join(data_dir, f"crash_collisions_{size}.csv"))]
+    if missing or not os.path.exists(os.path.join(data_dir, 'bus_stop_locations.csv')):
+        write_synthetic_data(missing, output_dir=data_dir)
+    bus_stop_file = os.path.join(data_dir, 'bus_stop_locations.csv')
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': []
+    }
+    for size in sizes:
+        print(f"{size} crashes:")
+        crash_file = os.path.join(data_dir, f"crash_collisions_{size}.csv")
+        for stats in benchmark_size(crash_file, bus_stop_file, memory=memory):
+            report['results'].append({'size': size, **stats})
+
+    os.makedirs(results_dir, exist_ok=True)
+    results_file = os.path.join(results_dir, f"benchmark-{commit or 'nogit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(results_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to '{results_file}'.")
+    return results_file
+
+
+def compare_results(old_file, new_file):
+    """Side-by-side seconds and peak memory of two result files, with new/old ratios."""
+    frames = []
+    for label, path in (('old', old_file), ('new', new_file)):
+        with open(path) as f:
+            results = pd.DataFrame(json.load(f)['results'])
+        frames.append(results.set_index(['size', 'stage']).drop(columns='rows_out').add_suffix(f"_{label}"))
+    comparison = frames[0].join(frames[1], how='outer')
+    comparison['time_ratio'] = comparison['seconds_new'] / comparison['seconds_old']
+    if 'peak_mb_old' in comparison and 'peak_mb_new' in comparison:
+        comparison['memory_ratio'] = comparison['peak_mb_new'] / comparison['peak_mb_old']
+    return comparison
+
+
+def main():
+    # `benchmark.py [SIZE ...] [--no-memory]` or `benchmark.py compare OLD.json NEW.json`
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args[:1] == ['compare']:
+        print(compare_results(args[1], args[2]).round(3).to_string())
+        return
+
+    unknown = [size for size in args if size not in SIZES]
+    if unknown:
+        raise ValueError(f"Unknown sizes {unknown}. Use any of {list(SIZES)}.")
+    run_benchmarks(args or DEFAULT_SIZES, memory='--no-memory' not in sys.argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+import time
+
+import geopandas as gpd
+
+from crash_store import read_crashes, read_bus_stops
+from spatial_index import PROJECTED_CRS, projected_xy, join_within
+
+
+def buffer_join(crashes_xy, stops_xy, radius_ft):
+    """Reference join: buffer every stop into a polygon and run a point-in-polygon sjoin."""
+    crashes_gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(crashes_xy[:, 0], crashes_xy[:, 1]), crs=PROJECTED_CRS)
+    stops_gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(stops_xy[:, 0], stops_xy[:, 1]), crs=PROJECTED_CRS)
+    stops_gdf['geometry'] = stops_gdf.geometry.buffer(radius_ft)
+    joined = gpd.sjoin(crashes_gdf, stops_gdf, how='inner', predicate='within')
+    return joined.index.to_numpy(), joined['index_right'].to_numpy()
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time of `repeat` calls and the last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def compare_joins(crashes_xy, stops_xy, radius_ft):
+    """Time both join paths and report how far their crash/stop pairs agree."""
+    buffer_time, (buffer_crashes, buffer_stops) = time_call(buffer_join, crashes_xy, stops_xy, radius_ft)
+    dwithin_time, pairs = time_call(join_within, crashes_xy, stops_xy, radius_ft)
+
+    buffer_pairs = set(zip(buffer_crashes.tolist(), buffer_stops.tolist()))
+    dwithin_pairs = set(zip(pairs['crash_index'].tolist(), pairs['stop_index'].tolist()))
+
+    # Pairs only the exact distance test finds sit in the gap between the circle and its polygon
+    only_dwithin = dwithin_pairs - buffer_pairs
+    only_buffer = buffer_pairs - dwithin_pairs
+
+    return {
+        'radius_ft': radius_ft,
+        'buffer_seconds': buffer_time,
+        'dwithin_seconds': dwithin_time,
+        'speedup': buffer_time / dwithin_time if dwithin_time else float('inf'),
+        'pairs': len(dwithin_pairs),
+        'only_dwithin': len(only_dwithin),
+        'only_buffer': len(only_buffer),
+    }
+
+
+def main():
+    # File paths
+    crash_file = sys.argv[1] if len(sys.argv) > 1 else 'data/crash_collisions.csv'
+    bus_stop_file = sys.argv[2] if len(sys.argv) > 2 else 'data/bus_stop_locations.csv'
+
+    # Load projected coordinates only
+    crashes = read_crashes(crash_file, columns=['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft']).dropna(subset=['LATITUDE', 'LONGITUDE'])
+    bus_stops = read_bus_stops(bus_stop_file).dropna(subset=['Latitude', 'Longitude'])
+    crashes_xy = projected_xy(crashes, 'LONGITUDE', 'LATITUDE')
+    stops_xy = projected_xy(bus_stops, 'Longitude', 'Latitude')
+    print(f"{len(crashes_xy)} crashes x {len(stops_xy)} bus stops")
+
+    for radius_ft in (50, 150, 300):
+        result = compare_joins(crashes_xy, stops_xy, radius_ft)
+        print(
+            f"{result['radius_ft']:>4} ft: buffer+sjoin {result['buffer_seconds']:.3f}s, "
+            f"dwithin {result['dwithin_seconds']:.3f}s ({result['speedup']:.1f}x), "
+            f"{result['pairs']} pairs, {result['only_dwithin']} only in dwithin, {result['only_buffer']} only in buffer"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,60 @@
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
 import matplotlib.pyplot as plt
+import pipeline
+from crash_store import iter_crash_chunks
+from pipeline import AGGREGATE_COLUMNS, stop_totals
+from adjacency import ADJACENCY_DIR, load_adjacency, stop_counts
+from spatial_index import PROJECTED_CRS, projected_xy, build_index, join_within
+
+
+# Crash columns this analysis needs
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft']
+
+# Radii (feet) swept by calculate_accident_radius_sweep by default
+SWEEP_RADII = list(range(25, 501, 25))
 
 
 def load_data(crash_file, bus_stop_file):
     """Load the crash and bus shelters data."""
-    crashes = pd.read_csv(crash_file, dtype={'LATITUDE': float, 'LONGITUDE': float}, low_memory=False)
-    bus_stops = pd.read_csv(bus_stop_file, dtype={'Longitude': float, 'Latitude': float}, low_memory=False)
-    return crashes, bus_stops
+    return pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
 
 
 def clean_data(crashes, bus_stops):
     """Clean crash and bus shelters data."""
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
-    crashes = crashes.rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-    bus_stops = bus_stops.rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
-    return crashes, bus_stops
+    return pipeline.clean_data(crashes, bus_stops)
 
 
-def calculate_accidents_near_bus_stops(crashes, bus_stops, distance=150):
-    """Calculate the percentage of bus shelters with accidents within a specified distance."""
-    # Convert to GeoDataFrames
-    crashes_gdf = gpd.GeoDataFrame(crashes, geometry=gpd.points_from_xy(crashes.longitude, crashes.latitude), crs="EPSG:4326")
-    bus_stops_gdf = gpd.GeoDataFrame(bus_stops, geometry=gpd.points_from_xy(bus_stops.longitude, bus_stops.latitude), crs="EPSG:4326")
+def calculate_accidents_near_bus_stops(crashes, bus_stops, distance=150, method='dwithin', workers=None,
+                                       adjacency_dir=None):
+    """Calculate the percentage of bus shelters with accidents within a specified distance.
 
+    `method='dwithin'` pairs crashes and shelters by point distance; `method='buffer'` keeps the
+    original buffer polygon + spatial join path for comparison. dwithin uses the stop x crash
+    adjacency for `distance` (built over spatial tiles in `workers` processes when given, and
+    persisted in `adjacency_dir` when given). For dwithin `crashes` may also be a dict of arrays
+    from array_store.load_arrays.
+    """
+    if method == 'dwithin':
+        crashes_xy = projected_xy(crashes, 'longitude', 'latitude')
+        bus_stops_xy = projected_xy(bus_stops, 'longitude', 'latitude')
+        adjacency = load_adjacency(crashes_xy, bus_stops_xy, distance, workers=workers, adjacency_dir=adjacency_dir)
+        bus_stops['has_accident'] = stop_counts(adjacency) > 0
+        return _count_bus_stops_with_accidents(bus_stops)
+    if method != 'buffer':
+        raise ValueError(f"Unknown join method: {method}")
 
-    # Reproject to a projected CRS (e.g., UTM)
-    crashes_gdf = crashes_gdf.to_crs(epsg=3857)
-    bus_stops_gdf = bus_stops_gdf.to_crs(epsg=3857)
+    # Convert to GeoDataFrames in NY State Plane (feet), using the precomputed x/y when present
+    crashes_xy = projected_xy(crashes, 'longitude', 'latitude')
+    bus_stops_xy = projected_xy(bus_stops, 'longitude', 'latitude')
+    crashes_gdf = gpd.GeoDataFrame(crashes, geometry=gpd.points_from_xy(crashes_xy[:, 0], crashes_xy[:, 1]), crs=PROJECTED_CRS)
+    bus_stops_gdf = gpd.GeoDataFrame(bus_stops, geometry=gpd.points_from_xy(bus_stops_xy[:, 0], bus_stops_xy[:, 1]), crs=PROJECTED_CRS)
 
 
-    # Buffer bus shelters by the distance in meters (1 foot = 0.3048 meters)
-    distance_meters = distance * 0.3048
-    bus_stops_gdf['geometry'] = bus_stops_gdf.geometry.buffer(distance_meters)
+    # Buffer bus shelters by the distance in feet
+    bus_stops_gdf['geometry'] = bus_stops_gdf.geometry.buffer(distance)
 
 
     # Perform a spatial join to find crashes within the buffer
@@ -44,8 +64,11 @@ def calculate_accidents_near_bus_stops(crashes, bus_stops, distance=150):
     # Mark bus shelters that have accidents
     bus_stops['has_accident'] = bus_stops.index.isin(joined['index_right'].unique())
 
+    return _count_bus_stops_with_accidents(bus_stops)
+
 
-    # Calculate percentages
+def _count_bus_stops_with_accidents(bus_stops):
+    """Count the bus shelters flagged with `has_accident`."""
     total_bus_stops = len(bus_stops)
     bus_stops_with_accidents = bus_stops['has_accident'].sum()
     bus_stops_without_accidents = total_bus_stops - bus_stops_with_accidents
@@ -54,6 +77,70 @@ def calculate_accidents_near_bus_stops(crashes, bus_stops, distance=150):
     return bus_stops_with_accidents, bus_stops_without_accidents, total_bus_stops
 
 
+def calculate_accidents_near_bus_stops_streaming(crash_file, bus_stops, distance=150, chunksize=250_000):
+    """Same result as calculate_accidents_near_bus_stops, but folds the crash file in chunk by chunk.
+
+    Peak memory is bounded by `chunksize` instead of the size of the crash file. Per-stop crash
+    counts and the AGGREGATE_COLUMNS sums are written onto `bus_stops`.
+    """
+    # Project the bus shelters once
+    bus_stops_xy = projected_xy(bus_stops, 'longitude', 'latitude')
+
+    # Running totals: crash count followed by one column per aggregate
+    total_bus_stops = len(bus_stops)
+    totals = np.zeros((total_bus_stops, len(AGGREGATE_COLUMNS) + 1), dtype=np.int64)
+
+    for chunk in iter_crash_chunks(crash_file, columns=CRASH_COLUMNS + AGGREGATE_COLUMNS, chunksize=chunksize):
+        chunk = chunk.dropna(subset=['LATITUDE', 'LONGITUDE'])
+        if chunk.empty:
+            continue
+        joined = join_within(projected_xy(chunk, 'LONGITUDE', 'LATITUDE'), bus_stops_xy, distance)
+        if joined.empty:
+            continue
+        values = chunk[AGGREGATE_COLUMNS].fillna(0).to_numpy()[joined['crash_index']]
+
+        # Fold this chunk into the running per-stop totals
+        totals += stop_totals(joined['stop_index'].to_numpy(), values, total_bus_stops)
+
+    # Attach the aggregates to the bus shelters
+    bus_stops['crash_count'] = totals[:, 0]
+    for i, column in enumerate(AGGREGATE_COLUMNS, start=1):
+        bus_stops[column] = totals[:, i]
+    bus_stops['has_accident'] = bus_stops['crash_count'] > 0
+
+    bus_stops_with_accidents = bus_stops['has_accident'].sum()
+    bus_stops_without_accidents = total_bus_stops - bus_stops_with_accidents
+
+    return bus_stops_with_accidents, bus_stops_without_accidents, total_bus_stops
+
+
+def calculate_accident_radius_sweep(crashes, bus_stops, radii=SWEEP_RADII):
+    """Calculate the share of bus shelters with an accident within each of `radii` feet in a single pass.
+
+    Each shelter's nearest-crash distance is computed once; every radius is then a binary search
+    over the sorted distances instead of a fresh buffer and spatial join.
+    """
+    total_bus_stops = len(bus_stops)
+    radii = np.sort(np.asarray(radii, dtype='float64'))
+
+    # Nearest crash for every shelter (inf when there are no crashes at all)
+    if len(crashes):
+        crash_index = build_index(projected_xy(crashes, 'longitude', 'latitude'))
+        nearest_ft, _ = crash_index.query(projected_xy(bus_stops, 'longitude', 'latitude'), k=1)
+    else:
+        nearest_ft = np.full(total_bus_stops, np.inf)
+    nearest_ft = np.sort(nearest_ft)
+
+    # Shelters whose nearest crash is within each radius
+    bus_stops_with_accidents = np.searchsorted(nearest_ft, radii, side='right')
+
+    return pd.DataFrame({
+        'radius_ft': radii,
+        'bus_stops_with_accidents': bus_stops_with_accidents,
+        'bus_stops_without_accidents': total_bus_stops - bus_stops_with_accidents,
+        'total_bus_stops': total_bus_stops,
+        'percentage_with_accidents': bus_stops_with_accidents / total_bus_stops * 100 if total_bus_stops else 0.0
+    })
 
 
 def plot_bus_stop_accident_percentages(bus_stops_with_accidents, bus_stops_without_accidents, total_bus_stops):
@@ -78,6 +165,20 @@ def plot_bus_stop_accident_percentages(bus_stops_with_accidents, bus_stops_witho
     plt.show()
 
 
+def plot_bus_stop_accident_curve(sweep):
+    """Plot the percentage of bus shelters with accidents against the search radius."""
+    plt.figure(figsize=(8, 5))
+    plt.plot(sweep['radius_ft'], sweep['percentage_with_accidents'], color='red', marker='o')
+    plt.xlabel('Distance from Bus Shelter (Feet)', fontsize=14, fontweight='bold')
+    plt.ylabel('Percentage of Bus Shelters (%)', fontsize=14, fontweight='bold')
+    plt.title('Percentage of Bus Shelters with Accidents by Distance', fontsize=16, fontweight='bold')
+    plt.ylim(0, 100)
+    plt.grid()
+
+
+    plt.show()
+
+
 def main():
     # File paths
     crash_file = 'data/crash_collisions.csv'
@@ -90,7 +191,9 @@ def main():
 
 
     # Calculate accidents near bus Shelters
-    bus_stops_with_accidents, bus_stops_without_accidents, total_bus_stops = calculate_accidents_near_bus_stops(crashes, bus_stops)
+    bus_stops_with_accidents, bus_stops_without_accidents, total_bus_stops = calculate_accidents_near_bus_stops(
+        crashes, bus_stops, adjacency_dir=ADJACENCY_DIR
+    )
 
 
     # Plot the results
@@ -1,5 +1,10 @@
 import pandas as pd
 import folium
+from crash_store import read_crashes, BUS_STOP_DTYPES
+from schema import compact, memory_report
+from pipeline import clean_data, aggregate_frames
+from ranking import top_k
+from grid_layer import add_crash_grid_layer
 
 def get_locations_for_top_bus_stops(bus_stops, top_ids):
     """Extract the latitude and longitude of the top bus stop IDs."""
@@ -30,13 +35,8 @@ def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150
             popup=f"Bus Stop ID: {row['Shelter_ID']}"  # Update the column name here
         ).add_to(crash_map)
 
-    # Add crashes to the map
-    for _, row in crashes.iterrows():
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            icon=folium.Icon(color="red", icon="info-sign"),
-            popup="Crash"
-        ).add_to(crash_map)
+    # Add crashes to the map as one aggregated hexagon layer
+    add_crash_grid_layer(crash_map, crashes)
 
     # Save the map
     crash_map.save("crashes_near_top_bus_stops.html")
@@ -52,68 +52,21 @@ def main():
     crash_file = 'data/crash_collisions.csv'
     bus_stop_file = 'data/bus_stop_locations.csv'
 
-    # Load data with explicit data types
-    crashes = pd.read_csv(crash_file, dtype={
-        'CRASH DATE': 'object',
-        'CRASH TIME': 'object',
-        'BOROUGH': 'object',
-        'ZIP CODE': 'object',  # Specify ZIP CODE as object
-        'LATITUDE': 'float64',
-        'LONGITUDE': 'float64',
-        'LOCATION': 'object',
-        'ON STREET NAME': 'object',
-        'CROSS STREET NAME': 'object',
-        'OFF STREET NAME': 'object',
-        'NUMBER OF PERSONS INJURED': 'float64',
-        'NUMBER OF PERSONS KILLED': 'float64',
-        'NUMBER OF PEDESTRIANS INJURED': 'int64',
-        'NUMBER OF PEDESTRIANS KILLED': 'int64',
-        'NUMBER OF CYCLIST INJURED': 'int64',
-        'NUMBER OF CYCLIST KILLED': 'int64',
-        'NUMBER OF MOTORIST INJURED': 'int64',
-        'NUMBER OF MOTORIST KILLED': 'int64',
-        'CONTRIBUTING FACTOR VEHICLE 1': 'object',
-        'CONTRIBUTING FACTOR VEHICLE 2': 'object',
-        'CONTRIBUTING FACTOR VEHICLE 3': 'object',
-        'CONTRIBUTING FACTOR VEHICLE 4': 'object',
-        'CONTRIBUTING FACTOR VEHICLE 5': 'object',
-        'COLLISION_ID': 'int64',
-        'VEHICLE TYPE CODE 1': 'object',
-        'VEHICLE TYPE CODE 2': 'object',
-        'VEHICLE TYPE CODE 3': 'object',
-        'VEHICLE TYPE CODE 4': 'object',
-        'VEHICLE TYPE CODE 5': 'object'
-    }, low_memory=False)
-
-    bus_stops = pd.read_csv(bus_stop_file, dtype={
-        'the_geom': 'object',
-        'BoroCode': 'int64',
-        'BoroName': 'object',
-        'BoroCD': 'int64',
-        'CounDist': 'int64',
-        'AssemDist': 'int64',
-        'StSenDist': 'int64',
-        'CongDist': 'int64',
-        'Shelter_ID': 'object',  # Ensure this matches the column name in your CSV
-        'Corner': 'object',
-        'On_Street': 'object',
-        'Cross_Stre': 'object',
-        'Longitude': 'float64',
-        'Latitude': 'float64',
-        'NTAName': 'object',
-        'FEMAFldz': 'object',
-        'FEMAFldT': 'object',
-        'HrcEvac': 'float64'
-    }, low_memory=False)
+    # Load data with the source data types, then compact them and compare the footprint
+    raw_crashes = read_crashes(crash_file, compact_types=False)
+    crashes = compact(raw_crashes.copy())
+    print("Crash frame memory (MB) before and after compacting:")
+    print(memory_report(raw_crashes, crashes).to_string())
+    del raw_crashes
+    bus_stops = pd.read_csv(bus_stop_file, dtype=BUS_STOP_DTYPES, low_memory=False)
 
     # Clean data
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE']).rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude']).rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
+    crashes, bus_stops = clean_data(crashes, bus_stops)
 
-    # Top bus stop IDs
-    top_ids = [2008, 1788, 1586, 1927, 1618, 1604, 148, 2663, 3059, 3183]
+    # Top bus stop IDs by crash count
+    top_ids = top_k(aggregate_frames(crashes, bus_stops), metric='crash_count', k=10)['Shelter_ID'].tolist()
 
-    # Get hardcoded locations for the top bus stops
+    # Get locations for the top bus stops
     top_bus_stop_locations = get_locations_for_top_bus_stops(bus_stops, top_ids)
 
     # Debugging: Check if top_bus_stop_locations is empty
@@ -0,0 +1,268 @@
+import argparse
+import sys
+
+
+# Defaults shared by the subcommands
+CRASH_FILE = 'data/crash_collisions.csv'
+BUS_STOP_FILE = 'data/bus_stop_locations.csv'
+RADIUS_FT = 150
+TOP_K = 10
+
+# Choices mirror ranking.METRICS, heat_grid.HEAT_WEIGHTS and street_matcher.MIN_CONFIDENCE; they are repeated
+# here because importing those modules (and pandas with them) would slow down every startup, `--help` included
+METRICS = ['crash_count', 'injured', 'killed', 'pedestrian', 'severity']
+HEAT_WEIGHTS = ['injured', 'killed', 'pedestrian', 'cyclist', 'motorist']
+MIN_CONFIDENCE = 0.2
+
+
+# ----------------------------
+# Subcommands (each imports its own heavy modules)
+# ----------------------------
+def ingest(args):
+    """Convert the crash CSV into the partitioned columnar store (and optionally the .npy arrays)."""
+    from crash_store import ingest_crashes
+
+    ingest_crashes(args.crash_file)
+    if args.arrays:
+        from array_store import export_arrays
+
+        export_arrays(args.crash_file)
+
+
+def _recover_min_confidence(args):
+    """The clean stage's street-match threshold, or None when --recover-streets is off."""
+    return args.min_confidence if getattr(args, 'recover_streets', False) else None
+
+
+def proximity(args):
+    """Count bus shelters with and without a crash within the radius."""
+    from pipeline import run_pipeline, render
+
+    if args.arrays:
+        if args.recover_streets:
+            sys.exit('--recover-streets cannot be combined with --arrays: the arrays only hold geocoded crashes')
+        from array_store import run_arrays
+
+        results = run_arrays(args.crash_file, args.bus_stop_file, radius_ft=args.radius, workers=args.workers)
+    else:
+        results = run_pipeline(args.crash_file, args.bus_stop_file, radius_ft=args.radius, workers=args.workers,
+                               recover_min_confidence=_recover_min_confidence(args))
+    summary = results['summary']
+    share = summary['bus_stops_with_accidents'] / summary['total_bus_stops'] * 100 if summary['total_bus_stops'] else 0
+    print(f"Number of crashes: {summary['total_crashes']}")
+    print(f"Number of bus stops: {summary['total_bus_stops']}")
+    print(f"Bus stops with a crash within {args.radius} ft: {summary['bus_stops_with_accidents']} ({share:.2f}%)")
+    print(f"Bus stops without: {summary['bus_stops_without_accidents']}")
+    if args.plot:
+        render(results)
+
+
+def _top_stops(args):
+    from pipeline import run_pipeline
+    from ranking import top_k
+
+    aggregates = run_pipeline(args.crash_file, args.bus_stop_file, radius_ft=args.radius, workers=args.workers,
+                              recover_min_confidence=_recover_min_confidence(args))['aggregates']
+    return top_k(aggregates, metric=args.metric, k=args.top, by_borough=getattr(args, 'by_borough', False))
+
+
+def top(args):
+    """Print the top-K bus shelters for a metric (overall, or per borough)."""
+    ranked = _top_stops(args)
+    top_stops, borough_tops = ranked if args.by_borough else (ranked, None)
+
+    columns = ['rank', 'Shelter_ID', 'BoroName', 'score', 'crash_count']
+    print(f"Top {args.top} bus stops by {args.metric} within {args.radius} ft:")
+    print(top_stops[columns].to_string(index=False))
+    if borough_tops is not None:
+        print(f"\nTop {args.top} per borough:")
+        print(borough_tops[columns].to_string(index=False))
+    if args.output:
+        (borough_tops if borough_tops is not None else top_stops).to_csv(args.output, index=False)
+        print(f"Ranking saved to '{args.output}'.")
+
+
+def heatmap(args):
+    """Write the crash heatmap with every bus shelter marked."""
+    import pipeline
+    from generate_heatmap import CRASH_COLUMNS, create_heatmap
+
+    crashes, bus_stops = pipeline.load_data(args.crash_file, args.bus_stop_file, columns=CRASH_COLUMNS)
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops)
+    create_heatmap(crashes, bus_stops, output_path=args.output, weight=args.weight)
+    print(f"Heatmap saved to '{args.output}'.")
+
+
+def crash_map(args):
+    """Write a map of the top-K shelters over the aggregated crash grid."""
+    import pipeline
+    from crash_map import CRASH_COLUMNS, plot_crashes_and_top_bus_stops
+
+    top_stops = _top_stops(args)
+    recover_min_confidence = _recover_min_confidence(args)
+    columns = CRASH_COLUMNS + (pipeline.STREET_COLUMNS if recover_min_confidence is not None else [])
+    crashes, bus_stops = pipeline.load_data(args.crash_file, args.bus_stop_file, columns=columns)
+    crashes, _ = pipeline.clean_data(crashes, bus_stops, recover_min_confidence=recover_min_confidence)
+    plot_crashes_and_top_bus_stops(crashes, top_stops, distance=args.radius, output_path=args.output)
+
+
+def injury_dist(args):
+    """Compare the injury mix near bus shelters with the citywide mix."""
+    import pipeline
+    from adjacency import ADJACENCY_DIR
+    from nyc_crashes_bus_stops import (
+        CRASH_COLUMNS, INJURY_COLUMNS, calculate_bus_stop_injury_distribution, calculate_overall_injury_distribution
+    )
+
+    crashes, bus_stops = pipeline.load_data(args.crash_file, args.bus_stop_file, columns=CRASH_COLUMNS)
+    print(f"Injury percentage distribution within {args.radius} feet of bus stops:")
+    print(calculate_bus_stop_injury_distribution(bus_stops, crashes, radius_ft=args.radius,
+                                                 adjacency_dir=ADJACENCY_DIR))
+    print("Overall injury percentage distribution:")
+    print(calculate_overall_injury_distribution(crashes))
+
+    if args.draws:
+        from significance import injury_significance
+        from spatial_index import projected_xy
+
+        crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
+        bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
+        significance = injury_significance(
+            projected_xy(crashes, 'LONGITUDE', 'LATITUDE'),
+            crashes[list(INJURY_COLUMNS.values())].fillna(0).to_numpy(),
+            projected_xy(bus_stops, 'Longitude', 'Latitude'),
+            radius_ft=args.radius, draws=args.draws, workers=args.workers
+        )
+        significance.index = list(INJURY_COLUMNS)
+        print(f"95% intervals and p-values from {args.draws} resamples:")
+        print(significance.round(2).to_string())
+
+
+def factors(args):
+    """Contributing factors and vehicle types near bus shelters vs citywide, plus a per-stop breakdown."""
+    from crash_factors import main as crash_factors_main
+
+    crash_factors_main(args.crash_file, args.bus_stop_file, radius_ft=args.radius, output_file=args.output,
+                       workers=args.workers)
+
+
+def risk(args):
+    """Rank shelters by a distance-decay kernel risk score instead of a hard radius."""
+    from risk_score import main as risk_score_main
+
+    argv = ['--crash-file', args.crash_file, '--bus-stop-file', args.bus_stop_file, '--kernel', args.kernel,
+            '--bandwidth', str(args.radius), '--weight', args.weight, '--top', str(args.top)]
+    if args.split:
+        argv.append('--split')
+    if args.workers:
+        argv += ['--workers', str(args.workers)]
+    if args.output:
+        argv += ['--output', args.output]
+    risk_score_main(argv)
+
+
+def match_streets(args):
+    """Fill in coordinates of un-geocoded crashes from their street intersection."""
+    from street_matcher import main as street_matcher_main
+
+    argv = ['--crash-file', args.crash_file, '--bus-stop-file', args.bus_stop_file, '--min-confidence', str(args.min_confidence)]
+    if args.output:
+        argv += ['--output', args.output]
+    street_matcher_main(argv)
+
+
+def serve(args):
+    """Run the asyncio query service over the crash and shelter data."""
+    import query_service
+
+    query_service.main(['--crash-file', args.crash_file, '--bus-stop-file', args.bus_stop_file,
+                        '--host', args.host, '--port', str(args.port)])
+
+
+# ----------------------------
+# Argument parsing
+# ----------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='NYC crash / bus shelter analysis.')
+    parser.add_argument('--profile', action='store_true', help='record per-stage timings')
+    parser.add_argument('--profile-report', metavar='PATH',
+                        help='write the stage report to PATH, .json or .csv (implies --profile)')
+    parser.add_argument('--profile-stage', metavar='STAGE', help='also write a cProfile dump of STAGE')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add(name, handler, help_text, radius=True, ranking=False, recover=False):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.add_argument('--crash-file', default=CRASH_FILE, help=f"crash CSV (default: {CRASH_FILE})")
+        if name != 'ingest':
+            sub.add_argument('--bus-stop-file', default=BUS_STOP_FILE, help=f"bus shelter CSV (default: {BUS_STOP_FILE})")
+            sub.add_argument('--workers', type=int, default=None, help='worker processes for the join / resampling')
+        if radius:
+            sub.add_argument('--radius', type=float, default=RADIUS_FT, help=f"search radius in feet (default: {RADIUS_FT})")
+        if ranking:
+            sub.add_argument('--top', type=int, default=TOP_K, help=f"number of shelters (default: {TOP_K})")
+            sub.add_argument('--metric', choices=METRICS, default='crash_count', help='ranking metric')
+        if recover:
+            sub.add_argument('--recover-streets', action='store_true',
+                             help='place un-geocoded crashes at their street intersection (see match-streets)')
+            sub.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE,
+                             help=f"only fill matches at least this confident (default: {MIN_CONFIDENCE})")
+        sub.set_defaults(handler=handler)
+        return sub
+
+    sub = add('ingest', ingest, 'Build the columnar crash store from the CSV.', radius=False)
+    sub.add_argument('--arrays', action='store_true', help='also export memory-mappable .npy arrays')
+
+    sub = add('proximity', proximity, 'Share of bus shelters with a crash within the radius.', recover=True)
+    sub.add_argument('--plot', action='store_true', help='show the bar chart')
+    sub.add_argument('--arrays', action='store_true', help='join over the memory-mapped .npy arrays (see ingest --arrays)')
+
+    sub = add('top', top, 'Top-K bus shelters by a metric.', ranking=True, recover=True)
+    sub.add_argument('--by-borough', action='store_true', help='also rank within each borough')
+    sub.add_argument('--output', help='save the ranking to this CSV')
+
+    sub = add('heatmap', heatmap, 'Crash heatmap with bus shelters.', radius=False)
+    sub.add_argument('--weight', choices=HEAT_WEIGHTS,
+                     help='weight cells by this injury column instead of counting crashes')
+    sub.add_argument('--output', default='outputs/bus_stop_crash_heatmap.html', help='HTML file to write')
+
+    sub = add('map', crash_map, 'Map of the top-K shelters over the crash grid.', ranking=True, recover=True)
+    sub.add_argument('--output', default='crashes_near_top_bus_stops.html', help='HTML file to write')
+
+    sub = add('injury-dist', injury_dist, 'Injury mix near bus shelters vs citywide.')
+    sub.add_argument('--draws', type=int, default=0, help='bootstrap/control resamples for intervals (default: off)')
+
+    sub = add('factors', factors, 'Contributing factors and vehicle types near shelters vs citywide.')
+    sub.add_argument('--output', default='outputs/crash_factors_by_stop.csv', help='per-stop breakdown CSV')
+
+    sub = add('risk', risk, 'Distance-decay kernel risk score per shelter (--radius is the bandwidth).')
+    sub.add_argument('--kernel', choices=['gaussian', 'epanechnikov', 'uniform'], default='gaussian')
+    sub.add_argument('--split', action='store_true', help='share each crash between the stops it is near')
+    sub.add_argument('--weight', choices=METRICS, default='severity', help='per-crash weight')
+    sub.add_argument('--top', type=int, default=TOP_K, help=f"number of shelters (default: {TOP_K})")
+    sub.add_argument('--output', help='save every score to this CSV')
+
+    sub = add('match-streets', match_streets, 'Recover un-geocoded crashes from their street intersection.', radius=False)
+    sub.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE,
+                     help=f"only fill matches at least this confident (default: {MIN_CONFIDENCE})")
+    sub.add_argument('--output', help='save the recovered crashes to this CSV')
+
+    sub = add('serve', serve, 'HTTP query service for crashes near a point or shelter.', radius=False)
+    sub.add_argument('--host', default='127.0.0.1', help='interface to listen on')
+    sub.add_argument('--port', type=int, default=8765, help='port to listen on (default: 8765)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_report or args.profile_stage:
+        import instrumentation
+
+        instrumentation.enable(args.profile_report or instrumentation.REPORT_FILE, args.profile_stage)
+        args.handler(args)
+        instrumentation.finish()
+    else:
+        args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_data import write_synthetic_data
+
+
+# Fresh interpreter runs per subcommand; the first one also fills the stage cache
+RUNS = 5
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+
+def subcommands(crash_file, bus_stop_file, output_dir):
+    """The argv of every subcommand to time, pointed at small synthetic inputs."""
+    files = ['--crash-file', crash_file, '--bus-stop-file', bus_stop_file]
+    return {
+        '--help': ['--help'],
+        'ingest': ['ingest', '--crash-file', crash_file],
+        'proximity': ['proximity'] + files,
+        'top': ['top'] + files,
+        'heatmap': ['heatmap'] + files + ['--output', os.path.join(output_dir, 'heatmap.html')],
+        'map': ['map'] + files + ['--output', os.path.join(output_dir, 'map.html')],
+        'injury-dist': ['injury-dist'] + files
+    }
+
+
+def time_command(argv, cwd, runs=RUNS):
+    """Wall time of `runs` fresh `python cli.py ...` processes."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI] + argv, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def import_time(module, cwd):
+    """Seconds a fresh interpreter spends importing `module`."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(CLI))
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, check=True, capture_output=True, text=True, env=env)
+    return float(result.stdout)
+
+
+def main():
+    # `cold_start.py [SIZE]` times every subcommand on a synthetic file (default 10k rows)
+    size = sys.argv[1] if len(sys.argv) > 1 else '10k'
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = os.path.join(work_dir, 'data')
+        bus_stop_file, crash_files = write_synthetic_data([size], output_dir=data_dir)
+
+        print(f"{'subcommand':<14}{'first s':>10}{'median s':>10}{'min s':>10}")
+        for name, argv in subcommands(crash_files[size], bus_stop_file, work_dir).items():
+            times = time_command(argv, work_dir)
+            print(f"{name:<14}{times[0]:>10.3f}{statistics.median(times[1:]):>10.3f}{min(times):>10.3f}")
+
+        # What an eager import of each heavy dependency would add to every command
+        print(f"\n{'import':<20}{'seconds':>10}")
+        for module in ['pandas', 'pyarrow.dataset', 'scipy.spatial', 'geopandas', 'folium', 'matplotlib.pyplot', 'pipeline']:
+            print(f"{module:<20}{import_time(module, work_dir):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
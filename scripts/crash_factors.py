@@ -0,0 +1,185 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import pipeline
+from adjacency import ADJACENCY_DIR, indicator, load_adjacency, stop_counts
+from spatial_index import projected_xy
+
+
+# The ten free-text columns, encoded as two label sets
+FACTOR_COLUMNS = [f'CONTRIBUTING FACTOR VEHICLE {i}' for i in range(1, 6)]
+VEHICLE_COLUMNS = [f'VEHICLE TYPE CODE {i}' for i in range(1, 6)]
+
+# Crash columns this analysis needs
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft'] + FACTOR_COLUMNS + VEHICLE_COLUMNS
+
+# Spellings that mean the same thing, after lower-casing and whitespace clean-up
+FACTOR_ALIASES = {
+    'illnes': 'illness',
+    'reaction to other uninvolved vehicle': 'reaction to uninvolved vehicle'
+}
+VEHICLE_ALIASES = {
+    'passenger vehicle': 'sedan',
+    '4 dr sedan': 'sedan',
+    '2 dr sedan': 'sedan',
+    '3-door': 'sedan',
+    'sport utility/station wagon': 'station wagon/sport utility vehicle',
+    'bicycle': 'bike',
+    'pickup truck': 'pick-up truck',
+    'pick up truck': 'pick-up truck',
+    'motorbike': 'motorcycle',
+    'ambul': 'ambulance',
+    'school bus': 'bus'
+}
+
+# Labels that carry no information
+DROPPED_LABELS = {'', 'unspecified', 'unknown', 'unk', 'other', 'na', 'n/a'}
+
+# Labels need at least this many crashes citywide to be compared
+MIN_CRASHES = 30
+
+OUTPUT_FILE = 'outputs/crash_factors_by_stop.csv'
+
+
+# ----------------------------
+# Encoding
+# ----------------------------
+def normalize_labels(labels, aliases=None):
+    """Canonical form of free-text labels (lower case, single spaces, no padding around '/'); NaN when dropped."""
+    labels = pd.Series(labels, dtype='str')
+    labels = (labels.str.strip().str.lower()
+              .str.replace(r'\s+', ' ', regex=True)
+              .str.replace(r'\s*/\s*', '/', regex=True))
+    if aliases:
+        labels = labels.replace(aliases)
+    return labels.where(~labels.isin(DROPPED_LABELS) & ~labels.str.fullmatch(r'[\d\W]*')).to_numpy(dtype=object)
+
+
+def multi_hot(crashes, columns, aliases=None):
+    """Sparse 0/1 matrix of crashes x labels over all `columns`, plus the label vocabulary.
+
+    Only the distinct values of each column are normalized; rows are mapped to labels through the
+    categorical codes, so the cost is a few array lookups per column rather than a loop over rows.
+    """
+    categoricals = [pd.Categorical(crashes[column]) for column in columns]
+    normalized = [normalize_labels(categorical.categories, aliases) for categorical in categoricals]
+    vocabulary = pd.Index(sorted({label for labels in normalized for label in labels if isinstance(label, str)}))
+
+    rows, codes = [], []
+    for categorical, labels in zip(categoricals, normalized):
+        # Category code -> vocabulary id, with a trailing -1 so missing values (code -1) map to -1
+        mapping = np.append(vocabulary.get_indexer(labels), -1)
+        column_codes = mapping[categorical.codes]
+        present = np.flatnonzero(column_codes >= 0)
+        rows.append(present)
+        codes.append(column_codes[present])
+
+    rows, codes = np.concatenate(rows), np.concatenate(codes)
+    encoded = sparse.csr_matrix((np.ones(len(rows)), (rows, codes)), shape=(len(crashes), len(vocabulary)))
+    # Two vehicles with the same label still count once for the crash
+    encoded.data[:] = 1
+    return encoded, vocabulary
+
+
+# ----------------------------
+# Aggregation
+# ----------------------------
+def compare_distribution(encoded, vocabulary, near_mask, min_crashes=MIN_CRASHES):
+    """Share of crashes involving each label near shelters vs citywide, most over-represented first.
+
+    `lift` is the ratio of the two shares; `z` compares the crashes near shelters with the rest in
+    a two-proportion z-test.
+    """
+    near_mask = np.asarray(near_mask, dtype=bool)
+    near_total, city_total = near_mask.sum(), len(near_mask)
+    near_counts = np.asarray(encoded[near_mask].sum(axis=0)).ravel()
+    city_counts = np.asarray(encoded.sum(axis=0)).ravel()
+
+    near_share = near_counts / near_total if near_total else np.zeros(len(vocabulary))
+    city_share = city_counts / city_total if city_total else np.zeros(len(vocabulary))
+    rest_total = city_total - near_total
+    rest_share = (city_counts - near_counts) / rest_total if rest_total else np.zeros(len(vocabulary))
+    pooled = city_share
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift = near_share / city_share
+        z = (near_share - rest_share) / np.sqrt(pooled * (1 - pooled) * (1 / max(near_total, 1) + 1 / max(rest_total, 1)))
+
+    comparison = pd.DataFrame({
+        'near_crashes': near_counts.astype(np.int64),
+        'near_pct': (near_share * 100).round(2),
+        'citywide_crashes': city_counts.astype(np.int64),
+        'citywide_pct': (city_share * 100).round(2),
+        'lift': lift.round(3),
+        'z': z.round(2)
+    }, index=vocabulary)
+    comparison = comparison[comparison['citywide_crashes'] >= min_crashes]
+    return comparison.sort_values('lift', ascending=False)
+
+
+def stop_label_counts(adjacency, encoded):
+    """Sparse stops x labels matrix: crashes near each stop that involve each label."""
+    return indicator(adjacency) @ encoded
+
+
+def stop_breakdown(adjacency, encoded, vocabulary, bus_stops, kind):
+    """Long table of every non-zero (stop, label) count with its share of the stop's crashes."""
+    counts = stop_label_counts(adjacency, encoded).tocoo()
+    stop_totals = stop_counts(adjacency)
+    return pd.DataFrame({
+        'Shelter_ID': bus_stops['Shelter_ID'].to_numpy()[counts.row],
+        'kind': kind,
+        'label': vocabulary.to_numpy()[counts.col],
+        'crashes': counts.data.astype(np.int64),
+        'pct_of_stop_crashes': (counts.data / stop_totals[counts.row] * 100).round(2)
+    }).sort_values(['Shelter_ID', 'kind', 'crashes'], ascending=[True, True, False], ignore_index=True)
+
+
+def analyze_factors(crashes, bus_stops, radius_ft=150, workers=None, adjacency_dir=None):
+    """Encode factors and vehicle types, compare near-shelter vs citywide, and break them down per stop.
+
+    The stop x crash adjacency is persisted in `adjacency_dir` when given. Returns
+    ({'factor': comparison, 'vehicle': comparison}, per-stop breakdown).
+    """
+    adjacency = load_adjacency(
+        projected_xy(crashes, 'longitude', 'latitude'), projected_xy(bus_stops, 'longitude', 'latitude'), radius_ft, workers=workers,
+        adjacency_dir=adjacency_dir
+    )
+    # A crash is near a shelter if any stop's row holds it
+    near_mask = np.bincount(adjacency.indices, minlength=len(crashes)) > 0
+
+    comparisons, breakdowns = {}, []
+    for kind, columns, aliases in [('factor', FACTOR_COLUMNS, FACTOR_ALIASES), ('vehicle', VEHICLE_COLUMNS, VEHICLE_ALIASES)]:
+        encoded, vocabulary = multi_hot(crashes, columns, aliases)
+        comparisons[kind] = compare_distribution(encoded, vocabulary, near_mask)
+        breakdowns.append(stop_breakdown(adjacency, encoded, vocabulary, bus_stops, kind))
+    return comparisons, pd.concat(breakdowns, ignore_index=True)
+
+
+def main(crash_file='data/crash_collisions.csv', bus_stop_file='data/bus_stop_locations.csv', radius_ft=150,
+         output_file=OUTPUT_FILE, workers=None, adjacency_dir=ADJACENCY_DIR):
+    start = time.perf_counter()
+    crashes, bus_stops = pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops)
+    print(f"Loaded {len(crashes)} crashes and {len(bus_stops)} bus stops in {time.perf_counter() - start:.2f}s.")
+
+    start = time.perf_counter()
+    comparisons, breakdown = analyze_factors(crashes, bus_stops, radius_ft=radius_ft, workers=workers,
+                                            adjacency_dir=adjacency_dir)
+    print(f"Encoded and aggregated in {time.perf_counter() - start:.2f}s.")
+
+    # Print the comparisons
+    for kind, title in [('factor', 'Contributing factors'), ('vehicle', 'Vehicle types')]:
+        print(f"\n{title}: share of crashes within {radius_ft} ft of a bus shelter vs citywide")
+        print(comparisons[kind].to_string())
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    breakdown.to_csv(output_file, index=False)
+    print(f"\nPer-stop breakdown saved to '{output_file}'.")
+
+
+if __name__ == "__main__":
+    main()
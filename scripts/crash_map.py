@@ -1,15 +1,19 @@
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
 import folium
+from pipeline import AGGREGATE_COLUMNS, load_data, clean_data, aggregate_frames
+from ranking import top_k
+from grid_layer import add_crash_grid_layer
+
+
+# Crash columns this analysis needs
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft', 'NUMBER OF PERSONS INJURED', 'NUMBER OF PERSONS KILLED']
 
 
 def get_locations_for_top_bus_stops(bus_stops, top_ids):
     """Extract the latitude and longitude of the top bus stop IDs."""
-    return bus_stops[bus_stops['StopID'].isin(top_ids)][['StopID', 'latitude', 'longitude']]
+    return bus_stops[bus_stops['Shelter_ID'].isin(top_ids)][['Shelter_ID', 'latitude', 'longitude']]
 
 
-def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150):
+def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150, output_path='crashes_near_top_bus_stops.html'):
     """Plot crashes and top bus stops on a map with circular buffers."""
     # Initialize the map centered on the average location of the top bus stops
     map_center = [top_bus_stop_locations['latitude'].mean(), top_bus_stop_locations['longitude'].mean()]
@@ -23,20 +27,15 @@ def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150
             color="blue",
             fill=True,
             fill_opacity=0.3,
-            popup=f"Bus Stop ID: {row['StopID']}"
+            popup=f"Bus Stop ID: {row['Shelter_ID']}"
         ).add_to(crash_map)
 
-    # Add crashes to the map
-    for _, row in crashes.iterrows():
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            icon=folium.Icon(color="red", icon="info-sign"),
-            popup="Crash"
-        ).add_to(crash_map)
+    # Add crashes to the map as one aggregated hexagon layer
+    add_crash_grid_layer(crash_map, crashes)
 
     # Save the map
-    crash_map.save("crashes_near_top_bus_stops.html")
-    print("Map saved as 'crashes_near_top_bus_stops.html'.")
+    crash_map.save(output_path)
+    print(f"Map saved as '{output_path}'.")
 
 
 def main():
@@ -44,18 +43,16 @@ def main():
     crash_file = 'data/crash_collisions.csv'
     bus_stop_file = 'data/bus_stop_locations.csv'
 
-    # Load data
-    crashes = pd.read_csv(crash_file, dtype={'LATITUDE': float, 'LONGITUDE': float}, low_memory=False)
-    bus_stops = pd.read_csv(bus_stop_file, dtype={'Longitude': float, 'Latitude': float}, low_memory=False)
+    # Load data (with the per-mode columns the ranking sums)
+    crashes, bus_stops = load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS + AGGREGATE_COLUMNS)
 
     # Clean data
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE']).rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude']).rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
+    crashes, bus_stops = clean_data(crashes, bus_stops)
 
-    # Top bus stop IDs
-    top_ids = [2008, 1788, 1586, 1927, 1618, 1604, 148, 2663, 3059, 3183]
+    # Top bus stops by weighted severity (crashes, injuries and deaths)
+    top_ids = top_k(aggregate_frames(crashes, bus_stops), metric='severity', k=10)['Shelter_ID']
 
-    # Get hardcoded locations for the top bus stops
+    # Get locations for the top bus stops
     top_bus_stop_locations = get_locations_for_top_bus_stops(bus_stops, top_ids)
 
     # Plot crashes and top bus stops
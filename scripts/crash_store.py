@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from spatial_index import PROJECTED_CRS, project_to_feet
+from schema import CRASH_SCHEMA, raw_dtypes, read_dtypes, columns_of_kind, compact
+
+
+# Schema for the crash CSV (same dtype map check_data_types has always used; see schema.CRASH_SCHEMA)
+CRASH_DTYPES = raw_dtypes()
+
+# Schema for the bus shelter CSV
+BUS_STOP_DTYPES = {
+    'the_geom': 'object',
+    'BoroCode': 'int64',
+    'BoroName': 'object',
+    'BoroCD': 'int64',
+    'CounDist': 'int64',
+    'AssemDist': 'int64',
+    'StSenDist': 'int64',
+    'CongDist': 'int64',
+    'Shelter_ID': 'object',
+    'Corner': 'object',
+    'On_Street': 'object',
+    'Cross_Stre': 'object',
+    'Longitude': 'float64',
+    'Latitude': 'float64',
+    'NTAName': 'object',
+    'FEMAFldz': 'object',
+    'FEMAFldT': 'object',
+    'HrcEvac': 'float64'
+}
+
+# Columns the store is partitioned on
+PARTITION_COLUMNS = ['crash_year', 'BOROUGH']
+
+# Projected x/y (feet, PROJECTED_CRS) computed once at ingest
+PROJECTED_COLUMNS = ['x_ft', 'y_ft']
+
+# Metadata file written into the store; its leading underscore keeps it out of the dataset
+STORE_METADATA = '_source.json'
+
+ARROW_TYPES = {'object': pa.string(), 'float64': pa.float64(), 'int64': pa.int64()}
+
+
+def store_path(crash_file):
+    """Return the columnar store directory that belongs to a crash CSV."""
+    return os.path.splitext(crash_file)[0] + '.parquet'
+
+
+def file_digest(path, block_size=1 << 20):
+    """Return the SHA-256 of a file, memoised in a sidecar keyed on size and mtime."""
+    stat = os.stat(path)
+    stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+    sidecar = path + '.sha256'
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            cached_stamp, _, cached_digest = f.read().strip().rpartition(' ')
+        if cached_stamp == stamp:
+            return cached_digest
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    digest = digest.hexdigest()
+
+    with open(sidecar, 'w') as f:
+        f.write(f"{stamp} {digest}\n")
+    return digest
+
+
+def source_digest(crash_file):
+    """SHA-256 of a crash CSV, or the one recorded at ingest when only its store was shipped."""
+    if not os.path.exists(crash_file):
+        metadata_file = os.path.join(store_path(crash_file), STORE_METADATA)
+        if os.path.isfile(metadata_file):
+            with open(metadata_file) as f:
+                return json.load(f)['sha256']
+    return file_digest(crash_file)
+
+
+def store_exists(crash_file):
+    """Check whether the crash CSV has been ingested and the store still matches its contents."""
+    output_dir = store_path(crash_file)
+    metadata_file = os.path.join(output_dir, STORE_METADATA)
+    if not os.path.isfile(metadata_file):
+        return False
+    # A store shipped without its CSV is trusted as-is
+    if not os.path.exists(crash_file):
+        return True
+    with open(metadata_file) as f:
+        metadata = json.load(f)
+    return metadata.get('sha256') == file_digest(crash_file)
+
+
+def _store_schema():
+    """Build the Arrow schema of the store from the crash dtype map."""
+    fields = [pa.field(name, ARROW_TYPES[dtype]) for name, dtype in CRASH_DTYPES.items()]
+    fields += [pa.field(name, pa.float64()) for name in PROJECTED_COLUMNS]
+    fields.append(pa.field('crash_year', pa.int16()))
+    return pa.schema(fields)
+
+
+def _store_partitioning():
+    """Hive-style partitioning on crash year and borough."""
+    schema = _store_schema()
+    return ds.partitioning(pa.schema([schema.field(name) for name in PARTITION_COLUMNS]), flavor='hive')
+
+
+def _add_crash_year(crashes):
+    """Derive the partition year from the MM/DD/YYYY crash date."""
+    crashes['crash_year'] = pd.to_numeric(crashes['CRASH DATE'].str[-4:], errors='coerce').astype('Int16')
+    return crashes
+
+
+def add_projected_columns(df, lon_col, lat_col):
+    """Add x_ft/y_ft columns projected from the given longitude/latitude columns."""
+    xy = project_to_feet(df[lon_col], df[lat_col])
+    # Missing coordinates stay missing instead of turning into inf
+    xy[~np.isfinite(xy).all(axis=1)] = np.nan
+    df['x_ft'] = xy[:, 0]
+    df['y_ft'] = xy[:, 1]
+    return df
+
+
+def ingest_crashes(crash_file, chunksize=500_000):
+    """Convert the crash CSV once into a Parquet store partitioned by year and borough."""
+    output_dir = store_path(crash_file)
+    tmp_dir = output_dir + '.tmp'
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    schema = _store_schema()
+
+    # Stream the CSV so ingest never holds the whole file in memory. Each chunk is projected and
+    # written from this thread: handing write_dataset a generator would run the pyproj projection
+    # on an Arrow worker thread, which can crash the interpreter
+    chunks = pd.read_csv(crash_file, dtype=CRASH_DTYPES, chunksize=chunksize, low_memory=False)
+    for i, chunk in enumerate(chunks):
+        chunk = _add_crash_year(chunk)
+        chunk = add_projected_columns(chunk, 'LONGITUDE', 'LATITUDE')
+        ds.write_dataset(
+            pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+            tmp_dir,
+            schema=schema,
+            format='parquet',
+            partitioning=_store_partitioning(),
+            basename_template=f"chunk-{i}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+
+    # Key the store to the exact CSV it was built from
+    with open(os.path.join(tmp_dir, STORE_METADATA), 'w') as f:
+        json.dump({'source': os.path.basename(crash_file), 'sha256': file_digest(crash_file), 'crs': PROJECTED_CRS}, f)
+
+    # Swap the finished store in place so readers never see a partial store
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(tmp_dir, output_dir)
+    print(f"Crash store written to '{output_dir}'.")
+    return output_dir
+
+
+def _partition_filter(years, boroughs):
+    """Build a dataset filter that prunes partitions by year and borough."""
+    expression = None
+    if years is not None:
+        expression = ds.field('crash_year').isin([int(year) for year in years])
+    if boroughs is not None:
+        borough_filter = ds.field('BOROUGH').isin([borough.upper() for borough in boroughs])
+        expression = borough_filter if expression is None else expression & borough_filter
+    return expression
+
+
+def _open_store(crash_file):
+    """Open the columnar store as an Arrow dataset."""
+    return ds.dataset(store_path(crash_file), format='parquet', schema=_store_schema(), partitioning=_store_partitioning())
+
+
+def _table_to_pandas(table, compact_types):
+    """Convert an Arrow table, dictionary-encoding categorical columns first so strings are never expanded."""
+    if not compact_types:
+        return table.to_pandas()
+    for name in columns_of_kind(CRASH_SCHEMA, 'category'):
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, table[name].dictionary_encode())
+    return compact(table.to_pandas())
+
+
+def _read_store(crash_file, columns, years, boroughs, compact_types):
+    """Read the requested columns and partitions from the columnar store."""
+    dataset = _open_store(crash_file)
+    columns = list(CRASH_DTYPES) + PROJECTED_COLUMNS if columns is None else columns
+    table = dataset.to_table(columns=columns, filter=_partition_filter(years, boroughs))
+    return _table_to_pandas(table, compact_types)
+
+
+def _csv_columns(columns, extra=()):
+    """Map requested columns onto CSV columns, adding lat/lon when projected x/y are requested."""
+    if columns is None:
+        return None
+    csv_columns = [col for col in list(columns) + list(extra) if col not in PROJECTED_COLUMNS]
+    if any(col in PROJECTED_COLUMNS for col in columns):
+        csv_columns += ['LATITUDE', 'LONGITUDE']
+    return list(dict.fromkeys(csv_columns))
+
+
+def _finish_csv_chunk(crashes, columns):
+    """Project on the fly and select the requested columns for CSV-backed reads."""
+    if columns is None or any(col in PROJECTED_COLUMNS for col in columns):
+        crashes = add_projected_columns(crashes, 'LONGITUDE', 'LATITUDE')
+    return crashes[list(CRASH_DTYPES) + PROJECTED_COLUMNS if columns is None else list(columns)]
+
+
+def _csv_dtypes(usecols, compact_types):
+    """read_csv dtypes: categoricals parsed straight into categories when compacting."""
+    if compact_types:
+        return read_dtypes(usecols)
+    return CRASH_DTYPES if usecols is None else {col: CRASH_DTYPES[col] for col in usecols if col in CRASH_DTYPES}
+
+
+def _read_csv(crash_file, columns, years, boroughs, compact_types):
+    """Fall back to parsing the CSV when no store has been built yet."""
+    filter_columns = (['CRASH DATE'] if years is not None else []) + (['BOROUGH'] if boroughs is not None else [])
+    usecols = _csv_columns(columns, filter_columns)
+    crashes = pd.read_csv(crash_file, usecols=usecols, dtype=_csv_dtypes(usecols, compact_types), low_memory=False)
+
+    if years is not None:
+        crash_years = pd.to_numeric(crashes['CRASH DATE'].str[-4:], errors='coerce')
+        crashes = crashes[crash_years.isin([int(year) for year in years])]
+    if boroughs is not None:
+        crashes = crashes[crashes['BOROUGH'].isin([borough.upper() for borough in boroughs])]
+    # Project before compacting so x_ft/y_ft match the ones computed at ingest
+    crashes = _finish_csv_chunk(crashes.reset_index(drop=True), columns)
+    return compact(crashes) if compact_types else crashes
+
+
+def read_crashes(crash_file, columns=None, years=None, boroughs=None, compact_types=True):
+    """Load crashes, preferring the columnar store and reading only the needed columns/partitions.
+
+    With `compact_types` columns get the compact dtypes of schema.CRASH_SCHEMA (categoricals and
+    narrow ints); lat/lon and the projected x_ft/y_ft always stay float64.
+    """
+    if columns is not None:
+        columns = list(columns)
+    if store_exists(crash_file):
+        return _read_store(crash_file, columns, years, boroughs, compact_types)
+    return _read_csv(crash_file, columns, years, boroughs, compact_types)
+
+
+def iter_crash_chunks(crash_file, columns=None, chunksize=250_000, compact_types=True):
+    """Yield the crashes as DataFrames of at most `chunksize` rows, so memory stays bounded."""
+    columns = list(CRASH_DTYPES) + PROJECTED_COLUMNS if columns is None else list(columns)
+    if store_exists(crash_file):
+        # Read one batch ahead at most so the whole store is never resident
+        batches = _open_store(crash_file).to_batches(
+            columns=columns, batch_size=chunksize, batch_readahead=1, fragment_readahead=1
+        )
+        for batch in batches:
+            yield _table_to_pandas(pa.Table.from_batches([batch]), compact_types)
+    else:
+        usecols = _csv_columns(columns)
+        dtypes = _csv_dtypes(usecols, compact_types)
+        for chunk in pd.read_csv(crash_file, usecols=usecols, dtype=dtypes, chunksize=chunksize, low_memory=False):
+            chunk = _finish_csv_chunk(chunk, columns)
+            yield compact(chunk) if compact_types else chunk
+
+
+def read_bus_stops(bus_stop_file, columns=None):
+    """Load the bus shelters with x_ft/y_ft attached from a projection cache keyed by the file hash."""
+    bus_stops = pd.read_csv(bus_stop_file, usecols=columns, dtype=BUS_STOP_DTYPES, low_memory=False)
+    if columns is not None and not {'Latitude', 'Longitude'} <= set(columns):
+        return bus_stops
+
+    # The cache sits next to the CSV and is named after its contents
+    cache_file = f"{os.path.splitext(bus_stop_file)[0]}.{file_digest(bus_stop_file)[:16]}.xy.npy"
+    if os.path.exists(cache_file):
+        xy = np.load(cache_file)
+        bus_stops['x_ft'] = xy[:, 0]
+        bus_stops['y_ft'] = xy[:, 1]
+    else:
+        bus_stops = add_projected_columns(bus_stops, 'Longitude', 'Latitude')
+        np.save(cache_file, bus_stops[PROJECTED_COLUMNS].to_numpy())
+    return bus_stops
+
+
+def main():
+    # File paths
+    crash_file = 'data/crash_collisions.csv'
+
+    # Convert the CSV into the partitioned store
+    ingest_crashes(crash_file)
+
+
+if __name__ == "__main__":
+    main()
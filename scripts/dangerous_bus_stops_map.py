@@ -1,9 +1,13 @@
 # didnt work as I wanted it to
 
-import pandas as pd
-import geopandas as gpd
 import folium
-from shapely.geometry import Point
+import pipeline
+from adjacency import ADJACENCY_DIR, load_adjacency, pairs as adjacency_pairs, stop_counts
+from spatial_index import projected_xy
+from ranking import top_k
+
+# Crash columns this analysis needs
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft']
 
 # ----------------------------
 # 1. Load Data with Enhanced Checks
@@ -11,15 +15,7 @@ from shapely.geometry import Point
 def load_data():
     # Load crashes with error handling for coordinate columns
     try:
-        crashes = pd.read_csv(
-            'data/crash_collisions.csv',
-            dtype={'LATITUDE': float, 'LONGITUDE': float},
-            low_memory=False
-        )
-        bus_stops = pd.read_csv(
-            'data/bus_stop_locations.csv',
-            dtype={'Latitude': float, 'Longitude': float}
-        )
+        crashes, bus_stops = pipeline.load_data('data/crash_collisions.csv', 'data/bus_stop_locations.csv', columns=CRASH_COLUMNS)
     except KeyError as e:
         raise ValueError(f"Missing required column: {e}. Check your CSV headers.")
 
@@ -38,26 +34,15 @@ def load_data():
 # 2. Clean Data with Strict Validation
 # ----------------------------
 def clean_data(crashes, bus_stops):
-    # Clean crashes
     initial_count = len(crashes)
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE']).rename(
-        columns={'LATITUDE': 'crash_lat', 'LONGITUDE': 'crash_lon'}
-    )
-    crashes = crashes[
-        (crashes['crash_lat'].between(40.5, 40.9)) & 
-        (crashes['crash_lon'].between(-74.3, -73.7))
-    ]
-    print(f"\nRemoved {initial_count - len(crashes)} invalid crash records")
-
-    # Clean bus stops
     initial_stops = len(bus_stops)
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude']).rename(
-        columns={'Latitude': 'stop_lat', 'Longitude': 'stop_lon'}
-    )
-    bus_stops = bus_stops[
-        (bus_stops['stop_lat'].between(40.5, 40.9)) & 
-        (bus_stops['stop_lon'].between(-74.3, -73.7))
-    ]
+
+    # Shared cleaning, restricted to the NYC bounding box
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops, bounds=pipeline.NYC_BOUNDS)
+    crashes = crashes.rename(columns={'latitude': 'crash_lat', 'longitude': 'crash_lon'})
+    bus_stops = bus_stops.rename(columns={'latitude': 'stop_lat', 'longitude': 'stop_lon'})
+
+    print(f"\nRemoved {initial_count - len(crashes)} invalid crash records")
     print(f"Removed {initial_stops - len(bus_stops)} invalid bus stop records")
 
     return crashes, bus_stops
@@ -65,44 +50,37 @@ def clean_data(crashes, bus_stops):
 # ----------------------------
 # 3. Spatial Analysis with Detailed Debugging
 # ----------------------------
-def get_top_bus_stops(crashes, bus_stops, distance_ft=100):
-    # Convert to meters
-    distance_m = distance_ft * 0.3048
-
-    # Create geometries with validation
-    def safe_create_gdf(df, x_col, y_col, crs):
+def get_top_bus_stops(crashes, bus_stops, distance_ft=100, adjacency_dir=None):
+    # Pair crashes with stops by point distance in NY State Plane feet (precomputed x/y when present)
+    def safe_projected_xy(df, x_col, y_col):
         try:
-            return gpd.GeoDataFrame(
-                df,
-                geometry=gpd.points_from_xy(df[x_col], df[y_col]),
-                crs=crs
-            ).to_crs('EPSG:3857')  # Ensure consistent CRS
+            return projected_xy(df, x_col, y_col)
         except ValueError as e:
             raise ValueError(f"Coordinate error: {e}. Check {x_col}/{y_col} values.")
 
-    # Create GeoDataFrames
-    crashes_gdf = safe_create_gdf(crashes, 'crash_lon', 'crash_lat', 'EPSG:4326')
-    bus_stops_gdf = safe_create_gdf(bus_stops, 'stop_lon', 'stop_lat', 'EPSG:4326')
-
-    # Create buffers
-    bus_stops_gdf['buffer'] = bus_stops_gdf.geometry.buffer(distance_m)
+    crashes_xy = safe_projected_xy(crashes, 'crash_lon', 'crash_lat')
+    bus_stops_xy = safe_projected_xy(bus_stops, 'stop_lon', 'stop_lat')
 
-    # Spatial join with progress indication
+    # Distance join: every crash within distance_ft of a stop, read from the adjacency (persisted when given a dir)
     print("\nPerforming spatial join...")
-    crashes_near_stops = gpd.sjoin_nearest(crashes_gdf, bus_stops_gdf, how='inner', distance_col='distance')  # Use nearest join
+    adjacency = load_adjacency(crashes_xy, bus_stops_xy, distance_ft, adjacency_dir=adjacency_dir)
+    pairs = adjacency_pairs(adjacency)
+    crashes_near_stops = crashes.iloc[pairs['crash_index']].copy()
+    crashes_near_stops['index_right'] = bus_stops.index[pairs['stop_index']]
+    crashes_near_stops['distance'] = pairs['distance_ft'].to_numpy()
 
     if crashes_near_stops.empty:
         # Diagnostic plot
         print("\nCreating diagnostic map...")
         m = folium.Map(location=[40.7128, -74.0060], zoom_start=11)
-        for _, stop in bus_stops_gdf.sample(100).iterrows():
+        for _, stop in bus_stops.sample(min(100, len(bus_stops))).iterrows():
             folium.Circle(
                 location=[stop['stop_lat'], stop['stop_lon']],
                 radius=30.48,
                 color='blue',
                 fill=True
             ).add_to(m)
-        for _, crash in crashes_gdf.sample(100).iterrows():
+        for _, crash in crashes.sample(min(100, len(crashes))).iterrows():
             folium.CircleMarker(
                 location=[crash['crash_lat'], crash['crash_lon']],
                 radius=2,
@@ -120,12 +98,11 @@ def get_top_bus_stops(crashes, bus_stops, distance_ft=100):
             "Check diagnostic_map.html to verify spatial relationships"
         )
 
-    # Count crashes per stop
-    crash_counts = crashes_near_stops.groupby('index_right').size().reset_index(name='crash_count')
-    bus_stops = bus_stops.merge(crash_counts, left_index=True, right_on='index_right', how='left')
-    bus_stops['crash_count'] = bus_stops['crash_count'].fillna(0).astype(int)
+    # Count crashes per stop (row lengths of the adjacency)
+    bus_stops = bus_stops.copy()
+    bus_stops['crash_count'] = stop_counts(adjacency)
 
-    return bus_stops.sort_values('crash_count', ascending=False).head(10), crashes_near_stops
+    return top_k(bus_stops, metric='crash_count', k=10), crashes_near_stops
 
 # ----------------------------
 # 4. Create Map
@@ -166,7 +143,7 @@ if __name__ == "__main__":
     print(f"Valid bus stops remaining: {len(bus_stops)}")
     
     try:
-        top_10_stops, crashes_near_stops = get_top_bus_stops(crashes, bus_stops)
+        top_10_stops, crashes_near_stops = get_top_bus_stops(crashes, bus_stops, adjacency_dir=ADJACENCY_DIR)
         result_map = create_map(top_10_stops, crashes_near_stops)
         result_map.save('outputs/final_map.html')
         print("\nSuccess! Map saved to outputs/final_map.html")
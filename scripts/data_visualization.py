@@ -1,4 +1,5 @@
 import folium
+from grid_layer import add_crash_grid_layer
 
 
 def create_map(nearby_crashes, output_path='outputs/crashes_near_bus_stops.html'):
@@ -11,15 +12,8 @@ def create_map(nearby_crashes, output_path='outputs/crashes_near_bus_stops.html'
     map_obj = folium.Map(location=[center_lat, center_long], zoom_start=12)
 
 
-    # Add crash points to the map
-    for _, row in nearby_crashes.iterrows():
-        folium.CircleMarker(
-            location=[row['latitude'], row['longitude']],
-            radius=5,
-            color='red',
-            fill=True,
-            fill_color='red',
-        ).add_to(map_obj)
+    # Add crashes to the map as one aggregated hexagon layer
+    add_crash_grid_layer(map_obj, nearby_crashes)
 
 
     # Save the map
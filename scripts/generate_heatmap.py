@@ -1,32 +1,26 @@
-import pandas as pd
 import folium
 from folium.plugins import HeatMap
+import pipeline
+from heat_grid import heat_data as binned_heat_data, HEAT_WEIGHTS
+from grid_layer import map_zoom
+
+
+# Crash columns this analysis needs (plus the columns the heatmap can be weighted by)
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE'] + list(HEAT_WEIGHTS.values())
 
 
 def load_data(crash_file, bus_stop_file):
     """Load the crash and bus stop data."""
-    crashes = pd.read_csv(crash_file, dtype={'LATITUDE': float, 'LONGITUDE': float})
-    bus_stops = pd.read_csv(bus_stop_file, dtype={'Longitude': float, 'Latitude': float})
-    return crashes, bus_stops
+    return pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
 
 
 def clean_data(crashes, bus_stops):
     """Clean crash and bus stop data."""
-    # Drop rows with missing latitude/longitude
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
-
-
-    # Ensure consistent column names for latitude and longitude
-    crashes = crashes.rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-    bus_stops = bus_stops.rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
-
-
-    return crashes, bus_stops
+    return pipeline.clean_data(crashes, bus_stops)
 
 
-def create_heatmap(crashes, bus_stops, output_path='outputs/bus_stop_crash_heatmap.html'):
-    """Create an interactive heatmap showing crash densities near bus stops."""
+def create_heatmap(crashes, bus_stops, output_path='outputs/bus_stop_crash_heatmap.html', weight=None):
+    """Create an interactive heatmap showing crash densities (or `weight` sums, e.g. 'injured') near bus stops."""
     # Initialize the map centered around the average location of bus stops
     center_lat = bus_stops['latitude'].mean()
     center_long = bus_stops['longitude'].mean()
@@ -34,7 +28,7 @@ def create_heatmap(crashes, bus_stops, output_path='outputs/bus_stop_crash_heatm
 
 
     # Prepare data for the heatmap
-    heat_data = [[row['latitude'], row['longitude']] for index, row in crashes.iterrows()]
+    heat_data = binned_heat_data(crashes, weight=weight, zoom=map_zoom(map_obj))
 
 
     # Add the heatmap layer
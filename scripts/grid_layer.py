@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+import pandas as pd
+import folium
+import branca.colormap as cm
+
+from spatial_index import projected_xy, unproject_from_feet
+
+
+# Injury columns summed per cell when the crash frame has them
+WEIGHT_COLUMNS = {
+    'injured': 'NUMBER OF PERSONS INJURED',
+    'killed': 'NUMBER OF PERSONS KILLED'
+}
+
+# Target on-screen width of one hexagon, in pixels
+CELL_PIXELS = 24
+
+# Latitude the Web Mercator ground resolution is evaluated at
+NYC_LATITUDE = 40.7
+
+
+def feet_per_pixel(zoom):
+    """Ground distance covered by one Web Mercator pixel at `zoom` over NYC."""
+    return 156543.03392 * math.cos(math.radians(NYC_LATITUDE)) / 2 ** zoom / 0.3048
+
+
+def map_zoom(map_obj):
+    """The zoom a folium map opens at (its zoom_start), which cell sizes are picked for."""
+    return map_obj.options['zoom']
+
+
+def cell_size_for_zoom(zoom, cell_pixels=CELL_PIXELS):
+    """Hexagon size (centre to corner, feet) that renders about `cell_pixels` wide at `zoom`."""
+    return cell_pixels * feet_per_pixel(zoom) / math.sqrt(3)
+
+
+def hex_cells(x, y, size):
+    """Assign projected points to pointy-top hexagons of `size`; returns integer axial (q, r) arrays."""
+    # Fractional axial coordinates
+    q = (math.sqrt(3) / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+
+    # Round in cube coordinates and fix the component with the largest rounding error
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def bin_crashes(crashes, zoom, lon_col='longitude', lat_col='latitude'):
+    """Aggregate crashes into hexagons sized for `zoom`: per-cell crash counts and injury sums."""
+    crashes = crashes.dropna(subset=[lon_col, lat_col])
+    size = cell_size_for_zoom(zoom)
+    xy = projected_xy(crashes, lon_col, lat_col)
+    q, r = hex_cells(xy[:, 0], xy[:, 1], size)
+
+    # Group identical cells with one sort instead of a Python loop
+    cells, cell_ids = np.unique(np.column_stack([q, r]), axis=0, return_inverse=True)
+    cell_ids = cell_ids.ravel()
+    grid = pd.DataFrame({'q': cells[:, 0], 'r': cells[:, 1]})
+    grid['crash_count'] = np.bincount(cell_ids, minlength=len(cells))
+    for name, column in WEIGHT_COLUMNS.items():
+        if column in crashes:
+            grid[name] = np.bincount(cell_ids, weights=crashes[column].fillna(0).to_numpy(), minlength=len(cells)).astype(np.int64)
+    grid.attrs['size'] = size
+    return grid
+
+
+def grid_geojson(grid):
+    """Turn binned cells into a GeoJSON FeatureCollection of hexagon polygons in lon/lat."""
+    size = grid.attrs['size']
+
+    # Hexagon centres, then the six corners of every hexagon at once
+    cx = size * math.sqrt(3) * (grid['q'].to_numpy() + grid['r'].to_numpy() / 2)
+    cy = size * 1.5 * grid['r'].to_numpy()
+    angles = np.radians(60 * np.arange(6) - 30)
+    corner_x = cx[:, None] + size * np.cos(angles)[None, :]
+    corner_y = cy[:, None] + size * np.sin(angles)[None, :]
+    lon, lat = unproject_from_feet(corner_x.ravel(), corner_y.ravel())
+    lon = np.round(lon, 6).reshape(-1, 6)
+    lat = np.round(lat, 6).reshape(-1, 6)
+
+    properties = grid.drop(columns=['q', 'r']).to_dict('records')
+    features = []
+    for i, props in enumerate(properties):
+        ring = [[lon[i, j], lat[i, j]] for j in range(6)]
+        ring.append(ring[0])
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {key: int(value) for key, value in props.items()}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def add_crash_grid_layer(map_obj, crashes, name='Crashes', lon_col='longitude', lat_col='latitude'):
+    """Add crashes to a folium map as one hexagon choropleth layer instead of one marker per crash.
+
+    Hexagons are sized for the zoom the map opens at.
+    """
+    grid = bin_crashes(crashes, map_zoom(map_obj), lon_col=lon_col, lat_col=lat_col)
+    if grid.empty:
+        return map_obj
+
+    # Log colour scale so a few very busy cells don't wash out the rest
+    colormap = cm.linear.YlOrRd_09.scale(0, math.log1p(grid['crash_count'].max()))
+    colormap.caption = 'Crashes per cell (log scale)'
+    fill = {int(count): colormap(math.log1p(count)) for count in grid['crash_count'].unique()}
+
+    tooltip_fields = [column for column in ['crash_count', *WEIGHT_COLUMNS] if column in grid]
+    folium.GeoJson(
+        grid_geojson(grid),
+        name=name,
+        style_function=lambda feature: {
+            'fillColor': fill[feature['properties']['crash_count']],
+            'color': None,
+            'weight': 0,
+            'fillOpacity': 0.6
+        },
+        tooltip=folium.GeoJsonTooltip(fields=tooltip_fields)
+    ).add_to(map_obj)
+    colormap.add_to(map_obj)
+    return map_obj
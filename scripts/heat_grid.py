@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+
+from grid_layer import feet_per_pixel, NYC_LATITUDE
+from pipeline import NYC_BOUNDS
+
+
+# Weight options: None counts crashes, anything else sums that column
+HEAT_WEIGHTS = {
+    'injured': 'NUMBER OF PERSONS INJURED',
+    'killed': 'NUMBER OF PERSONS KILLED',
+    'pedestrian': 'NUMBER OF PEDESTRIANS INJURED',
+    'cyclist': 'NUMBER OF CYCLIST INJURED',
+    'motorist': 'NUMBER OF MOTORIST INJURED'
+}
+
+# Cell sizes (feet) of the pyramid; each level is 4x coarser than the one before
+HEAT_CELL_SIZES_FT = (50, 200, 800, 3200)
+
+# Feet per degree of latitude
+FEET_PER_DEGREE = 364_000
+
+
+def _weights(crashes, weight):
+    """Per-crash weights for the requested option."""
+    if weight is None:
+        return np.ones(len(crashes))
+    if weight not in HEAT_WEIGHTS:
+        raise ValueError(f"Unknown heat weight '{weight}'. Use None or one of {sorted(HEAT_WEIGHTS)}.")
+    return crashes[HEAT_WEIGHTS[weight]].fillna(0).to_numpy(dtype='float64')
+
+
+def build_heat_pyramid(crashes, weight=None, cell_sizes_ft=HEAT_CELL_SIZES_FT):
+    """Bin crashes once into a weighted 2D histogram at the finest size, then sum blocks for the coarser ones.
+
+    Returns {cell_size_ft: (histogram, lat_edges, lon_edges)}.
+    """
+    # The grid spans the located crashes, so mis-geocoded points (e.g. 0, 0) must not stretch it
+    lat_min, lat_max, lon_min, lon_max = NYC_BOUNDS
+    crashes = crashes[crashes['latitude'].between(lat_min, lat_max) & crashes['longitude'].between(lon_min, lon_max)]
+    latitude = crashes['latitude'].to_numpy(dtype='float64')
+    longitude = crashes['longitude'].to_numpy(dtype='float64')
+    weights = _weights(crashes, weight)
+
+    finest = cell_sizes_ft[0]
+    lat_step = finest / FEET_PER_DEGREE
+    lon_step = lat_step / math.cos(math.radians(NYC_LATITUDE))
+
+    # Snap the extent to a grid that every coarser level divides evenly
+    factor = int(cell_sizes_ft[-1] // finest)
+    lat_cells = max(1, math.ceil((latitude.max() - latitude.min()) / lat_step / factor)) * factor if len(latitude) else factor
+    lon_cells = max(1, math.ceil((longitude.max() - longitude.min()) / lon_step / factor)) * factor if len(longitude) else factor
+    lat_min = latitude.min() if len(latitude) else NYC_LATITUDE
+    lon_min = longitude.min() if len(longitude) else -74.0
+    lat_edges = lat_min + lat_step * np.arange(lat_cells + 1)
+    lon_edges = lon_min + lon_step * np.arange(lon_cells + 1)
+
+    histogram, _, _ = np.histogram2d(latitude, longitude, bins=[lat_edges, lon_edges], weights=weights)
+
+    pyramid = {}
+    for cell_size in cell_sizes_ft:
+        block = int(cell_size // finest)
+        coarse = histogram.reshape(lat_cells // block, block, lon_cells // block, block).sum(axis=(1, 3))
+        pyramid[cell_size] = (coarse, lat_edges[::block], lon_edges[::block])
+    return pyramid
+
+
+def pick_cell_size(zoom, cell_sizes_ft=HEAT_CELL_SIZES_FT, max_pixels=4):
+    """Coarsest pyramid level whose cells are still at most `max_pixels` wide at `zoom`."""
+    fitting = [size for size in cell_sizes_ft if size / feet_per_pixel(zoom) <= max_pixels]
+    return max(fitting) if fitting else min(cell_sizes_ft)
+
+
+def heat_cells(pyramid, cell_size_ft):
+    """Non-empty cells of one level as [lat, lon, weight] rows, weights scaled to 0-1 for leaflet.heat."""
+    histogram, lat_edges, lon_edges = pyramid[cell_size_ft]
+    rows, cols = np.nonzero(histogram)
+    values = histogram[rows, cols]
+    if len(values) == 0:
+        return []
+
+    # Cell centres
+    lat = (lat_edges[rows] + lat_edges[rows + 1]) / 2
+    lon = (lon_edges[cols] + lon_edges[cols + 1]) / 2
+    return np.column_stack([np.round(lat, 6), np.round(lon, 6), np.round(values / values.max(), 4)]).tolist()
+
+
+def heat_data(crashes, weight=None, zoom=12):
+    """Weighted heat points for a map shown at `zoom`, one per non-empty cell instead of one per crash."""
+    pyramid = build_heat_pyramid(crashes, weight=weight)
+    return heat_cells(pyramid, pick_cell_size(zoom))
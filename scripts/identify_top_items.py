@@ -4,22 +4,25 @@ from tqdm import tqdm
 from folium.plugins import MarkerCluster, HeatMap
 import gc  # For garbage collection
 from folium import Icon
+import pipeline
+from ranking import top_k
+from heat_grid import heat_data as binned_heat_data, HEAT_WEIGHTS
+from grid_layer import map_zoom
+
+# Crash columns this analysis needs (plus the columns the heatmap can be weighted by)
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft'] + list(HEAT_WEIGHTS.values())
 
 def load_data(crash_file, bus_stop_file):
     """Load the crash and bus stop data."""
     print("Loading data...")
-    crashes = pd.read_csv(crash_file, dtype={'LATITUDE': float, 'LONGITUDE': float}, low_memory=False)
-    bus_stops = pd.read_csv(bus_stop_file, dtype={'Longitude': float, 'Latitude': float}, low_memory=False)
+    crashes, bus_stops = pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
     print("Data loaded successfully!")
     return crashes, bus_stops
 
 def clean_data(crashes, bus_stops):
     """Clean crash and bus stop data."""
     print("Cleaning data...")
-    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
-    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
-    crashes = crashes.rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-    bus_stops = bus_stops.rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops)
     print("Data cleaned successfully!")
     return crashes, bus_stops
 
@@ -27,8 +30,8 @@ def get_locations_for_top_bus_stops(bus_stops, top_ids):
     """Extract the latitude and longitude of the top bus stop IDs."""
     return bus_stops[bus_stops['Shelter_ID'].isin(top_ids)][['Shelter_ID', 'latitude', 'longitude']]
 
-def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150):
-    """Plot crashes and top bus stops on a map with circular buffers."""
+def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150, weight=None):
+    """Plot crashes (optionally weighted, e.g. weight='pedestrian') and top bus stops on a map with circular buffers."""
     # Drop rows with NaN values in latitude or longitude
     top_bus_stop_locations = top_bus_stop_locations.dropna(subset=['latitude', 'longitude'])
 
@@ -59,7 +62,7 @@ def plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, distance=150
         ).add_to(crash_map)
 
     # Prepare data for heatmap
-    heat_data = [[row['latitude'], row['longitude']] for index, row in crashes.iterrows()]
+    heat_data = binned_heat_data(crashes, weight=weight, zoom=map_zoom(crash_map))
 
     # Add heatmap layer
     HeatMap(heat_data, radius=15).add_to(crash_map)
@@ -78,16 +81,12 @@ def main():
     crashes, bus_stops = load_data(crash_file, bus_stop_file)
     crashes, bus_stops = clean_data(crashes, bus_stops)
 
-    # Top bus stop IDs
-    top_ids = ['BR0216', 'MN0287', 'MN01369', 'QN04932', 
-              'QN05032', 'MN0116', 'MN01137', 
-              'MN01674', 'SI05204', "MN01376"]
-
-    # Get locations for the top bus stops
+    # Top bus stops by pedestrian injuries, from per-stop aggregates over the same frames
+    top_ids = top_k(pipeline.aggregate_frames(crashes, bus_stops), metric='pedestrian', k=10)['Shelter_ID']
     top_bus_stop_locations = get_locations_for_top_bus_stops(bus_stops, top_ids)
 
     # Plot crashes and bus stops
-    plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations)
+    plot_crashes_and_top_bus_stops(crashes, top_bus_stop_locations, weight='pedestrian')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
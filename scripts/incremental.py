@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from adjacency import ADJACENCY_DIR
+from crash_store import read_crashes, read_bus_stops, file_digest
+from pipeline import AGGREGATE_COLUMNS, stop_totals
+from ranking import top_k
+
+
+# Where the persisted per-stop aggregates and their ledger live
+STATE_DIR = 'data/incremental'
+
+# Crash columns needed to join a crash and attribute its injuries to stops
+CRASH_COLUMNS = ['COLLISION_ID', 'LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft'] + AGGREGATE_COLUMNS
+
+
+def _state_files(state_dir):
+    return (
+        os.path.join(state_dir, 'aggregates.parquet'),
+        os.path.join(state_dir, 'ledger.parquet'),
+        os.path.join(state_dir, 'state.json')
+    )
+
+
+def _ledger(crashes, pairs):
+    """One row per (crash, stop) match holding exactly what the crash added to that stop."""
+    matched = crashes.iloc[pairs['crash_index'].to_numpy()]
+    ledger = pd.DataFrame({
+        'COLLISION_ID': matched['COLLISION_ID'].to_numpy(),
+        'stop_index': pairs['stop_index'].to_numpy()
+    })
+    for column in AGGREGATE_COLUMNS:
+        ledger[column] = matched[column].fillna(0).to_numpy().astype(np.int64)
+    return ledger
+
+
+def _prepare(crashes, bus_stop_file):
+    """Clean and project crashes together with the stop index the aggregates are keyed on."""
+    crashes, bus_stops = pipeline.clean_data(crashes, read_bus_stops(bus_stop_file))
+    return pipeline.project(crashes, bus_stops)
+
+
+def _save_state(state_dir, aggregates, ledger, state):
+    aggregates_file, ledger_file, state_file = _state_files(state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    aggregates.to_parquet(aggregates_file)
+    ledger.to_parquet(ledger_file, index=False)
+    with open(state_file, 'w') as f:
+        json.dump(state, f)
+
+
+def build_state(crash_file, bus_stop_file, radius_ft=150, state_dir=STATE_DIR, adjacency_dir=None):
+    """Run the full join once and persist the per-stop aggregates with a ledger of every match.
+
+    The join reads the stop x crash adjacency, persisted in `adjacency_dir` when given.
+    """
+    crashes, bus_stops = _prepare(read_crashes(crash_file, columns=CRASH_COLUMNS), bus_stop_file)
+
+    # Keep only the last row of any repeated COLLISION_ID
+    crashes = crashes.drop_duplicates('COLLISION_ID', keep='last')
+    pairs = pipeline.join(crashes, bus_stops, radius_ft=radius_ft, adjacency_dir=adjacency_dir)
+
+    aggregates = pipeline.aggregate(crashes, bus_stops, pairs).reset_index(drop=True)
+    state = {'radius_ft': radius_ft, 'bus_stop_sha256': file_digest(bus_stop_file)}
+    _save_state(state_dir, aggregates, _ledger(crashes, pairs), state)
+    print(f"Aggregates for {len(aggregates)} bus stops saved to '{state_dir}'.")
+    return aggregates
+
+
+def apply_delta(delta_file, bus_stop_file, state_dir=STATE_DIR, top_n=10):
+    """Fold a delta CSV of new or updated crashes into the persisted aggregates and return the new top-N.
+
+    Rows are de-duplicated on COLLISION_ID. Any earlier contribution of those collisions is retracted
+    from the aggregates before the new version is joined against the stop index and applied, so
+    updated records are counted exactly once.
+    """
+    aggregates_file, ledger_file, state_file = _state_files(state_dir)
+    if not os.path.exists(state_file):
+        raise ValueError(f"No persisted aggregates in '{state_dir}'. Run build_state first.")
+    with open(state_file) as f:
+        state = json.load(f)
+    if state['bus_stop_sha256'] != file_digest(bus_stop_file):
+        raise ValueError("Bus stop file changed since the aggregates were built. Run build_state again.")
+
+    aggregates = pd.read_parquet(aggregates_file)
+    ledger = pd.read_parquet(ledger_file)
+    value_columns = ['crash_count'] + AGGREGATE_COLUMNS
+
+    # Load and de-duplicate the delta
+    delta = read_crashes(delta_file, columns=CRASH_COLUMNS)
+    delta = delta.drop_duplicates('COLLISION_ID', keep='last')
+
+    # Retract what earlier versions of these collisions contributed
+    retracted = ledger['COLLISION_ID'].isin(delta['COLLISION_ID'])
+    old = ledger[retracted]
+    if not old.empty:
+        aggregates[value_columns] -= stop_totals(old['stop_index'].to_numpy(), old[AGGREGATE_COLUMNS], len(aggregates))
+        ledger = ledger[~retracted]
+
+    # Join only the new rows against the stop index and apply them (a one-off matrix, so not persisted)
+    crashes, bus_stops = _prepare(delta, bus_stop_file)
+    pairs = pipeline.join(crashes, bus_stops, radius_ft=state['radius_ft'])
+    new = _ledger(crashes, pairs)
+    if not new.empty:
+        aggregates[value_columns] += stop_totals(new['stop_index'].to_numpy(), new[AGGREGATE_COLUMNS], len(aggregates))
+    aggregates['has_accident'] = aggregates['crash_count'] > 0
+
+    ledger = pd.concat([ledger, new], ignore_index=True)
+    _save_state(state_dir, aggregates, ledger, state)
+    print(f"Applied {len(delta)} collisions ({int(retracted.sum())} earlier matches retracted, {len(new)} new matches).")
+
+    # Refresh the ranking
+    return top_k(aggregates, metric='crash_count', k=top_n)
+
+
+def main():
+    # File paths
+    crash_file = 'data/crash_collisions.csv'
+    bus_stop_file = 'data/bus_stop_locations.csv'
+
+    # `incremental.py DELTA.csv` applies a delta; with no argument the state is rebuilt from scratch
+    if len(sys.argv) > 1:
+        print(apply_delta(sys.argv[1], bus_stop_file))
+    else:
+        build_state(crash_file, bus_stop_file, adjacency_dir=ADJACENCY_DIR)
+
+
+if __name__ == "__main__":
+    main()
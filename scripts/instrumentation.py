@@ -0,0 +1,225 @@
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+
+# Environment switches: BUS_STOP_PROFILE=1 (or a report path) turns instrumentation on,
+# BUS_STOP_PROFILE_STAGE=<stage> also writes a cProfile dump of that stage
+PROFILE_ENV = 'BUS_STOP_PROFILE'
+PROFILE_STAGE_ENV = 'BUS_STOP_PROFILE_STAGE'
+
+# Default report; a .csv path writes CSV instead of JSON
+REPORT_FILE = 'outputs/profile/stages.json'
+
+# The active recorder, or None when instrumentation is off
+_recorder = None
+
+
+def _peak_rss_mb():
+    """High-water mark of the process resident set size."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def rows(value):
+    """Row count of a stage input/output: frames and arrays, tuples of them, or dicts holding them."""
+    if isinstance(value, tuple):
+        return [rows(item) for item in value]
+    if isinstance(value, dict):
+        return {key: rows(item) for key, item in value.items() if rows(item) is not None} or None
+    if hasattr(value, 'shape'):
+        return int(value.shape[0]) if len(value.shape) else None
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+
+class _NullStage:
+    """What `stage()` hands out when instrumentation is off: every call is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def output(self, value):
+        return value
+
+    def note(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """One timed stage; times of nested stages are also included in their parent's."""
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.record = {'stage': name, 'depth': len(recorder.stack)}
+        self.children_rows = []
+        self.profile = None
+
+    def __enter__(self):
+        recorder = self.recorder
+        recorder.mark_peak()
+        # Appended on entry so the report lists stages in the order they started
+        recorder.records.append(self.record)
+        recorder.stack.append(self)
+        self.peak_traced = 0
+        self.start_traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        self.start_rss = _peak_rss_mb()
+        if recorder.profile_stage == self.record['stage']:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        if self.profile is not None:
+            self.profile.disable()
+            self.record['profile'] = self.recorder.dump_profile(self.record['stage'], self.profile)
+
+        recorder = self.recorder
+        recorder.mark_peak()
+        recorder.stack.pop()
+        end_rss = _peak_rss_mb()
+        self.record.update({
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'peak_rss_mb': end_rss,
+            'rss_growth_mb': round(end_rss - self.start_rss, 1) if end_rss is not None else None,
+        })
+        if tracemalloc.is_tracing():
+            current = tracemalloc.get_traced_memory()[0]
+            self.record['traced_delta_mb'] = round((current - self.start_traced) / 2 ** 20, 2)
+            self.record['traced_peak_mb'] = round((self.peak_traced - self.start_traced) / 2 ** 20, 2)
+        if exc[0] is not None:
+            self.record['error'] = exc[0].__name__
+
+        # A stage's input is whatever its nested upstream stages produced
+        if self.children_rows:
+            self.record['rows_in'] = self.children_rows[0] if len(self.children_rows) == 1 else self.children_rows
+        if recorder.stack:
+            recorder.stack[-1].children_rows.append(self.record.get('rows_out'))
+        return False
+
+    def output(self, value):
+        """Record the row count of the stage output and hand the value back."""
+        self.record['rows_out'] = rows(value)
+        return value
+
+    def note(self, **fields):
+        """Attach extra fields (e.g. cache_hit=True) to the stage record."""
+        self.record.update(fields)
+
+
+class _Recorder:
+    def __init__(self, report_file, profile_stage, trace_memory):
+        self.report_file = report_file
+        self.profile_stage = profile_stage
+        self.records = []
+        self.stack = []
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def mark_peak(self):
+        """Fold the traced peak so far into every open stage, then start a fresh peak window."""
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_stage in self.stack:
+            open_stage.peak_traced = max(open_stage.peak_traced, peak)
+        tracemalloc.reset_peak()
+
+    def dump_profile(self, stage_name, profile):
+        """Write a pstats file (readable by snakeviz, flameprof or `python -m pstats`)."""
+        profile_file = os.path.join(os.path.dirname(self.report_file) or '.', f"{stage_name}.prof")
+        os.makedirs(os.path.dirname(profile_file) or '.', exist_ok=True)
+        profile.dump_stats(profile_file)
+        return profile_file
+
+
+def enable(report_file=REPORT_FILE, profile_stage=None, trace_memory=True):
+    """Turn instrumentation on for the rest of the process."""
+    global _recorder
+    _recorder = _Recorder(report_file, profile_stage, trace_memory)
+
+
+def enabled():
+    return _recorder is not None
+
+
+def configure(argv=None):
+    """Enable instrumentation from `--profile[=REPORT]` / `--profile-stage=STAGE` flags or the environment."""
+    argv = sys.argv[1:] if argv is None else argv
+    report_file = os.environ.get(PROFILE_ENV)
+    profile_stage = os.environ.get(PROFILE_STAGE_ENV)
+    for arg in argv:
+        if arg == '--profile':
+            report_file = report_file or '1'
+        elif arg.startswith('--profile='):
+            report_file = arg.split('=', 1)[1]
+        elif arg.startswith('--profile-stage='):
+            profile_stage = arg.split('=', 1)[1]
+            report_file = report_file or '1'
+
+    if report_file and report_file != '0':
+        enable(REPORT_FILE if report_file == '1' else report_file, profile_stage)
+
+
+def stage(name):
+    """Context manager timing one stage; a shared no-op object when instrumentation is off."""
+    if _recorder is None:
+        return _NULL_STAGE
+    return _Stage(_recorder, name)
+
+
+def finish():
+    """Write the report (JSON, or CSV for a .csv path), print a summary and switch instrumentation off."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    if recorder.started_tracing:
+        tracemalloc.stop()
+
+    records = recorder.records
+    os.makedirs(os.path.dirname(recorder.report_file) or '.', exist_ok=True)
+    if recorder.report_file.endswith('.csv'):
+        fields = list(dict.fromkeys(field for record in records for field in record))
+        with open(recorder.report_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows({key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                              for key, value in record.items()} for record in records)
+    else:
+        with open(recorder.report_file, 'w') as f:
+            json.dump({'argv': sys.argv, 'stages': records}, f, indent=2)
+
+    print(f"{'stage':<28}{'wall s':>10}{'cpu s':>10}{'peak RSS MB':>14}{'traced MB':>12}  rows out")
+    for record in records:
+        name = '  ' * record['depth'] + record['stage']
+        print(f"{name:<28}{record['wall_seconds']:>10.3f}{record['cpu_seconds']:>10.3f}"
+              f"{record['peak_rss_mb'] if record['peak_rss_mb'] is not None else '-':>14}"
+              f"{record.get('traced_peak_mb', '-'):>12}  {record.get('rows_out')}")
+    print(f"Stage report saved to '{recorder.report_file}'.")
+    return recorder.report_file
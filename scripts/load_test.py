@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from crash_store import read_bus_stops
+from query_service import HOST, PORT
+
+
+SERVICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_service.py')
+
+# Request mix: point queries around shelters, shelter queries, and the odd top-K call
+MIX = {'near': 0.6, 'shelter': 0.35, 'top': 0.05}
+
+# Share of requests that repeat an earlier target, so the LRU cache sees realistic reuse
+REPEAT_SHARE = 0.3
+
+# Jitter of the point queries around a shelter, in degrees (~0.002 deg is about 200 m)
+JITTER_DEG = 0.002
+
+
+def build_targets(bus_stops, count, seed=0):
+    """Random request targets drawn around the real shelter locations."""
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(list(MIX), size=count, p=list(MIX.values()))
+    stops = rng.integers(0, len(bus_stops), size=count)
+    latitudes = bus_stops['Latitude'].to_numpy()[stops] + rng.uniform(-JITTER_DEG, JITTER_DEG, count)
+    longitudes = bus_stops['Longitude'].to_numpy()[stops] + rng.uniform(-JITTER_DEG, JITTER_DEG, count)
+    shelter_ids = bus_stops['Shelter_ID'].astype(str).to_numpy()[stops]
+    radii = rng.choice([150, 300, 500], size=count)
+
+    targets = []
+    for i, kind in enumerate(kinds):
+        if targets and rng.random() < REPEAT_SHARE:
+            targets.append(targets[rng.integers(0, len(targets))])
+        elif kind == 'near':
+            targets.append(f"/near?lat={latitudes[i]:.6f}&lon={longitudes[i]:.6f}&radius={radii[i]}")
+        elif kind == 'shelter':
+            targets.append(f"/shelter?id={shelter_ids[i]}&radius={radii[i]}")
+        else:
+            targets.append(f"/top?metric={rng.choice(['crash_count', 'severity', 'pedestrian'])}&k=10&radius={radii[i]}")
+    return targets
+
+
+async def fetch(reader, writer, host, target):
+    """Send one keep-alive GET and return (status, body)."""
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(host, port, targets, latencies, errors):
+    """One connection sending its share of the targets back to back."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            start = time.perf_counter()
+            status, _ = await fetch(reader, writer, host, target)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append((status, target))
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, targets, concurrency):
+    """Spread the targets over `concurrency` connections; returns latencies, errors and wall time."""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, targets[i::concurrency], latencies, errors) for i in range(concurrency)
+    ])
+    return np.array(latencies), errors, time.perf_counter() - start
+
+
+async def server_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, body = await fetch(reader, writer, host, '/stats')
+    finally:
+        writer.close()
+    return json.loads(body)
+
+
+async def wait_for_server(host, port, timeout_s=120):
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            return await server_stats(host, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def report(latencies, errors, wall_s, stats):
+    ms = latencies * 1000
+    print(f"{len(ms)} requests in {wall_s:.2f}s ({len(ms) / wall_s:.0f} req/s), {len(errors)} errors")
+    print(f"latency ms  p50 {np.percentile(ms, 50):.2f}  p90 {np.percentile(ms, 90):.2f}  "
+          f"p99 {np.percentile(ms, 99):.2f}  max {ms.max():.2f}")
+    lookups = stats['cache_hits'] + stats['cache_misses']
+    print(f"server: cache hit rate {stats['cache_hits'] / lookups * 100 if lookups else 0:.1f}%, "
+          f"{stats['batches']} batches, mean batch size {stats['mean_batch_size']}")
+    for status, target in errors[:5]:
+        print(f"  {status} {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test a local query_service instance and report p50/p99 latency.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--bus-stop-file', default='data/bus_stop_locations.csv')
+    parser.add_argument('--crash-file', default='data/crash_collisions.csv')
+    parser.add_argument('--spawn', action='store_true', help='start a query_service on the given port first')
+    args = parser.parse_args()
+
+    targets = build_targets(read_bus_stops(args.bus_stop_file, columns=['Shelter_ID', 'Latitude', 'Longitude']), args.requests)
+
+    service = None
+    if args.spawn:
+        service = subprocess.Popen([
+            sys.executable, SERVICE, '--crash-file', args.crash_file, '--bus-stop-file', args.bus_stop_file,
+            '--host', args.host, '--port', str(args.port)
+        ])
+    try:
+        asyncio.run(wait_for_server(args.host, args.port))
+        latencies, errors, wall_s = asyncio.run(run_load(args.host, args.port, targets, args.concurrency))
+        report(latencies, errors, wall_s, asyncio.run(server_stats(args.host, args.port)))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,32 @@
 import pandas as pd
-import geopandas as gpd
-import folium
-from folium.plugins import HeatMap
-import matplotlib.pyplot as plt
+from pipeline import load_data
+from adjacency import ADJACENCY_DIR, load_adjacency, stop_sums
+from spatial_index import projected_xy
+from significance import injury_significance
+
+# Crash columns this analysis needs
+CRASH_COLUMNS = [
+    'LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft',
+    'NUMBER OF PEDESTRIANS INJURED', 'NUMBER OF CYCLIST INJURED', 'NUMBER OF MOTORIST INJURED'
+]
+
+# Injury column counted for each mode
+INJURY_COLUMNS = {
+    'Pedestrian': 'NUMBER OF PEDESTRIANS INJURED',
+    'Cyclist': 'NUMBER OF CYCLIST INJURED',
+    'Motorist': 'NUMBER OF MOTORIST INJURED'
+}
+
+# Feet per degree of latitude, to turn the legacy degree proximity into a distance
+FEET_PER_DEGREE_LATITUDE = 364_000
 
 def create_crash_bus_map(crash_file, bus_stop_file, output_file='nyc_crash_map.html'):
+    # folium is only needed for the map, so it is imported here rather than at startup
+    import folium
+    from folium.plugins import HeatMap
+
     # Read data
-    crashes = pd.read_csv(crash_file)
-    bus_stops = pd.read_csv(bus_stop_file)
+    crashes, bus_stops = load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
 
     # Clean and filter coordinates
     crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
@@ -28,40 +47,60 @@ def create_crash_bus_map(crash_file, bus_stop_file, output_file='nyc_crash_map.h
     print(f"Map saved to {output_file}")
 
 def get_injury_data_within_proximity(crashes, bus_stop, proximity_radius=0.0004):
-    """Get injury data for crashes within a specified proximity of a bus stop."""
-    # Calculate distance
-    nearby_crashes = crashes[
-        (abs(crashes['LATITUDE'] - bus_stop['Latitude']) < proximity_radius) &
-        (abs(crashes['LONGITUDE'] - bus_stop['Longitude']) < proximity_radius)
-    ]
-
-    # Count injuries by type
-    pedestrian_injuries = nearby_crashes['NUMBER OF PEDESTRIANS INJURED'].sum()
-    cyclist_injuries = nearby_crashes['NUMBER OF CYCLIST INJURED'].sum()
-    motorist_injuries = nearby_crashes['NUMBER OF MOTORIST INJURED'].sum()
+    """Get injury data for crashes within a specified proximity of a bus stop.
+
+    `proximity_radius` is still given in degrees, but is now a true radius (about 146 ft at the
+    default) answered by the batched query of get_injury_counts_for_all_stops for this one stop.
+    """
+    radius_ft = proximity_radius * FEET_PER_DEGREE_LATITUDE
+    counts = get_injury_counts_for_all_stops(pd.DataFrame([bus_stop]), crashes, radius_ft=radius_ft).iloc[0]
 
     # Create a dictionary for injuries
-    injury_counts = {
-        'Pedestrian': pedestrian_injuries,
-        'Cyclist': cyclist_injuries,
-        'Motorist': motorist_injuries
-    }
+    injury_counts = {injury: counts[injury] for injury in INJURY_COLUMNS}
 
     total_injuries = sum(injury_counts.values())
-    
+
     # Calculate percentages
     injury_percentages = {injury: (count / total_injuries * 100).round(2) if total_injuries > 0 else 0 for injury, count in injury_counts.items()}
 
     return injury_counts, injury_percentages
 
+def get_injury_counts_for_all_stops(bus_stops, crashes, radius_ft=150, adjacency_dir=None):
+    """Get injury counts by type within a true `radius_ft` of every bus stop in one batched query.
+
+    The stop x crash adjacency is persisted in `adjacency_dir` when given.
+    """
+    injury_counts = pd.DataFrame(0.0, index=bus_stops.index, columns=list(INJURY_COLUMNS))
+
+    # Only located crashes/stops can be indexed
+    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
+    located_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
+    if crashes.empty or located_stops.empty:
+        return injury_counts
+
+    # Injury sums are one sparse product with the stop x crash adjacency
+    adjacency = load_adjacency(
+        projected_xy(crashes, 'LONGITUDE', 'LATITUDE'), projected_xy(located_stops, 'Longitude', 'Latitude'), radius_ft,
+        adjacency_dir=adjacency_dir
+    )
+    injury_counts.loc[located_stops.index] = stop_sums(adjacency, crashes[list(INJURY_COLUMNS.values())])
+
+    return injury_counts
+
 def add_bus_stop_markers(bus_stops, crashes, map_object):
     """Add bus stop markers with injury data to the map."""
-    for _, stop in bus_stops.iterrows():
-        injury_counts, injury_percentages = get_injury_data_within_proximity(crashes, stop)
+    import folium
+
+    all_injury_counts = get_injury_counts_for_all_stops(bus_stops, crashes)
+
+    for index, stop in bus_stops.iterrows():
+        injury_counts = all_injury_counts.loc[index]
+        total_injuries = injury_counts.sum()
+        injury_percentages = {injury: (count / total_injuries * 100).round(2) if total_injuries > 0 else 0 for injury, count in injury_counts.items()}
 
         # Prepare injury data for popup
         injury_info = ', '.join(
-            [f"{injury}: {count} ({percentage}%)" for injury, count, percentage in zip(injury_counts.keys(), injury_counts.values(), injury_percentages.values())]
+            [f"{injury}: {count:.0f} ({percentage}%)" for injury, count, percentage in zip(injury_counts.index, injury_counts.values, injury_percentages.values())]
         )
 
         folium.Marker(
@@ -70,16 +109,11 @@ def add_bus_stop_markers(bus_stops, crashes, map_object):
             icon=folium.Icon(color='blue', icon='bus')
         ).add_to(map_object)
 
-def calculate_bus_stop_injury_distribution(bus_stops, crashes):
-    """Calculate the percentage distribution of injuries for bus stops within a 150-foot radius."""
-    total_injury_counts = {'Pedestrian': 0, 'Cyclist': 0, 'Motorist': 0}
-
-    for _, stop in bus_stops.iterrows():
-        injury_counts, _ = get_injury_data_within_proximity(crashes, stop, proximity_radius=0.0004)
-        for injury_type in total_injury_counts.keys():
-            total_injury_counts[injury_type] += injury_counts.get(injury_type, 0)
+def calculate_bus_stop_injury_distribution(bus_stops, crashes, radius_ft=150, adjacency_dir=None):
+    """Calculate the percentage distribution of injuries for bus stops within a `radius_ft` (default 150-foot) radius."""
+    total_injury_counts = get_injury_counts_for_all_stops(bus_stops, crashes, radius_ft=radius_ft, adjacency_dir=adjacency_dir).sum()
 
-    total_injuries = sum(total_injury_counts.values())
+    total_injuries = total_injury_counts.sum()
     
     # Calculate percentages
     injury_percentages = {injury: (count / total_injuries * 100).round(2) if total_injuries > 0 else 0 for injury, count in total_injury_counts.items()}
@@ -102,38 +136,55 @@ def calculate_overall_injury_distribution(crashes):
     return injury_percentages
 
 def main():
+    import matplotlib.pyplot as plt
+
     crash_file = 'data/crash_collisions.csv'
     bus_stop_file = 'data/bus_stop_locations.csv'
-    crashes = pd.read_csv(crash_file)
-    bus_stops = pd.read_csv(bus_stop_file)
+    crashes, bus_stops = load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
 
     # Calculate distributions
-    bus_stop_distribution = calculate_bus_stop_injury_distribution(bus_stops, crashes)
+    bus_stop_distribution = calculate_bus_stop_injury_distribution(bus_stops, crashes, adjacency_dir=ADJACENCY_DIR)
     overall_distribution = calculate_overall_injury_distribution(crashes)
 
+    # Bootstrap intervals and shifted-location controls for the shelter vs overall comparison
+    located_crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
+    located_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
+    significance = injury_significance(
+        projected_xy(located_crashes, 'LONGITUDE', 'LATITUDE'),
+        located_crashes[list(INJURY_COLUMNS.values())].fillna(0).to_numpy(),
+        projected_xy(located_stops, 'Longitude', 'Latitude'),
+        radius_ft=150
+    )
+    significance.index = list(INJURY_COLUMNS)
+
     # Print the distributions
     print("Injury Percentage Distribution within 150 feet of Bus Stops:")
     print(bus_stop_distribution)
     print("\nOverall Injury Percentage Distribution from Crash Dataset:")
     print(overall_distribution)
+    print("\n95% intervals and p-values against shifted control locations:")
+    print(significance.round(2))
 
     # Visualize the distributions using a bar chart
     labels = list(bus_stop_distribution.keys())
     bus_stop_values = list(bus_stop_distribution.values())
-    overall_values = list(overall_distribution.values())
+    # The overall bars use the same located crashes as their bootstrap intervals, not the whole file
+    overall_values = significance['overall'].round(2).tolist()
+    bus_stop_errors = [significance['shelter'] - significance['shelter_low'], significance['shelter_high'] - significance['shelter']]
+    overall_errors = [significance['overall'] - significance['overall_low'], significance['overall_high'] - significance['overall']]
 
     x = range(len(labels))
 
     # Change colors to blue and orange for better accessibility
-    plt.bar(x, bus_stop_values, width=0.4, label='Bus Shelters', color='blue', align='center')
-    plt.bar([p + 0.4 for p in x], overall_values, width=0.4, label='Overall', color='orange', align='center')
+    plt.bar(x, bus_stop_values, width=0.4, label='Bus Shelters', color='blue', align='center', yerr=bus_stop_errors, capsize=5)
+    plt.bar([p + 0.4 for p in x], overall_values, width=0.4, label='Overall', color='orange', align='center', yerr=overall_errors, capsize=5)
 
-    # Add percentage labels on top of the bars with larger font size
+    # Add percentage labels above the error bars with larger font size
     for i, value in enumerate(bus_stop_values):
-        plt.text(i, value + 1, f"{value}%", ha='center', va='bottom', fontsize=12, fontweight='bold')  # Adjust fontsize and fontweight
+        plt.text(i, significance['shelter_high'].iloc[i] + 1, f"{value}%", ha='center', va='bottom', fontsize=12, fontweight='bold')  # Adjust fontsize and fontweight
 
     for i, value in enumerate(overall_values):
-        plt.text(i + 0.4, value + 1, f"{value}%", ha='center', va='bottom', fontsize=12, fontweight='bold')  # Adjust fontsize and fontweight
+        plt.text(i + 0.4, significance['overall_high'].iloc[i] + 1, f"{value}%", ha='center', va='bottom', fontsize=12, fontweight='bold')  # Adjust fontsize and fontweight
 
     plt.xlabel('Injury Type', fontsize=14, fontweight='bold')  # Larger font for x-axis label
     plt.ylabel('Percentage of Injuries', fontsize=14, fontweight='bold')  # Larger font for y-axis label
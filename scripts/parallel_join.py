@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from spatial_index import join_within
+
+
+# Default tile edge (one mile); tiles must be at least as wide as the search radius
+TILE_SIZE_FT = 5280
+
+
+def default_workers():
+    """Use every core unless told otherwise."""
+    return os.cpu_count() or 1
+
+
+def tile_keys(points_xy, tile_size_ft=TILE_SIZE_FT):
+    """Return the (column, row) tile of every projected point as an (n, 2) int array."""
+    return np.floor(np.asarray(points_xy, dtype='float64') / tile_size_ft).astype(np.int64)
+
+
+def _join_tile(task):
+    """Worker: join one tile's stops against the crashes of that tile padded by the radius."""
+    crashes_xy, crash_ids, stops_xy, stop_ids, radius_ft = task
+    pairs = join_within(crashes_xy, stops_xy, radius_ft)
+    # Translate tile-local positions back to global ones
+    pairs['crash_index'] = crash_ids[pairs['crash_index'].to_numpy()]
+    pairs['stop_index'] = stop_ids[pairs['stop_index'].to_numpy()]
+    return pairs
+
+
+def _tile_tasks(crashes_xy, stops_xy, radius_ft, tile_size_ft):
+    """Split the stops into tiles and attach the crashes that could fall within the radius of each."""
+    crashes_xy = np.asarray(crashes_xy, dtype='float64')
+    stops_xy = np.asarray(stops_xy, dtype='float64')
+    stop_tiles = tile_keys(stops_xy, tile_size_ft)
+
+    # Bucket the crashes by tile once
+    crash_tiles = tile_keys(crashes_xy, tile_size_ft)
+    order = np.lexsort((crash_tiles[:, 1], crash_tiles[:, 0]))
+    cells, starts = np.unique(crash_tiles[order], axis=0, return_index=True)
+    buckets = dict(zip(map(tuple, cells), np.split(order, starts[1:])))
+
+    for tile in np.unique(stop_tiles, axis=0):
+        stop_ids = np.flatnonzero((stop_tiles == tile).all(axis=1))
+
+        # Tiles are at least `radius_ft` wide, so the padded tile only reaches the 8 neighbours
+        neighbours = [buckets.get((tile[0] + dx, tile[1] + dy)) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        neighbours = [bucket for bucket in neighbours if bucket is not None]
+        if not neighbours:
+            continue
+        crash_ids = np.sort(np.concatenate(neighbours))
+
+        # Tile bounds padded by the radius so matches across the tile edge are kept
+        lower = tile * tile_size_ft - radius_ft
+        upper = (tile + 1) * tile_size_ft + radius_ft
+        crash_ids = crash_ids[((crashes_xy[crash_ids] >= lower) & (crashes_xy[crash_ids] <= upper)).all(axis=1)]
+        if len(crash_ids) == 0:
+            continue
+        yield crashes_xy[crash_ids], crash_ids, stops_xy[stop_ids], stop_ids, radius_ft
+
+
+def parallel_join_within(crashes_xy, stops_xy, radius_ft, workers=None, tile_size_ft=TILE_SIZE_FT):
+    """Same result as spatial_index.join_within, fanned out over spatial tiles in a process pool."""
+    tile_size_ft = max(tile_size_ft, radius_ft)
+    workers = workers or default_workers()
+    tasks = list(_tile_tasks(crashes_xy, stops_xy, radius_ft, tile_size_ft))
+    if workers == 1 or len(tasks) <= 1:
+        results = [_join_tile(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_join_tile, tasks))
+
+    if not results:
+        return join_within(np.empty((0, 2)), np.empty((0, 2)), radius_ft)
+
+    # Merge, drop anything seen twice and restore the serial ordering
+    pairs = pd.concat(results, ignore_index=True).drop_duplicates(['crash_index', 'stop_index'])
+    return pairs.sort_values(['crash_index', 'stop_index'], kind='stable').reset_index(drop=True)
+
+
+def _sjoin_nearest_tile(task):
+    """Worker: nearest-stop join for one tile of crashes against all stops."""
+    import geopandas as gpd
+
+    crashes_gdf, bus_stops_gdf, distance_col = task
+    return gpd.sjoin_nearest(crashes_gdf, bus_stops_gdf, how='inner', distance_col=distance_col)
+
+
+def parallel_sjoin_nearest(crashes_gdf, bus_stops_gdf, workers=None, tile_size_ft=TILE_SIZE_FT, distance_col='distance'):
+    """Same result as gpd.sjoin_nearest, with the crashes split into spatial tiles across a process pool.
+
+    A nearest search has no radius to pad by, so every tile is matched against all stops (a few
+    thousand points); only the crashes are partitioned.
+    """
+    workers = workers or default_workers()
+    if workers == 1 or len(crashes_gdf) == 0:
+        return _sjoin_nearest_tile((crashes_gdf, bus_stops_gdf, distance_col))
+
+    # Group crashes by tile, then deal whole tiles into a few batches per worker
+    crash_tiles = tile_keys(np.column_stack([crashes_gdf.geometry.x, crashes_gdf.geometry.y]), tile_size_ft)
+    _, tile_ids = np.unique(crash_tiles, axis=0, return_inverse=True)
+    batch_ids = tile_ids.ravel() % (workers * 4)
+
+    # Remember each crash's position so the merged rows can be put back in serial order
+    crashes_gdf = crashes_gdf.assign(_crash_position=np.arange(len(crashes_gdf)))
+    tasks = [(crashes_gdf[batch_ids == batch], bus_stops_gdf, distance_col) for batch in np.unique(batch_ids)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_sjoin_nearest_tile, tasks))
+
+    merged = pd.concat(results).sort_values('_crash_position', kind='stable')
+    return merged.drop(columns='_crash_position')
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from crash_store import read_crashes, read_bus_stops
+from adjacency import ADJACENCY_DIR, load_adjacency, pairs as adjacency_pairs
+from spatial_index import projected_xy
+from ranking import top_k
+from stage_cache import cache_key, cached, is_cached, CACHE_DIR, CACHE_MAX_BYTES
+
+
+# Crash columns the shared pipeline loads
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft']
+
+# Injury/death columns summed per stop by the aggregate stage
+AGGREGATE_COLUMNS = [
+    'NUMBER OF PEDESTRIANS INJURED', 'NUMBER OF PEDESTRIANS KILLED',
+    'NUMBER OF CYCLIST INJURED', 'NUMBER OF CYCLIST KILLED',
+    'NUMBER OF MOTORIST INJURED', 'NUMBER OF MOTORIST KILLED'
+]
+
+# NYC bounding box (lat_min, lat_max, lon_min, lon_max) used to drop mis-geocoded points
+NYC_BOUNDS = (40.5, 40.9, -74.3, -73.7)
+
+# Extra crash columns clean_data needs to recover un-geocoded crashes from their intersection
+STREET_COLUMNS = ['BOROUGH', 'ON STREET NAME', 'CROSS STREET NAME']
+
+
+# ----------------------------
+# Stages
+# ----------------------------
+def load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS):
+    """Load the crash and bus stop data."""
+    crashes = read_crashes(crash_file, columns=columns)
+    bus_stops = read_bus_stops(bus_stop_file)
+    return crashes, bus_stops
+
+
+def clean_data(crashes, bus_stops, bounds=None, recover_min_confidence=None):
+    """Drop rows without coordinates (or outside `bounds`) and use latitude/longitude column names.
+
+    With `recover_min_confidence`, crashes without coordinates first get the location of their street
+    intersection (see street_matcher) when the match is at least that confident; needs STREET_COLUMNS.
+    """
+    if recover_min_confidence is not None:
+        # Imported here: street_matcher itself imports this module
+        from street_matcher import build_intersection_index, fill_missing_coordinates
+
+        index = build_intersection_index(bus_stops.dropna(subset=['Latitude', 'Longitude']), crashes)
+        crashes = fill_missing_coordinates(crashes, index, min_confidence=recover_min_confidence)
+    crashes = crashes.dropna(subset=['LATITUDE', 'LONGITUDE'])
+    bus_stops = bus_stops.dropna(subset=['Latitude', 'Longitude'])
+    crashes = crashes.rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
+    bus_stops = bus_stops.rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
+
+    if bounds is not None:
+        lat_min, lat_max, lon_min, lon_max = bounds
+        crashes = crashes[crashes['latitude'].between(lat_min, lat_max) & crashes['longitude'].between(lon_min, lon_max)]
+        bus_stops = bus_stops[bus_stops['latitude'].between(lat_min, lat_max) & bus_stops['longitude'].between(lon_min, lon_max)]
+
+    return crashes, bus_stops
+
+
+def project(crashes, bus_stops):
+    """Make sure both frames carry NY State Plane x_ft/y_ft columns."""
+    crashes_xy = projected_xy(crashes, 'longitude', 'latitude')
+    bus_stops_xy = projected_xy(bus_stops, 'longitude', 'latitude')
+    crashes = crashes.assign(x_ft=crashes_xy[:, 0], y_ft=crashes_xy[:, 1])
+    bus_stops = bus_stops.assign(x_ft=bus_stops_xy[:, 0], y_ft=bus_stops_xy[:, 1])
+    return crashes, bus_stops
+
+
+def column_matrix(table, columns, rows=None):
+    """Stack `columns` of a DataFrame or of a dict of arrays (see array_store) into one float matrix.
+
+    With `rows` only those positions are gathered, so memory-mapped arrays are read just where needed.
+    """
+    if isinstance(table, pd.DataFrame):
+        values = table[columns].to_numpy(dtype='float64', na_value=0)
+        return values if rows is None else values[rows]
+    return np.column_stack([
+        np.asarray(table[column] if rows is None else table[column][rows], dtype='float64') for column in columns
+    ])
+
+
+def join(crashes, bus_stops, radius_ft=150, workers=None, adjacency_dir=None):
+    """Pair every crash with every stop within `radius_ft` (positional indices plus distance).
+
+    The pairs are read off the stop x crash adjacency (see adjacency.load_adjacency), which is
+    persisted in `adjacency_dir` when given, so every metric over the same points and radius shares
+    one spatial join. `crashes` may be a DataFrame or a dict of x_ft/y_ft arrays, e.g. from
+    array_store.load_arrays.
+    """
+    crashes_xy = column_matrix(crashes, ['x_ft', 'y_ft'])
+    bus_stops_xy = column_matrix(bus_stops, ['x_ft', 'y_ft'])
+    return adjacency_pairs(
+        load_adjacency(crashes_xy, bus_stops_xy, radius_ft, workers=workers, adjacency_dir=adjacency_dir)
+    )
+
+
+def stop_totals(stop_index, values, total_bus_stops):
+    """Fold matched crashes into per-stop totals: crash count followed by one sum per value column.
+
+    `values` has a row per match (a single column may be a vector); no matches at all is fine.
+    """
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    totals = np.zeros((total_bus_stops, values.shape[1] + 1), dtype=np.int64)
+    totals[:, 0] = np.bincount(stop_index, minlength=total_bus_stops)
+    for i in range(values.shape[1]):
+        totals[:, i + 1] = np.bincount(stop_index, weights=values[:, i], minlength=total_bus_stops).astype(np.int64)
+    return totals
+
+
+def aggregate(crashes, bus_stops, pairs):
+    """Build the per-stop table of crash counts and injury/death sums (crashes as a DataFrame or dict of arrays)."""
+    columns = [column for column in AGGREGATE_COLUMNS if column in crashes]
+    values = column_matrix(crashes, columns, rows=pairs['crash_index'].to_numpy())
+    totals = stop_totals(pairs['stop_index'].to_numpy(), values, len(bus_stops))
+
+    aggregates = bus_stops[['Shelter_ID', 'BoroName', 'latitude', 'longitude']].copy()
+    aggregates['crash_count'] = totals[:, 0]
+    for i, column in enumerate(columns, start=1):
+        aggregates[column] = totals[:, i]
+    aggregates['has_accident'] = aggregates['crash_count'] > 0
+    return aggregates
+
+
+def aggregate_frames(crashes, bus_stops, radius_ft=150, workers=None, adjacency_dir=ADJACENCY_DIR):
+    """Project, join and aggregate frames the caller already loaded and cleaned (and still needs).
+
+    For scripts that draw the crashes as well as rank the stops, so the files are loaded once.
+    `crashes` must carry the AGGREGATE_COLUMNS the ranking metric sums.
+    """
+    crashes, bus_stops = project(crashes, bus_stops)
+    return aggregate(crashes, bus_stops, join(crashes, bus_stops, radius_ft=radius_ft, workers=workers,
+                                              adjacency_dir=adjacency_dir))
+
+
+def render(results):
+    """Plot the share of bus shelters with accidents."""
+    from bus_stop_accident_analysis import plot_bus_stop_accident_percentages
+
+    summary = results['summary']
+    with instrumentation.stage('render'):
+        plot_bus_stop_accident_percentages(
+            summary['bus_stops_with_accidents'], summary['bus_stops_without_accidents'], summary['total_bus_stops']
+        )
+
+
+# ----------------------------
+# Cached run
+# ----------------------------
+def run_pipeline(crash_file, bus_stop_file, radius_ft=150, top_n=10, bounds=None, workers=None,
+                 recover_min_confidence=None, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 adjacency_dir=ADJACENCY_DIR):
+    """Run load -> clean -> project -> join -> aggregate, reusing the aggregate cached on disk.
+
+    Keys only depend on input file hashes and parameters, so they are all known up front; when the
+    aggregate stage is cached nothing upstream is loaded at all. Load, clean and project are cheaper
+    to redo than to unpickle a full crash frame, so they are not cached and run at most once. The
+    join is not pickled either: it comes from the stop x crash adjacency persisted in `adjacency_dir`.
+    """
+    columns = CRASH_COLUMNS + AGGREGATE_COLUMNS + (STREET_COLUMNS if recover_min_confidence is not None else [])
+    load_key = cache_key('load', [crash_file, bus_stop_file], {'columns': columns, 'compact_types': True},
+                         code=(load_data, read_crashes, read_bus_stops))
+    clean_key = cache_key('clean', params={'bounds': bounds, 'recover_min_confidence': recover_min_confidence},
+                          upstream=load_key, code=(clean_data,))
+    project_key = cache_key('project', upstream=clean_key, code=(project, projected_xy))
+    join_key = cache_key('join', params={'radius_ft': radius_ft}, upstream=project_key, code=(join, column_matrix))
+    aggregate_key = cache_key('aggregate', params={'top_n': top_n}, upstream=join_key,
+                              code=(aggregate, stop_totals, top_k, run_pipeline))
+
+    def stage(name, compute, key=None):
+        with instrumentation.stage(name) as record:
+            if key is None:
+                return record.output(compute())
+            computed = []
+
+            def run():
+                computed.append(True)
+                return compute()
+
+            value = cached(name, key, run, cache_dir=cache_dir, max_bytes=max_bytes)
+            record.note(cache_hit=not computed)
+            return record.output(value)
+
+    def upstream():
+        crashes, bus_stops = stage('load', lambda: load_data(crash_file, bus_stop_file, columns=columns))
+        crashes, bus_stops = stage('clean', lambda: clean_data(crashes, bus_stops, bounds=bounds,
+                                                             recover_min_confidence=recover_min_confidence))
+        crashes, bus_stops = stage('project', lambda: project(crashes, bus_stops))
+        pairs = stage('join', lambda: join(crashes, bus_stops, radius_ft=radius_ft, workers=workers,
+                                           adjacency_dir=adjacency_dir))
+        return crashes, bus_stops, pairs
+
+    # Run upstream before the aggregate stage opens so its record only times aggregate() itself
+    frames = None if is_cached('aggregate', aggregate_key, cache_dir) else upstream()
+
+    def aggregated():
+        # Only runs upstream here if the cached aggregate was evicted since the lookup
+        crashes, bus_stops, pairs = frames if frames is not None else upstream()
+        aggregates = aggregate(crashes, bus_stops, pairs)
+        total_bus_stops = len(aggregates)
+        bus_stops_with_accidents = int(aggregates['has_accident'].sum())
+        return {
+            'aggregates': aggregates,
+            'top_stops': top_k(aggregates, metric='crash_count', k=top_n),
+            'summary': {
+                'total_crashes': len(crashes),
+                'total_bus_stops': total_bus_stops,
+                'bus_stops_with_accidents': bus_stops_with_accidents,
+                'bus_stops_without_accidents': total_bus_stops - bus_stops_with_accidents
+            }
+        }
+
+    return stage('aggregate', aggregated, aggregate_key)
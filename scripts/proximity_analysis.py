@@ -1,30 +1,40 @@
 import geopandas as gpd
-from shapely.geometry import Point
+from adjacency import load_adjacency, nearest_stops
+from spatial_index import PROJECTED_CRS, projected_xy
+from parallel_join import parallel_sjoin_nearest
 
 
-def calculate_proximity(crashes, bus_stops):
-    """Analyze proximity of crashes to bus stops."""
-    # Convert to GeoDataFrames
-    crashes['geometry'] = crashes.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
-    bus_stops['geometry'] = bus_stops.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
+def calculate_proximity(crashes, bus_stops, workers=None, max_distance_ft=None, adjacency_dir=None):
+    """Analyze proximity of crashes to bus stops (spread over `workers` processes when given).
 
+    With `max_distance_ft` only crashes that close to a stop are kept, and their nearest stop is
+    read from the stop x crash adjacency for that radius (persisted in `adjacency_dir` when given).
+    """
+    crashes_xy = projected_xy(crashes, 'longitude', 'latitude')
+    bus_stops_xy = projected_xy(bus_stops, 'longitude', 'latitude')
+    if max_distance_ft is not None:
+        nearest = nearest_stops(load_adjacency(crashes_xy, bus_stops_xy, max_distance_ft, workers=workers,
+                                                adjacency_dir=adjacency_dir))
+        nearby_crashes = crashes.iloc[nearest['crash_index'].to_numpy()].copy()
+        nearby_crashes['index_right'] = bus_stops.index[nearest['stop_index'].to_numpy()]
+        nearby_crashes['distance'] = nearest['distance_ft'].to_numpy()
+        return nearby_crashes
 
-    crashes_gdf = gpd.GeoDataFrame(crashes, geometry='geometry', crs="EPSG:4326")
-    bus_stops_gdf = gpd.GeoDataFrame(bus_stops, geometry='geometry', crs="EPSG:4326")
-
-
-    # Reproject to a projected CRS (e.g., UTM)
-    crashes_gdf = crashes_gdf.to_crs(epsg=3857)  # Change EPSG code as needed
-    bus_stops_gdf = bus_stops_gdf.to_crs(epsg=3857)  # Change EPSG code as needed
+    # Convert to GeoDataFrames in NY State Plane (feet), using the precomputed x/y when present
+    crashes_gdf = gpd.GeoDataFrame(crashes, geometry=gpd.points_from_xy(crashes_xy[:, 0], crashes_xy[:, 1]), crs=PROJECTED_CRS)
+    bus_stops_gdf = gpd.GeoDataFrame(bus_stops, geometry=gpd.points_from_xy(bus_stops_xy[:, 0], bus_stops_xy[:, 1]), crs=PROJECTED_CRS)
 
 
     # Perform spatial join to find crashes within a certain distance from bus stops
-    nearby_crashes = gpd.sjoin_nearest(crashes_gdf, bus_stops_gdf, how='inner', distance_col='distance')
+    if workers is None:
+        nearby_crashes = gpd.sjoin_nearest(crashes_gdf, bus_stops_gdf, how='inner', distance_col='distance')
+    else:
+        nearby_crashes = parallel_sjoin_nearest(crashes_gdf, bus_stops_gdf, workers=workers, distance_col='distance')
 
 
-    # Ensure latitude and longitude are included in the result
-    nearby_crashes['latitude'] = nearby_crashes.geometry.y
-    nearby_crashes['longitude'] = nearby_crashes.geometry.x
+    # Keep the crash latitude/longitude (the geometry is in feet, not degrees)
+    nearby_crashes['latitude'] = crashes_gdf.loc[nearby_crashes.index, 'latitude'].to_numpy()
+    nearby_crashes['longitude'] = crashes_gdf.loc[nearby_crashes.index, 'longitude'].to_numpy()
 
 
     return nearby_crashes
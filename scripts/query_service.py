@@ -0,0 +1,433 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from array_store import load_arrays
+from crash_store import read_bus_stops
+from pipeline import AGGREGATE_COLUMNS
+from ranking import METRICS, top_k
+from spatial_index import build_index, pairs_within, project_to_feet
+
+
+# Where the service listens by default
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Query limits
+RADIUS_FT = 150
+MAX_RADIUS_FT = 5280
+MAX_ROWS = 1000
+MAX_TOP_K = 100
+
+# Accepted latitude/longitude ranges (degrees)
+LAT_RANGE = (-90, 90)
+LON_RANGE = (-180, 180)
+
+# Responses kept by the LRU cache, and per-radius stop aggregates kept for /top
+CACHE_SIZE = 4096
+AGGREGATE_CACHE_SIZE = 8
+
+# Point queries arriving within this window are answered with one KD-tree call
+BATCH_WINDOW_S = 0.002
+MAX_BATCH = 256
+
+# Injury/death columns reported per travel mode
+MODE_COLUMNS = {
+    'pedestrian': ('NUMBER OF PEDESTRIANS INJURED', 'NUMBER OF PEDESTRIANS KILLED'),
+    'cyclist': ('NUMBER OF CYCLIST INJURED', 'NUMBER OF CYCLIST KILLED'),
+    'motorist': ('NUMBER OF MOTORIST INJURED', 'NUMBER OF MOTORIST KILLED')
+}
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """A request the service rejects; carries the HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """Least-recently-used map of query keys to response payloads."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key not in self.items:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+
+# ----------------------------
+# In-memory index
+# ----------------------------
+class CrashIndex:
+    """Crash arrays, a KD-tree over their x/y and the bus shelters, loaded once for the life of the service."""
+
+    def __init__(self, crashes, bus_stops):
+        self.crashes = crashes
+        self.xy = np.column_stack([np.asarray(crashes['x_ft']), np.asarray(crashes['y_ft'])])
+        self.tree = build_index(self.xy)
+        self.values = pipeline.column_matrix(crashes, AGGREGATE_COLUMNS)
+        self.bus_stops = bus_stops.reset_index(drop=True)
+        self.stops_xy = self.bus_stops[['x_ft', 'y_ft']].to_numpy()
+        self.stop_positions = {str(shelter_id): i for i, shelter_id in enumerate(self.bus_stops['Shelter_ID'])}
+        self.aggregates = LRUCache(AGGREGATE_CACHE_SIZE)
+
+    def neighbours(self, points_xy, radius_ft):
+        """Crash positions within `radius_ft` of each point (one KD-tree call for the whole batch)."""
+        return [np.asarray(found, dtype=np.int64) for found in self.tree.query_ball_point(points_xy, r=radius_ft)]
+
+    def summary(self, crash_positions, point_xy, radius_ft, rows=False):
+        """Crash count and injuries/deaths by mode for the crashes at `crash_positions`."""
+        totals = dict(zip(AGGREGATE_COLUMNS, self.values[crash_positions].sum(axis=0).astype(int).tolist()))
+        result = {
+            'radius_ft': radius_ft,
+            'crash_count': len(crash_positions),
+            'injured': {mode: totals[injured] for mode, (injured, _) in MODE_COLUMNS.items()},
+            'killed': {mode: totals[killed] for mode, (_, killed) in MODE_COLUMNS.items()}
+        }
+        if rows:
+            result['rows'] = self.rows(crash_positions, point_xy)
+            result['rows_truncated'] = len(crash_positions) > MAX_ROWS
+        return result
+
+    def rows(self, crash_positions, point_xy):
+        """The nearest MAX_ROWS crashes as records, closest first."""
+        distance_ft = np.hypot(*(self.xy[crash_positions] - point_xy).T)
+        order = np.argsort(distance_ft, kind='stable')[:MAX_ROWS]
+        positions = crash_positions[order]
+        records = {
+            'latitude': np.asarray(self.crashes['latitude'][positions]).round(6),
+            'longitude': np.asarray(self.crashes['longitude'][positions]).round(6),
+            'crash_date': np.datetime_as_string(np.asarray(self.crashes['crash_date'][positions])),
+            'distance_ft': distance_ft[order].round(1)
+        }
+        for i, column in enumerate(AGGREGATE_COLUMNS):
+            records[column] = self.values[positions, i].astype(int)
+        return pd.DataFrame(records).to_dict('records')
+
+    def stop_aggregates(self, radius_ft):
+        """Per-stop aggregates at `radius_ft`, built from the resident tree and kept for later /top calls."""
+        aggregates = self.aggregates.get(radius_ft)
+        if aggregates is None:
+            stop_index, crash_index = pairs_within(self.tree, self.stops_xy, radius_ft)
+            pairs = pd.DataFrame({'crash_index': crash_index, 'stop_index': stop_index})
+            aggregates = pipeline.aggregate(self.crashes, self.bus_stops, pairs)
+            self.aggregates.put(radius_ft, aggregates)
+        return aggregates
+
+
+def load_index(crash_file, bus_stop_file):
+    """Open the memory-mapped crash arrays and the cleaned, projected shelters."""
+    crashes = load_arrays(crash_file)
+    _, bus_stops = pipeline.clean_data(pd.DataFrame(columns=['LATITUDE', 'LONGITUDE']), read_bus_stops(bus_stop_file))
+    return CrashIndex(crashes, bus_stops)
+
+
+# ----------------------------
+# Request batching
+# ----------------------------
+class QueryBatcher:
+    """Collects point queries for BATCH_WINDOW_S (or MAX_BATCH queries) and answers them together."""
+
+    def __init__(self, index, window_s=BATCH_WINDOW_S, max_batch=MAX_BATCH):
+        self.index = index
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.queries = 0
+
+    def submit(self, point_xy, radius_ft):
+        """Queue one query; the future resolves to the positions of the crashes within the radius."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # A point the projection cannot place would fail the whole batch's tree query, so it never joins one
+        if not np.isfinite(point_xy).all():
+            future.set_exception(QueryError(400, 'point is outside the projected area'))
+            return future
+        self.pending.append((point_xy, radius_ft, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window_s, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.queries += len(batch)
+
+        # One tree query per distinct radius in the batch
+        by_radius = {}
+        for point_xy, radius_ft, future in batch:
+            by_radius.setdefault(radius_ft, []).append((point_xy, future))
+        for radius_ft, queries in by_radius.items():
+            try:
+                found = self.index.neighbours(np.array([point_xy for point_xy, _ in queries]), radius_ft)
+            except Exception as error:
+                for _, future in queries:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), positions in zip(queries, found):
+                if not future.done():
+                    future.set_result(positions)
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+def _number(params, name, default=None, kind=float):
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(400, f"missing parameter '{name}'")
+        return default
+    try:
+        value = kind(values[0])
+    except ValueError:
+        raise QueryError(400, f"parameter '{name}' must be a number") from None
+    # float() accepts 'nan' and 'inf', which must not reach the KD-tree
+    if not math.isfinite(value):
+        raise QueryError(400, f"parameter '{name}' must be a finite number")
+    return value
+
+
+def _flag(params, name):
+    return params.get(name, ['0'])[0].lower() in ('1', 'true', 'yes')
+
+
+def _coordinate(params, name, valid_range):
+    value = _number(params, name)
+    low, high = valid_range
+    if not low <= value <= high:
+        raise QueryError(400, f"{name} must be in [{low}, {high}]")
+    return value
+
+
+def _radius(params):
+    radius_ft = _number(params, 'radius', RADIUS_FT)
+    if not 0 < radius_ft <= MAX_RADIUS_FT:
+        raise QueryError(400, f"radius must be in (0, {MAX_RADIUS_FT}] feet")
+    return radius_ft
+
+
+class QueryService:
+    """Routes HTTP GET targets to the index, with an LRU cache in front of every endpoint."""
+
+    def __init__(self, index, cache_size=CACHE_SIZE, window_s=BATCH_WINDOW_S, max_batch=MAX_BATCH):
+        self.index = index
+        self.cache = LRUCache(cache_size)
+        self.batcher = QueryBatcher(index, window_s, max_batch)
+        self.requests = 0
+        self.started = time.time()
+        self.routes = {'/near': self.near, '/shelter': self.shelter, '/top': self.top, '/stats': self.stats}
+
+    async def dispatch(self, target):
+        """Answer one request target; returns (status, payload)."""
+        self.requests += 1
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            return 404, {'error': f"unknown endpoint '{url.path}'", 'endpoints': list(self.routes)}
+        try:
+            return 200, await handler(parse_qs(url.query))
+        except QueryError as error:
+            return error.status, {'error': str(error)}
+
+    async def _cached(self, key, compute):
+        payload = self.cache.get(key)
+        if payload is None:
+            payload = await compute()
+            self.cache.put(key, payload)
+        return payload
+
+    async def _around(self, point_xy, radius_ft, rows):
+        positions = await self.batcher.submit(point_xy, radius_ft)
+        return self.index.summary(positions, point_xy, radius_ft, rows)
+
+    async def near(self, params):
+        """/near?lat=&lon=[&radius=][&rows=1]: crashes within the radius of a point."""
+        lat, lon = _coordinate(params, 'lat', LAT_RANGE), _coordinate(params, 'lon', LON_RANGE)
+        radius_ft, rows = _radius(params), _flag(params, 'rows')
+
+        async def compute():
+            point_xy = project_to_feet([lon], [lat])[0]
+            return {'lat': lat, 'lon': lon, **await self._around(point_xy, radius_ft, rows)}
+
+        return await self._cached(('near', round(lat, 6), round(lon, 6), radius_ft, rows), compute)
+
+    async def shelter(self, params):
+        """/shelter?id=[&radius=][&rows=1]: crashes within the radius of a bus shelter."""
+        shelter_id = params.get('id', [''])[0]
+        position = self.index.stop_positions.get(shelter_id)
+        if position is None:
+            raise QueryError(404, f"unknown Shelter_ID '{shelter_id}'")
+        radius_ft, rows = _radius(params), _flag(params, 'rows')
+
+        async def compute():
+            stop = self.index.bus_stops.iloc[position]
+            result = await self._around(self.index.stops_xy[position], radius_ft, rows)
+            return {'Shelter_ID': shelter_id, 'BoroName': stop['BoroName'],
+                    'lat': float(stop['latitude']), 'lon': float(stop['longitude']), **result}
+
+        return await self._cached(('shelter', shelter_id, radius_ft, rows), compute)
+
+    async def top(self, params):
+        """/top?[metric=][&k=][&radius=][&borough=]: the top-K shelters by a ranking metric."""
+        metric = params.get('metric', ['crash_count'])[0]
+        if metric not in METRICS:
+            raise QueryError(400, f"metric must be one of {', '.join(METRICS)}")
+        k = _number(params, 'k', 10, int)
+        if not 0 < k <= MAX_TOP_K:
+            raise QueryError(400, f"k must be in [1, {MAX_TOP_K}]")
+        radius_ft = _radius(params)
+        borough = params.get('borough', [None])[0]
+
+        async def compute():
+            aggregates = self.index.stop_aggregates(radius_ft)
+            if borough is not None:
+                aggregates = aggregates[aggregates['BoroName'].astype(str).str.lower() == borough.lower()]
+            ranked = top_k(aggregates, metric=metric, k=k)
+            columns = ['rank', 'Shelter_ID', 'BoroName', 'latitude', 'longitude', 'score', 'crash_count']
+            return {'metric': metric, 'radius_ft': radius_ft, 'stops': ranked[columns].to_dict('records')}
+
+        return await self._cached(('top', metric, k, radius_ft, borough), compute)
+
+    async def stats(self, params):
+        """/stats: index size, cache and batching counters."""
+        batcher = self.batcher
+        return {
+            'crashes': len(self.index.xy),
+            'bus_stops': len(self.index.bus_stops),
+            'requests': self.requests,
+            'uptime_s': round(time.time() - self.started, 1),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'batches': batcher.batches,
+            'mean_batch_size': round(batcher.queries / batcher.batches, 2) if batcher.batches else 0
+        }
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload, default=_json_default).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def handle_connection(service, reader, writer):
+    """Serve GET requests on one (keep-alive) connection until the client closes it."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                writer.write(_response(400, {'error': 'malformed request line'}, False))
+                break
+            method, target, version = parts
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            if method != 'GET':
+                status, payload = 405, {'error': 'only GET is supported'}
+            else:
+                try:
+                    status, payload = await service.dispatch(target)
+                except Exception as error:
+                    status, payload = 500, {'error': f"{type(error).__name__}: {error}"}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(crash_file, bus_stop_file, host=HOST, port=PORT, cache_size=CACHE_SIZE):
+    """Load the index once and answer queries until interrupted."""
+    start = time.perf_counter()
+    index = load_index(crash_file, bus_stop_file)
+    service = QueryService(index, cache_size=cache_size)
+    # Warm the default-radius aggregates so the first /top call is fast too
+    index.stop_aggregates(RADIUS_FT)
+    print(f"Indexed {len(index.xy)} crashes and {len(index.bus_stops)} bus stops in {time.perf_counter() - start:.2f}s.")
+
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer), host, port)
+    print(f"Serving on http://{host}:{port} (endpoints: {', '.join(service.routes)})")
+    async with server:
+        await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Crash query service for points and bus shelters.')
+    parser.add_argument('--crash-file', default='data/crash_collisions.csv')
+    parser.add_argument('--bus-stop-file', default='data/bus_stop_locations.csv')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args.crash_file, args.bus_stop_file, args.host, args.port, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+
+# Aggregate columns summed into each rankable metric
+METRIC_COLUMNS = {
+    'crash_count': ['crash_count'],
+    'injured': ['NUMBER OF PEDESTRIANS INJURED', 'NUMBER OF CYCLIST INJURED', 'NUMBER OF MOTORIST INJURED'],
+    'killed': ['NUMBER OF PEDESTRIANS KILLED', 'NUMBER OF CYCLIST KILLED', 'NUMBER OF MOTORIST KILLED'],
+    'pedestrian': ['NUMBER OF PEDESTRIANS INJURED']
+}
+
+# Weights of the 'severity' score: every crash counts, injuries and deaths count extra
+SEVERITY_WEIGHTS = {'crash_count': 1, 'injured': 3, 'killed': 10}
+
+METRICS = list(METRIC_COLUMNS) + ['severity']
+
+
+def metric_values(aggregates, metric='crash_count'):
+    """Score of every stop in a per-stop aggregate table (pipeline.aggregate output) for `metric`."""
+    if metric == 'severity':
+        return sum(weight * metric_values(aggregates, name) for name, weight in SEVERITY_WEIGHTS.items())
+    if metric not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of {METRICS}.")
+    return aggregates[METRIC_COLUMNS[metric]].to_numpy(dtype='float64').sum(axis=1)
+
+
+def _push(heap, k, item):
+    if len(heap) < k:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heappushpop(heap, item)
+
+
+def _ranked(aggregates, heap, scores):
+    """Turn a heap of (score, -position) into rows of `aggregates`, best first."""
+    positions = [-position for _, position in sorted(heap, reverse=True)]
+    ranked = aggregates.iloc[positions].copy()
+    ranked['score'] = scores[positions]
+    ranked['rank'] = np.arange(1, len(positions) + 1)
+    return ranked
+
+
+def top_k(aggregates, metric='crash_count', k=10, by_borough=False):
+    """Top `k` stops for `metric`, keeping a k-sized min-heap so it costs O(n log k).
+
+    Ties go to the stop that comes first in the table. With `by_borough` the per-borough top `k`
+    are collected in the same pass and returned as a second frame with a per-borough rank.
+    """
+    scores = metric_values(aggregates, metric)
+    boroughs = aggregates['BoroName'].to_numpy() if by_borough else None
+
+    overall = []
+    borough_heaps = {}
+    for position, score in enumerate(scores):
+        # Negated position so that, on equal scores, the earlier stop is the larger item
+        item = (score, -position)
+        _push(overall, k, item)
+        if by_borough:
+            _push(borough_heaps.setdefault(boroughs[position], []), k, item)
+
+    top = _ranked(aggregates, overall, scores)
+    if not by_borough:
+        return top
+    borough_tops = pd.concat(
+        [_ranked(aggregates, heap, scores) for _, heap in sorted(borough_heaps.items(), key=lambda item: str(item[0]))],
+        ignore_index=True
+    )
+    return top, borough_tops
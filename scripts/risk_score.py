@@ -0,0 +1,121 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import pipeline
+from adjacency import ADJACENCY_DIR, load_adjacency
+from pipeline import AGGREGATE_COLUMNS
+from ranking import METRIC_COLUMNS, metric_values
+from spatial_index import projected_xy
+
+
+# Distance-decay kernels: weight of a crash `distance / bandwidth` away from a stop
+#   uniform      - 1 inside the bandwidth, the hard cutoff of calculate_accidents_near_bus_stops
+#   epanechnikov - 1 - u^2 inside the bandwidth
+#   gaussian     - exp(-u^2 / 2), cut off at GAUSSIAN_CUTOFF bandwidths
+KERNELS = {
+    'uniform': lambda u: np.ones_like(u),
+    'epanechnikov': lambda u: np.clip(1 - u ** 2, 0, None),
+    'gaussian': lambda u: np.exp(-0.5 * u ** 2)
+}
+
+# Past 3 bandwidths a Gaussian weight is below 1.2%; farther crashes are ignored
+GAUSSIAN_CUTOFF = 3
+
+BANDWIDTH_FT = 150
+
+
+def kernel_support(kernel, bandwidth_ft):
+    """Distance beyond which `kernel` gives no weight, i.e. the radius of the neighbour query."""
+    if kernel not in KERNELS:
+        raise ValueError(f"Unknown kernel '{kernel}'. Use one of {list(KERNELS)}.")
+    return bandwidth_ft * (GAUSSIAN_CUTOFF if kernel == 'gaussian' else 1)
+
+
+def crash_weights(crashes, weight='severity'):
+    """Per-crash weight from a ranking metric: 'crash_count' counts every crash once, 'severity' adds injuries and deaths."""
+    columns = [column for column in AGGREGATE_COLUMNS if column in crashes]
+    table = pd.DataFrame({column: np.asarray(crashes[column], dtype='float64') for column in columns}).fillna(0)
+    table['crash_count'] = 1.0
+    return metric_values(table, weight)
+
+
+def kernel_matrix(adjacency, kernel='gaussian', bandwidth_ft=BANDWIDTH_FT, split=False):
+    """Stops x crashes matrix of kernel weights from a distance adjacency.
+
+    With `split` a crash whose weights over all stops sum past 1 has them scaled down to sum to 1,
+    so a crash near several shelters is shared between them instead of counting fully at each,
+    while a crash near a single shelter keeps its distance decay.
+    """
+    weights = KERNELS[kernel](adjacency.data / bandwidth_ft)
+    if split:
+        per_crash = np.bincount(adjacency.indices, weights=weights, minlength=adjacency.shape[1])
+        weights = weights / np.maximum(per_crash, 1)[adjacency.indices]
+    return sparse.csr_matrix((weights, adjacency.indices, adjacency.indptr), shape=adjacency.shape)
+
+
+def risk_scores(crashes, bus_stops, kernel='gaussian', bandwidth_ft=BANDWIDTH_FT, split=False, weight='severity',
+                workers=None, adjacency_dir=None):
+    """Distance-weighted risk of every stop: sum over nearby crashes of kernel(distance) x crash weight.
+
+    Neighbours come from one batched KD-tree query per (points, radius), kept as the stop x crash
+    adjacency; persisted in `adjacency_dir`, re-scoring with another kernel shape, split or weight
+    needs no new join.
+    """
+    adjacency = load_adjacency(
+        projected_xy(crashes, 'longitude', 'latitude'), projected_xy(bus_stops, 'longitude', 'latitude'),
+        kernel_support(kernel, bandwidth_ft), workers=workers, adjacency_dir=adjacency_dir
+    )
+    weights = kernel_matrix(adjacency, kernel, bandwidth_ft, split)
+
+    scores = bus_stops[['Shelter_ID', 'BoroName', 'latitude', 'longitude']].copy()
+    scores['risk_score'] = weights @ crash_weights(crashes, weight)
+    # Crashes the kernel reaches: within the bandwidth, or GAUSSIAN_CUTOFF bandwidths for the Gaussian
+    scores['crashes_in_support'] = np.diff(adjacency.indptr)
+    scores['effective_crashes'] = np.asarray(weights.sum(axis=1)).ravel()
+    return scores
+
+
+def top_risk(scores, k=10):
+    """The `k` highest risk scores, ties to the stop that comes first (as in ranking.top_k)."""
+    top = scores.sort_values('risk_score', ascending=False, kind='stable').head(k).copy()
+    top['rank'] = np.arange(1, len(top) + 1)
+    return top
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distance-decay kernel risk score per bus shelter.')
+    parser.add_argument('--crash-file', default='data/crash_collisions.csv')
+    parser.add_argument('--bus-stop-file', default='data/bus_stop_locations.csv')
+    parser.add_argument('--kernel', choices=list(KERNELS), default='gaussian')
+    parser.add_argument('--bandwidth', type=float, default=BANDWIDTH_FT, help='kernel bandwidth in feet')
+    parser.add_argument('--split', action='store_true', help='split each crash across the stops it is near')
+    parser.add_argument('--weight', choices=list(METRIC_COLUMNS) + ['severity'], default='severity')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--adjacency-dir', default=ADJACENCY_DIR, help='where the stop x crash matrices are kept')
+    parser.add_argument('--output', help='save every score to this CSV')
+    args = parser.parse_args(argv)
+
+    crashes, bus_stops = pipeline.load_data(args.crash_file, args.bus_stop_file,
+                                            columns=pipeline.CRASH_COLUMNS + AGGREGATE_COLUMNS)
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops)
+
+    start = time.perf_counter()
+    scores = risk_scores(crashes, bus_stops, args.kernel, args.bandwidth, args.split, args.weight, args.workers,
+                         args.adjacency_dir)
+    print(f"Scored {len(bus_stops)} bus stops against {len(crashes)} crashes in {time.perf_counter() - start:.2f}s "
+          f"({args.kernel} kernel, bandwidth {args.bandwidth:g} ft{', split' if args.split else ''}, weight {args.weight}).")
+
+    columns = ['rank', 'Shelter_ID', 'BoroName', 'risk_score', 'effective_crashes', 'crashes_in_support']
+    print(top_risk(scores, args.top)[columns].round(2).to_string(index=False))
+    if args.output:
+        scores.to_csv(args.output, index=False)
+        print(f"Scores saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+
+# Column registry for the crash file: CSV dtype, and the kind that decides its compact in-memory dtype
+#   category - low-cardinality strings, loaded as pandas categoricals
+#   text     - free text, kept as strings
+#   coord    - lat/lon, kept float64: float32 loses about a metre before projection
+#   count    - non-negative integers, narrowed to the smallest unsigned type that holds their maximum
+#   nullable - counts with gaps in the source, float32
+#   id       - integer identifiers, narrowed like counts
+CRASH_SCHEMA = {
+    'CRASH DATE': ('object', 'category'),
+    'CRASH TIME': ('object', 'category'),
+    'BOROUGH': ('object', 'category'),
+    'ZIP CODE': ('object', 'category'),
+    'LATITUDE': ('float64', 'coord'),
+    'LONGITUDE': ('float64', 'coord'),
+    'LOCATION': ('object', 'text'),
+    'ON STREET NAME': ('object', 'category'),
+    'CROSS STREET NAME': ('object', 'category'),
+    'OFF STREET NAME': ('object', 'text'),
+    'NUMBER OF PERSONS INJURED': ('float64', 'nullable'),
+    'NUMBER OF PERSONS KILLED': ('float64', 'nullable'),
+    'NUMBER OF PEDESTRIANS INJURED': ('int64', 'count'),
+    'NUMBER OF PEDESTRIANS KILLED': ('int64', 'count'),
+    'NUMBER OF CYCLIST INJURED': ('int64', 'count'),
+    'NUMBER OF CYCLIST KILLED': ('int64', 'count'),
+    'NUMBER OF MOTORIST INJURED': ('int64', 'count'),
+    'NUMBER OF MOTORIST KILLED': ('int64', 'count'),
+    'CONTRIBUTING FACTOR VEHICLE 1': ('object', 'category'),
+    'CONTRIBUTING FACTOR VEHICLE 2': ('object', 'category'),
+    'CONTRIBUTING FACTOR VEHICLE 3': ('object', 'category'),
+    'CONTRIBUTING FACTOR VEHICLE 4': ('object', 'category'),
+    'CONTRIBUTING FACTOR VEHICLE 5': ('object', 'category'),
+    'COLLISION_ID': ('int64', 'id'),
+    'VEHICLE TYPE CODE 1': ('object', 'category'),
+    'VEHICLE TYPE CODE 2': ('object', 'category'),
+    'VEHICLE TYPE CODE 3': ('object', 'category'),
+    'VEHICLE TYPE CODE 4': ('object', 'category'),
+    'VEHICLE TYPE CODE 5': ('object', 'category')
+}
+
+
+def raw_dtypes(schema=CRASH_SCHEMA):
+    """Source dtype of every column, as used for the CSV and the columnar store."""
+    return {column: dtype for column, (dtype, _) in schema.items()}
+
+
+def columns_of_kind(schema, *kinds):
+    return [column for column, (_, kind) in schema.items() if kind in kinds]
+
+
+def read_dtypes(columns=None, schema=CRASH_SCHEMA):
+    """read_csv dtype map for `columns`: categoricals are parsed straight into categories, the rest as in the source."""
+    columns = list(schema) if columns is None else [column for column in columns if column in schema]
+    return {column: 'category' if schema[column][1] == 'category' else schema[column][0] for column in columns}
+
+
+def narrow_counts(values):
+    """Smallest unsigned integer dtype that holds every value, checked against the column's maximum.
+
+    Columns with negative values are left alone. Sums of narrowed columns should be taken in a
+    wider type (pipeline.column_matrix uses float64), since uint arithmetic wraps silently.
+    """
+    if len(values) == 0 or values.min() < 0:
+        return values
+    maximum = int(values.max())
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
+
+
+def compact(df, schema=CRASH_SCHEMA):
+    """Convert the registry columns present in `df` to their compact dtypes; other columns are left alone."""
+    for column in df.columns:
+        if column not in schema:
+            continue
+        kind = schema[column][1]
+        if kind == 'category' and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+        elif kind == 'nullable':
+            df[column] = df[column].astype(np.float32)
+        elif kind == 'count':
+            df[column] = narrow_counts(df[column])
+        elif kind == 'id':
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def frame_memory_mb(df):
+    """In-memory size of a frame, strings included."""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def memory_report(before, after):
+    """Per-column and total memory of a frame before and after compacting, largest savings first."""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.reindex(before.columns).astype(str),
+        'mb_before': before.memory_usage(deep=True, index=False) / 2 ** 20,
+        'mb_after': after.memory_usage(deep=True, index=False).reindex(before.columns) / 2 ** 20
+    })
+    report = report.sort_values('mb_before', ascending=False)
+    report.loc['TOTAL'] = ['', '', report['mb_before'].sum(), report['mb_after'].sum()]
+    return report.round({'mb_before': 2, 'mb_after': 2})
@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from spatial_index import build_index
+from parallel_join import default_workers
+
+
+# Resamples handed to one worker task; fixed so results do not depend on the worker count
+DRAWS_PER_TASK = 100
+
+# Upper bound on bootstrap weights held in memory at once
+BOOTSTRAP_BATCH_WEIGHTS = 5_000_000
+
+# Control sets move every crash by a random offset in this range (feet), away from its own
+# shelter but within the same neighbourhood
+SHIFT_RANGE_FT = (500, 2640)
+
+
+def stop_multiplicity(stop_tree, crashes_xy, radius_ft):
+    """How many stops lie within `radius_ft` of each crash (a crash near two stops counts for both)."""
+    if len(crashes_xy) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return stop_tree.query_ball_point(crashes_xy, r=radius_ft, return_length=True).astype(np.int64)
+
+
+def injury_shares(weights, injuries):
+    """Percentage of injuries falling in each column when every crash is counted `weights` times."""
+    totals = np.asarray(weights, dtype='float64') @ injuries
+    total = totals.sum(axis=-1, keepdims=True)
+    return np.divide(totals * 100, total, out=np.zeros_like(totals), where=total > 0)
+
+
+def _bootstrap_task(task):
+    """Worker: Poisson-bootstrap the crashes and return shelter and overall shares per draw."""
+    seed, draws, multiplicity, injuries = task
+    rng = np.random.default_rng(seed)
+    shelter, overall = [], []
+    # One row of resampling weights per draw, a few million weights at a time
+    batch = max(1, BOOTSTRAP_BATCH_WEIGHTS // max(1, len(injuries)))
+    for start in range(0, draws, batch):
+        weights = rng.poisson(1.0, size=(min(batch, draws - start), len(injuries)))
+        shelter.append(injury_shares(weights * multiplicity, injuries))
+        overall.append(injury_shares(weights, injuries))
+    return np.vstack(shelter), np.vstack(overall)
+
+
+# What every shift task shares, set once per worker process by _init_shift_worker:
+# (stop_tree, crashes_xy, injuries, radius_ft, shift_range_ft)
+_shift_state = None
+
+
+def _init_shift_worker(stop_tree, crashes_xy, injuries, radius_ft, shift_range_ft):
+    """Pool initializer: keep the prebuilt stop index and the crash arrays for every task in this worker."""
+    global _shift_state
+    _shift_state = (stop_tree, crashes_xy, injuries, radius_ft, shift_range_ft)
+
+
+def _shift_task(task):
+    """Worker: move crashes by random offsets and recompute the shelter shares per draw."""
+    seed, draws = task
+    stop_tree, crashes_xy, injuries, radius_ft, shift_range_ft = _shift_state
+    rng = np.random.default_rng(seed)
+    shares = np.empty((draws, injuries.shape[1]))
+    for draw in range(draws):
+        # Uniform over the ring between the two shift radii
+        low, high = shift_range_ft
+        distance = np.sqrt(rng.uniform(low ** 2, high ** 2, size=len(crashes_xy)))
+        angle = rng.uniform(0, 2 * np.pi, size=len(crashes_xy))
+        shifted = crashes_xy + np.column_stack([distance * np.cos(angle), distance * np.sin(angle)])
+        shares[draw] = injury_shares(stop_multiplicity(stop_tree, shifted, radius_ft), injuries)
+    return shares
+
+
+def _run_tasks(worker, tasks, workers, initializer=None, initargs=()):
+    workers = workers or default_workers()
+    if workers == 1 or len(tasks) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        return list(executor.map(worker, tasks))
+
+
+def _task_seeds(seed, draws):
+    """Split `draws` into fixed-size tasks, each with its own independent child seed."""
+    sizes = [min(DRAWS_PER_TASK, draws - start) for start in range(0, draws, DRAWS_PER_TASK)]
+    return list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+
+def injury_significance(crashes_xy, injuries, stops_xy, radius_ft=150, draws=2000, seed=0, workers=None,
+                        shift_range_ft=SHIFT_RANGE_FT, level=0.95):
+    """Compare the injury mix within `radius_ft` of the stops with the citywide mix.
+
+    `injuries` is an (n, k) array of per-crash injury counts by type. Returns a DataFrame with one
+    row per type: observed shelter and overall shares with bootstrap confidence intervals, the mean
+    and interval of the shelter share under shifted control locations, and a two-sided p-value of
+    the observed shelter share against those controls. The same `seed` gives the same answer for
+    any number of workers.
+    """
+    injuries = np.asarray(injuries, dtype='float64')
+    crashes_xy = np.asarray(crashes_xy, dtype='float64')
+
+    # Crashes without injuries change neither numerator nor denominator of any share
+    injured = injuries.sum(axis=1) > 0
+    injuries, crashes_xy = injuries[injured], crashes_xy[injured]
+
+    stop_tree = build_index(np.asarray(stops_xy, dtype='float64'))
+    multiplicity = stop_multiplicity(stop_tree, crashes_xy, radius_ft)
+    observed_shelter = injury_shares(multiplicity, injuries)
+    observed_overall = injury_shares(np.ones(len(injuries)), injuries)
+
+    # Bootstrap: uncertainty of both observed mixes
+    bootstrap = _run_tasks(_bootstrap_task, [
+        (task_seed, size, multiplicity, injuries) for task_seed, size in _task_seeds(seed, draws)
+    ], workers)
+    shelter_samples = np.vstack([shelter for shelter, _ in bootstrap])
+    overall_samples = np.vstack([overall for _, overall in bootstrap])
+
+    # Controls: what the shelter mix looks like if crashes were somewhere else nearby
+    # The stop index is built once above and handed to each worker process, not to each task
+    control_samples = np.vstack(_run_tasks(
+        _shift_task, _task_seeds([seed, 1], draws), workers,
+        initializer=_init_shift_worker, initargs=(stop_tree, crashes_xy, injuries, radius_ft, shift_range_ft)
+    ))
+    control_mean = control_samples.mean(axis=0)
+    extreme = np.abs(control_samples - control_mean) >= np.abs(observed_shelter - control_mean)
+
+    tail = (1 - level) / 2 * 100
+    return pd.DataFrame({
+        'shelter': observed_shelter,
+        'shelter_low': np.percentile(shelter_samples, tail, axis=0),
+        'shelter_high': np.percentile(shelter_samples, 100 - tail, axis=0),
+        'overall': observed_overall,
+        'overall_low': np.percentile(overall_samples, tail, axis=0),
+        'overall_high': np.percentile(overall_samples, 100 - tail, axis=0),
+        'control': control_mean,
+        'control_low': np.percentile(control_samples, tail, axis=0),
+        'control_high': np.percentile(control_samples, 100 - tail, axis=0),
+        'p_value': (extreme.sum(axis=0) + 1) / (len(control_samples) + 1)
+    })
@@ -0,0 +1,85 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+
+
+# NY State Plane Long Island (US survey feet), so distances come out in feet
+PROJECTED_CRS = 'EPSG:2263'
+
+
+@lru_cache(maxsize=None)
+def _transformer(source_crs, target_crs):
+    """Build each transformer once; creating one costs milliseconds, more than projecting a single point."""
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def project_to_feet(longitude, latitude):
+    """Project longitude/latitude degrees to an (n, 2) array of x/y in feet."""
+    transformer = _transformer('EPSG:4326', PROJECTED_CRS)
+    x, y = transformer.transform(np.asarray(longitude, dtype='float64'), np.asarray(latitude, dtype='float64'))
+    return np.column_stack([x, y])
+
+
+def unproject_from_feet(x, y):
+    """Inverse of project_to_feet: x/y in feet back to longitude/latitude arrays."""
+    transformer = _transformer(PROJECTED_CRS, 'EPSG:4326')
+    return transformer.transform(np.asarray(x, dtype='float64'), np.asarray(y, dtype='float64'))
+
+
+def projected_xy(df, lon_col, lat_col):
+    """Return the precomputed x_ft/y_ft columns of `df`, projecting lon/lat only if they are missing."""
+    if 'x_ft' in df and 'y_ft' in df:
+        return np.column_stack([np.asarray(df['x_ft'], dtype='float64'), np.asarray(df['y_ft'], dtype='float64')])
+    return project_to_feet(df[lon_col], df[lat_col])
+
+
+def build_index(points_xy):
+    """Build a KD-tree over projected points for batched radius queries."""
+    return cKDTree(points_xy)
+
+
+def pairs_within(tree, query_xy, radius_ft):
+    """Return (query_index, tree_index) arrays for every pair closer than `radius_ft`."""
+    neighbours = tree.query_ball_point(query_xy, r=radius_ft)
+    lengths = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+    query_index = np.repeat(np.arange(len(neighbours)), lengths)
+    tree_index = np.fromiter((i for n in neighbours for i in n), dtype=np.int64, count=lengths.sum())
+    return query_index, tree_index
+
+
+def sum_within(tree, query_xy, radius_ft, values):
+    """Sum the `values` columns of the indexed points within `radius_ft` of every query point."""
+    values = np.asarray(values, dtype='float64').reshape(tree.n, -1)
+    query_index, tree_index = pairs_within(tree, query_xy, radius_ft)
+    sums = np.zeros((len(query_xy), values.shape[1]))
+    for i in range(values.shape[1]):
+        sums[:, i] = np.bincount(query_index, weights=values[tree_index, i], minlength=len(query_xy))
+    return sums
+
+
+def join_within(crashes_xy, stops_xy, radius_ft):
+    """Pair every crash with every stop within `radius_ft`, using point distances instead of buffers.
+
+    Returns a DataFrame of positional `crash_index` / `stop_index` and the `distance_ft` between
+    them, sorted by crash then stop.
+    """
+    crashes_xy = np.asarray(crashes_xy, dtype='float64')
+    stops_xy = np.asarray(stops_xy, dtype='float64')
+    if len(crashes_xy) == 0 or len(stops_xy) == 0:
+        return pd.DataFrame({'crash_index': np.array([], dtype=np.int64),
+                             'stop_index': np.array([], dtype=np.int64),
+                             'distance_ft': np.array([], dtype='float64')})
+
+    # Query the few thousand stops against a tree over the crashes
+    stop_index, crash_index = pairs_within(build_index(crashes_xy), stops_xy, radius_ft)
+    distance_ft = np.hypot(*(crashes_xy[crash_index] - stops_xy[stop_index]).T)
+
+    order = np.lexsort((stop_index, crash_index))
+    return pd.DataFrame({
+        'crash_index': crash_index[order],
+        'stop_index': stop_index[order],
+        'distance_ft': distance_ft[order]
+    })
@@ -0,0 +1,87 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from functools import lru_cache
+
+from crash_store import source_digest
+
+
+# Where stage outputs are kept, and how large the cache may grow before old entries go
+CACHE_DIR = 'data/cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+# Bump when cached outputs change meaning in a way the hashed stage sources do not show (e.g. a schema change)
+CACHE_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def code_digest(func):
+    """Hash of a function's source, so editing a stage invalidates what it cached."""
+    return hashlib.sha256(inspect.getsource(func).encode()).hexdigest()[:16]
+
+
+def cache_key(stage, input_files=(), params=None, upstream=None, code=()):
+    """Key a stage output on its name, the contents of its input files, its parameters and its upstream key.
+
+    The source of the `code` functions that compute it and CACHE_VERSION are part of the key too, so
+    changing a stage does not keep serving what the old version pickled.
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'code': [code_digest(func) for func in code],
+        'stage': stage,
+        'inputs': sorted(source_digest(path) for path in input_files),
+        'params': params or {},
+        'upstream': upstream
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def _entry_path(stage, key, cache_dir):
+    return os.path.join(cache_dir, f"{stage}-{key}.pkl")
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, suffix='.pkl'):
+    """Delete the least recently used `suffix` entries until the cache fits in `max_bytes`."""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(suffix):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
+
+
+def is_cached(stage, key, cache_dir=CACHE_DIR):
+    """Whether `cached()` would serve this stage output from disk."""
+    return os.path.exists(_entry_path(stage, key, cache_dir))
+
+
+def cached(stage, key, compute, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Return the cached output of a stage, running `compute()` and storing its result on a miss."""
+    path = _entry_path(stage, key, cache_dir)
+    if os.path.exists(path):
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    value = compute()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes)
+    return value
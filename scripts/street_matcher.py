@@ -0,0 +1,217 @@
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from crash_store import read_crashes, read_bus_stops
+from pipeline import NYC_BOUNDS
+from spatial_index import project_to_feet
+
+
+# Crash columns the matcher needs
+CRASH_COLUMNS = ['COLLISION_ID', 'BOROUGH', 'LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft', 'ON STREET NAME', 'CROSS STREET NAME']
+
+# Whole-word replacements applied after upper-casing (suffixes, spelled-out ordinals, common words)
+STREET_WORDS = {
+    'STREET': 'ST', 'STR': 'ST', 'AVENUE': 'AV', 'AVE': 'AV', 'AVN': 'AV', 'BOULEVARD': 'BLVD', 'BLV': 'BLVD',
+    'ROAD': 'RD', 'PLACE': 'PL', 'PARKWAY': 'PKWY', 'PKY': 'PKWY', 'EXPRESSWAY': 'EXPY', 'EXPWY': 'EXPY',
+    'DRIVE': 'DR', 'LANE': 'LN', 'COURT': 'CT', 'TERRACE': 'TER', 'HIGHWAY': 'HWY', 'SQUARE': 'SQ',
+    'TURNPIKE': 'TPKE', 'BRIDGE': 'BR', 'PLAZA': 'PLZ', 'CIRCLE': 'CIR', 'SAINT': 'ST', 'FORT': 'FT',
+    'FIRST': '1', 'SECOND': '2', 'THIRD': '3', 'FOURTH': '4', 'FIFTH': '5', 'SIXTH': '6',
+    'SEVENTH': '7', 'EIGHTH': '8', 'NINTH': '9', 'TENTH': '10', 'ELEVENTH': '11', 'TWELFTH': '12'
+}
+
+# Leading compass words are abbreviated (WEST 96 STREET -> W 96 ST)
+DIRECTIONS = {'WEST': 'W', 'EAST': 'E', 'NORTH': 'N', 'SOUTH': 'S'}
+
+_WORD_PATTERN = re.compile(r'\b(' + '|'.join(sorted(STREET_WORDS, key=len, reverse=True)) + r')\b')
+_DIRECTION_PATTERN = re.compile(r'^(' + '|'.join(DIRECTIONS) + r')\b')
+
+# Match levels and the confidence each starts from
+MATCH_LEVELS = {'borough': 1.0, 'citywide': 0.6}
+
+# Spread (feet) of the observations behind an intersection at which confidence has fallen to 1/e
+SPREAD_SCALE_FT = 300
+
+# Support needed before an intersection is trusted: confidence grows as support / (support + PRIOR_SUPPORT).
+# A shelter sits on its corner, so it counts as STOP_SUPPORT geocoded crashes.
+PRIOR_SUPPORT = 3
+STOP_SUPPORT = 3
+
+# Default floor on match confidence: a borough key seen once (0.25) or a citywide key with a shelter
+# behind it (0.3) is filled, a citywide key seen once (0.15) or one scattered over a block is not
+MIN_CONFIDENCE = 0.2
+
+
+# ----------------------------
+# Normalization
+# ----------------------------
+def _normalize_unique(names):
+    """Normalize an array of distinct street names; NaN for names that end up empty."""
+    names = pd.Series(names, dtype='str').str.upper().str.replace("'", '', regex=False)
+    names = (names.str.replace(r'[^\w\s/-]', ' ', regex=True)
+             .str.replace(r'\b(\d+)(?:ST|ND|RD|TH)\b', r'\1', regex=True)
+             .str.replace(r'\s+', ' ', regex=True).str.strip()
+             .str.replace(_DIRECTION_PATTERN, lambda m: DIRECTIONS[m.group(1)], regex=True)
+             .str.replace(_WORD_PATTERN, lambda m: STREET_WORDS[m.group(1)], regex=True))
+    return names.where(names.str.len() > 0).to_numpy(dtype=object)
+
+
+def normalize_streets(names):
+    """Canonical street names (case, abbreviations, suffixes, ordinals), normalizing each distinct name once."""
+    categorical = pd.Categorical(names)
+    normalized = np.append(_normalize_unique(categorical.categories), np.nan)
+    return normalized[categorical.codes]
+
+
+def intersection_keys(boroughs, on_streets, cross_streets):
+    """Order-independent (borough, street, street) and citywide (street, street) keys; NaN when unusable."""
+    on = pd.Series(normalize_streets(on_streets), dtype='str')
+    cross = pd.Series(normalize_streets(cross_streets), dtype='str')
+    valid = on.notna() & cross.notna() & (on != cross)
+    first, second = on.where(on < cross, cross), cross.where(on < cross, on)
+    citywide = (first + '|' + second).where(valid)
+    borough = pd.Series(np.asarray(boroughs, dtype=object), dtype='str').str.upper().str.strip()
+    return (borough + '|' + citywide).to_numpy(dtype=object), citywide.to_numpy(dtype=object)
+
+
+# ----------------------------
+# Index
+# ----------------------------
+def _locations(keys, latitude, longitude, x_ft, y_ft, support):
+    """One row per distinct key: mean position, observation count and support, and their spread in feet."""
+    observations = pd.DataFrame({'key': keys, 'latitude': latitude, 'longitude': longitude, 'x_ft': x_ft, 'y_ft': y_ft,
+                                 'support': support})
+    grouped = observations.dropna().groupby('key', sort=False)
+    index = grouped[['latitude', 'longitude']].mean()
+    index['observations'] = grouped.size()
+    index['support'] = grouped['support'].sum()
+    variance = grouped[['x_ft', 'y_ft']].var(ddof=0)
+    index['spread_ft'] = np.sqrt(variance['x_ft'] + variance['y_ft']).to_numpy()
+    return index
+
+
+def build_intersection_index(bus_stops, crashes):
+    """Hash index of intersection -> location from the bus shelters and the geocoded crashes.
+
+    Returns {level: DataFrame indexed by key}; lookups are pandas Index hash lookups. Positions
+    outside NYC_BOUNDS (e.g. 0/0 placeholders) are left out so they cannot drag a location away.
+    """
+    lat_min, lat_max, lon_min, lon_max = NYC_BOUNDS
+    crashes = crashes[crashes['LATITUDE'].between(lat_min, lat_max) & crashes['LONGITUDE'].between(lon_min, lon_max)]
+    bus_stops = bus_stops[bus_stops['Latitude'].between(lat_min, lat_max) & bus_stops['Longitude'].between(lon_min, lon_max)]
+    stop_keys = intersection_keys(bus_stops['BoroName'], bus_stops['On_Street'], bus_stops['Cross_Stre'])
+    crash_keys = intersection_keys(crashes['BOROUGH'], crashes['ON STREET NAME'], crashes['CROSS STREET NAME'])
+    stops_xy = project_to_feet(bus_stops['Longitude'], bus_stops['Latitude'])
+    crashes_xy = project_to_feet(crashes['LONGITUDE'], crashes['LATITUDE'])
+
+    latitude = np.concatenate([bus_stops['Latitude'].to_numpy(dtype='float64'), crashes['LATITUDE'].to_numpy(dtype='float64')])
+    longitude = np.concatenate([bus_stops['Longitude'].to_numpy(dtype='float64'), crashes['LONGITUDE'].to_numpy(dtype='float64')])
+    x_ft = np.concatenate([stops_xy[:, 0], crashes_xy[:, 0]])
+    y_ft = np.concatenate([stops_xy[:, 1], crashes_xy[:, 1]])
+    support = np.concatenate([np.full(len(bus_stops), STOP_SUPPORT, dtype='float64'), np.ones(len(crashes))])
+    return {
+        level: _locations(np.concatenate([stop_keys[i], crash_keys[i]]), latitude, longitude, x_ft, y_ft, support)
+        for i, level in enumerate(MATCH_LEVELS)
+    }
+
+
+def match_confidence(level, support, spread_ft):
+    """Confidence in [0, 1]: the level's base, times how well supported the location is, times a penalty for scattered positions."""
+    support = np.asarray(support, dtype='float64')
+    return MATCH_LEVELS[level] * support / (support + PRIOR_SUPPORT) * np.exp(-np.asarray(spread_ft) / SPREAD_SCALE_FT)
+
+
+# ----------------------------
+# Matching
+# ----------------------------
+def fill_missing_coordinates(crashes, index, min_confidence=MIN_CONFIDENCE):
+    """Give crashes without coordinates the location of their intersection, trying the borough key first.
+
+    Adds `match_level` ('geocoded' for rows that already had coordinates) and `match_confidence`
+    (1.0 for geocoded rows, NaN where nothing matched); x_ft/y_ft are filled too when present.
+    """
+    crashes = crashes.copy()
+    missing = np.flatnonzero(crashes['LATITUDE'].isna().to_numpy() | crashes['LONGITUDE'].isna().to_numpy())
+    subset = crashes.iloc[missing]
+    keys = intersection_keys(subset['BOROUGH'], subset['ON STREET NAME'], subset['CROSS STREET NAME'])
+
+    level = np.full(len(crashes), 'geocoded', dtype=object)
+    level[missing] = None
+    confidence = np.ones(len(crashes))
+    confidence[missing] = np.nan
+    # Writable copies: under copy-on-write to_numpy can hand back a read-only view of the column
+    latitude = np.array(crashes['LATITUDE'].to_numpy(dtype='float64', na_value=np.nan), copy=True)
+    longitude = np.array(crashes['LONGITUDE'].to_numpy(dtype='float64', na_value=np.nan), copy=True)
+
+    unmatched = np.ones(len(missing), dtype=bool)
+    for i, (name, locations) in enumerate(index.items()):
+        positions = locations.index.get_indexer(keys[i])
+        scores = np.zeros(len(missing))
+        found = positions >= 0
+        scores[found] = match_confidence(
+            name, locations['support'].to_numpy()[positions[found]], locations['spread_ft'].to_numpy()[positions[found]]
+        )
+        take = unmatched & found & (scores >= min_confidence)
+        rows = missing[take]
+        latitude[rows] = locations['latitude'].to_numpy()[positions[take]]
+        longitude[rows] = locations['longitude'].to_numpy()[positions[take]]
+        level[rows] = name
+        confidence[rows] = scores[take]
+        unmatched &= ~take
+
+    crashes['LATITUDE'] = latitude
+    crashes['LONGITUDE'] = longitude
+    if 'x_ft' in crashes and 'y_ft' in crashes:
+        filled = missing[~unmatched]
+        xy = project_to_feet(longitude[filled], latitude[filled])
+        crashes['x_ft'] = crashes['x_ft'].to_numpy(dtype='float64', na_value=np.nan)
+        crashes['y_ft'] = crashes['y_ft'].to_numpy(dtype='float64', na_value=np.nan)
+        crashes.iloc[filled, crashes.columns.get_loc('x_ft')] = xy[:, 0]
+        crashes.iloc[filled, crashes.columns.get_loc('y_ft')] = xy[:, 1]
+    crashes['match_level'] = level
+    crashes['match_confidence'] = confidence
+    return crashes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recover coordinates of un-geocoded crashes from their intersection.')
+    parser.add_argument('--crash-file', default='data/crash_collisions.csv')
+    parser.add_argument('--bus-stop-file', default='data/bus_stop_locations.csv')
+    parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE)
+    parser.add_argument('--output', help='save the recovered crashes (COLLISION_ID, coordinates, match columns) to this CSV')
+    args = parser.parse_args(argv)
+
+    crashes = read_crashes(args.crash_file, columns=CRASH_COLUMNS)
+    bus_stops = read_bus_stops(args.bus_stop_file).dropna(subset=['Latitude', 'Longitude'])
+    missing = int(crashes['LATITUDE'].isna().sum())
+    print(f"{len(crashes)} crashes, {missing} without coordinates ({missing / len(crashes) * 100 if len(crashes) else 0:.1f}%).")
+
+    start = time.perf_counter()
+    index = build_intersection_index(bus_stops, crashes)
+    build_s = time.perf_counter() - start
+    sizes = ', '.join(f"{len(locations)} {level}" for level, locations in index.items())
+    print(f"Indexed {sizes} intersections in {build_s:.2f}s "
+          f"({(len(crashes) - missing + len(bus_stops)) / build_s:,.0f} observations/s).")
+
+    start = time.perf_counter()
+    matched = fill_missing_coordinates(crashes, index, min_confidence=args.min_confidence)
+    match_s = time.perf_counter() - start
+    print(f"Matched {missing} crashes in {match_s:.2f}s ({missing / match_s if match_s else 0:,.0f} rows/s).")
+
+    # Recovery by match level, with the confidence spread
+    recovered = matched[matched['match_level'].isin(list(MATCH_LEVELS))]
+    summary = recovered.groupby('match_level')['match_confidence'].describe(percentiles=[0.5])[['count', 'mean', '50%', 'min']]
+    print(f"Recovered {len(recovered)} of {missing} ({len(recovered) / missing * 100 if missing else 0:.1f}%):")
+    print(summary.round(3).to_string())
+
+    if args.output:
+        recovered[['COLLISION_ID', 'LATITUDE', 'LONGITUDE', 'match_level', 'match_confidence']].to_csv(args.output, index=False)
+        print(f"Recovered crashes saved to '{args.output}'.")
+    return matched
+
+
+if __name__ == "__main__":
+    main()
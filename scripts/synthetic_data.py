@@ -0,0 +1,254 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from crash_store import CRASH_DTYPES, BUS_STOP_DTYPES
+
+
+# Named sizes the generator and the benchmarks understand
+SIZES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+
+# Where generated files go
+SYNTHETIC_DIR = 'data/synthetic'
+
+# Roughly the number of shelters in the real file
+BUS_STOP_COUNT = 3300
+
+# Rows generated (and written) per chunk so 10M rows never sit in memory at once
+CHUNK_ROWS = 1_000_000
+
+# name, BoroCode, Shelter_ID prefix, centre lat/lon, spread lat/lon (degrees), share of stops, share of crashes, ZIP range
+BOROUGHS = [
+    ('Manhattan', 1, 'MN', 40.7831, -73.9712, 0.045, 0.020, 0.25, 0.20, (10001, 10282)),
+    ('Bronx', 2, 'BX', 40.8448, -73.8648, 0.030, 0.035, 0.15, 0.16, (10451, 10475)),
+    ('Brooklyn', 3, 'BR', 40.6500, -73.9442, 0.040, 0.045, 0.28, 0.31, (11201, 11256)),
+    ('Queens', 4, 'QN', 40.7282, -73.8200, 0.045, 0.070, 0.25, 0.28, (11101, 11697)),
+    ('Staten Island', 5, 'SI', 40.5795, -74.1502, 0.035, 0.050, 0.07, 0.05, (10301, 10314))
+]
+
+# Share of crashes scattered around a shelter vs around a borough hot spot, and hot spots per borough
+NEAR_STOP_SHARE = 0.5
+HOTSPOTS_PER_BOROUGH = 40
+
+# Spread (degrees) of crashes around a shelter and around a hot spot
+STOP_SPREAD = 0.0015
+HOTSPOT_SPREAD = 0.004
+
+# Data-quality quirks of the real file
+MISSING_LOCATION_SHARE = 0.07
+ZERO_LOCATION_SHARE = 0.002
+MISSING_BOROUGH_SHARE = 0.3
+
+# Crash dates span this range
+FIRST_DATE, LAST_DATE = '2012-07-01', '2024-12-31'
+
+# Relative crash frequency for each hour of the day (quiet nights, rush-hour peaks)
+HOURLY_PROFILE = np.array([3, 2, 2, 1, 1, 2, 3, 5, 7, 6, 6, 6, 6, 7, 8, 9, 10, 9, 8, 7, 6, 5, 4, 3], dtype='float64')
+
+# Expected injured per crash by mode, and chance that a crash kills someone of that mode
+INJURY_RATES = {'PEDESTRIANS': 0.06, 'CYCLIST': 0.03, 'MOTORIST': 0.20}
+DEATH_RATES = {'PEDESTRIANS': 0.0004, 'CYCLIST': 0.0001, 'MOTORIST': 0.0003}
+
+CONTRIBUTING_FACTORS = [
+    'Unspecified', 'Driver Inattention/Distraction', 'Failure to Yield Right-of-Way', 'Following Too Closely',
+    'Backing Unsafely', 'Passing or Lane Usage Improper', 'Passing Too Closely', 'Unsafe Lane Changing',
+    'Other Vehicular', 'Turning Improperly', 'Unsafe Speed', 'Traffic Control Disregarded',
+    'Driver Inexperience', 'Alcohol Involvement', 'Pedestrian/Bicyclist/Other Pedestrian Error/Confusion'
+]
+FACTOR_WEIGHTS = np.array([34, 20, 6, 6, 4, 4, 4, 3, 3, 3, 3, 2, 2, 1, 1], dtype='float64')
+
+VEHICLE_TYPES = [
+    'Sedan', 'Station Wagon/Sport Utility Vehicle', 'PASSENGER VEHICLE', 'SPORT UTILITY / STATION WAGON', 'Taxi',
+    'Pick-up Truck', 'Box Truck', 'Bus', 'Bike', 'Motorcycle', 'E-Bike', 'Van'
+]
+VEHICLE_WEIGHTS = np.array([30, 25, 10, 8, 5, 4, 3, 3, 3, 2, 2, 5], dtype='float64')
+
+# Chance that vehicle 1..5 is present at all
+VEHICLE_PRESENT = [0.99, 0.75, 0.08, 0.02, 0.01]
+
+STREET_SUFFIXES = ['ST', 'AV', 'BLVD', 'RD', 'PL']
+NAMED_STREETS = ['BROADWAY', 'ATLANTIC AV', 'QUEENS BLVD', 'GRAND CONCOURSE', 'FLATBUSH AV', 'NORTHERN BLVD',
+                 'HYLAN BLVD', 'JAMAICA AV', 'FORDHAM RD', 'OCEAN PKWY', 'BELT PKWY', 'LEXINGTON AV']
+
+
+def parse_size(size):
+    """Row count for '10k' / '1M' style labels (or a plain integer)."""
+    if str(size) in SIZES:
+        return SIZES[str(size)]
+    return int(str(size).replace('_', ''))
+
+
+def _street_names(rng, n):
+    numbered = np.char.add(rng.integers(1, 240, n).astype(str), ' ')
+    numbered = np.char.add(numbered, np.array(STREET_SUFFIXES)[rng.integers(0, len(STREET_SUFFIXES), n)])
+    return np.where(rng.random(n) < 0.3, np.array(NAMED_STREETS)[rng.integers(0, len(NAMED_STREETS), n)], numbered)
+
+
+def generate_bus_stops(count=BUS_STOP_COUNT, seed=0):
+    """Synthetic shelter table with the columns and dtypes of the real bus stop file."""
+    rng = np.random.default_rng(seed)
+    shares = np.array([borough[7] for borough in BOROUGHS])
+    borough_index = np.sort(rng.choice(len(BOROUGHS), size=count, p=shares / shares.sum()))
+
+    rows = []
+    for i, (name, code, prefix, lat, lon, lat_spread, lon_spread, *_) in enumerate(BOROUGHS):
+        n = int((borough_index == i).sum())
+        latitude = np.round(rng.normal(lat, lat_spread, n), 6)
+        longitude = np.round(rng.normal(lon, lon_spread, n), 6)
+        rows.append(pd.DataFrame({
+            'the_geom': [f"POINT ({x} {y})" for x, y in zip(longitude, latitude)],
+            'BoroCode': code,
+            'BoroName': name,
+            'BoroCD': code * 100 + rng.integers(1, 19, n),
+            'CounDist': rng.integers(1, 52, n),
+            'AssemDist': rng.integers(23, 88, n),
+            'StSenDist': rng.integers(10, 37, n),
+            'CongDist': rng.integers(3, 17, n),
+            'Shelter_ID': [f"{prefix}0{number}" for number in range(1, n + 1)],
+            'Corner': np.array(['NE', 'NW', 'SE', 'SW'])[rng.integers(0, 4, n)],
+            'On_Street': _street_names(rng, n),
+            'Cross_Stre': _street_names(rng, n),
+            'Longitude': longitude,
+            'Latitude': latitude,
+            'NTAName': [f"{name} {number}" for number in rng.integers(1, 40, n)],
+            'FEMAFldz': 'X',
+            'FEMAFldT': 'AREA OF MINIMAL FLOOD HAZARD',
+            'HrcEvac': np.where(rng.random(n) < 0.6, np.nan, rng.integers(1, 7, n))
+        }))
+    return pd.concat(rows, ignore_index=True).astype(BUS_STOP_DTYPES)[list(BUS_STOP_DTYPES)]
+
+
+def _pick(rng, values, weights, n, present=1.0):
+    """Draw `n` weighted labels, leaving a share of them blank."""
+    picked = np.array(values, dtype=object)[rng.choice(len(values), size=n, p=weights / weights.sum())]
+    picked[rng.random(n) >= present] = None
+    return picked
+
+
+def generate_crash_chunk(rng, n, bus_stops, hotspots, first_id=4_000_000):
+    """`n` synthetic crash rows with the columns and dtypes of the real crash file."""
+    crash_shares = np.array([borough[8] for borough in BOROUGHS])
+    borough_index = rng.choice(len(BOROUGHS), size=n, p=crash_shares / crash_shares.sum())
+
+    # Crashes cluster around shelters (bus corridors) and around per-borough hot spots
+    near_stop = rng.random(n) < NEAR_STOP_SHARE
+    stop_index = rng.integers(0, len(bus_stops), n)
+    hotspot_index = rng.integers(0, HOTSPOTS_PER_BOROUGH, n)
+    hotspot = hotspots[borough_index, hotspot_index]
+    latitude = np.where(near_stop, bus_stops['Latitude'].to_numpy()[stop_index] + rng.normal(0, STOP_SPREAD, n),
+                        hotspot[:, 0] + rng.normal(0, HOTSPOT_SPREAD, n))
+    longitude = np.where(near_stop, bus_stops['Longitude'].to_numpy()[stop_index] + rng.normal(0, STOP_SPREAD, n),
+                         hotspot[:, 1] + rng.normal(0, HOTSPOT_SPREAD, n))
+    latitude, longitude = np.round(latitude, 8), np.round(longitude, 8)
+
+    # Borough follows the shelter for near-stop crashes
+    stop_boroughs = bus_stops['BoroCode'].to_numpy()[stop_index] - 1
+    borough_index = np.where(near_stop, stop_boroughs, borough_index)
+
+    # Missing and (0, 0) locations, as in the real file
+    quirk = rng.random(n)
+    latitude[quirk < MISSING_LOCATION_SHARE] = np.nan
+    longitude[quirk < MISSING_LOCATION_SHARE] = np.nan
+    zero = (quirk >= MISSING_LOCATION_SHARE) & (quirk < MISSING_LOCATION_SHARE + ZERO_LOCATION_SHARE)
+    latitude[zero] = 0.0
+    longitude[zero] = 0.0
+    location = pd.Series('(' + pd.Series(latitude).astype(str) + ', ' + pd.Series(longitude).astype(str) + ')')
+    location[np.isnan(latitude)] = None
+
+    # Dates and times: format each distinct value once, then index
+    dates = pd.date_range(FIRST_DATE, LAST_DATE).strftime('%m/%d/%Y').to_numpy()
+    times = np.array([f"{hour}:{minute:02d}" for hour in range(24) for minute in range(60)])
+    hour = rng.choice(24, size=n, p=HOURLY_PROFILE / HOURLY_PROFILE.sum())
+
+    borough_names = np.array([borough[0].upper() for borough in BOROUGHS], dtype=object)[borough_index]
+    missing_borough = rng.random(n) < MISSING_BOROUGH_SHARE
+    borough_names[missing_borough] = None
+    zip_low = np.array([borough[9][0] for borough in BOROUGHS])[borough_index]
+    zip_high = np.array([borough[9][1] for borough in BOROUGHS])[borough_index]
+    zip_codes = rng.integers(zip_low, zip_high + 1).astype(str).astype(object)
+    zip_codes[missing_borough] = None
+
+    on_street = np.where(near_stop, bus_stops['On_Street'].to_numpy()[stop_index], _street_names(rng, n)).astype(object)
+    cross_street = np.where(near_stop, bus_stops['Cross_Stre'].to_numpy()[stop_index], _street_names(rng, n)).astype(object)
+    off_street = np.full(n, None, dtype=object)
+    no_intersection = rng.random(n) < 0.2
+    off_street[no_intersection] = np.char.add(rng.integers(1, 3000, int(no_intersection.sum())).astype(str), ' MAIN STREET')
+    on_street[no_intersection] = None
+    cross_street[no_intersection | (rng.random(n) < 0.1)] = None
+
+    crashes = {
+        'CRASH DATE': dates[rng.integers(0, len(dates), n)],
+        'CRASH TIME': times[hour * 60 + rng.integers(0, 60, n)],
+        'BOROUGH': borough_names,
+        'ZIP CODE': zip_codes,
+        'LATITUDE': latitude,
+        'LONGITUDE': longitude,
+        'LOCATION': location.to_numpy(),
+        'ON STREET NAME': on_street,
+        'CROSS STREET NAME': cross_street,
+        'OFF STREET NAME': off_street
+    }
+
+    # Injuries and deaths by mode; the person totals are their sums
+    injured, killed = np.zeros(n), np.zeros(n)
+    for mode, rate in INJURY_RATES.items():
+        crashes[f'NUMBER OF {mode} INJURED'] = rng.poisson(rate, n)
+        crashes[f'NUMBER OF {mode} KILLED'] = (rng.random(n) < DEATH_RATES[mode]).astype(np.int64)
+        injured += crashes[f'NUMBER OF {mode} INJURED']
+        killed += crashes[f'NUMBER OF {mode} KILLED']
+    crashes['NUMBER OF PERSONS INJURED'] = injured
+    crashes['NUMBER OF PERSONS KILLED'] = killed
+
+    for i, present in enumerate(VEHICLE_PRESENT, start=1):
+        vehicle = _pick(rng, VEHICLE_TYPES, VEHICLE_WEIGHTS, n, present)
+        factor = _pick(rng, CONTRIBUTING_FACTORS, FACTOR_WEIGHTS, n)
+        factor[pd.isna(vehicle)] = None
+        crashes[f'CONTRIBUTING FACTOR VEHICLE {i}'] = factor
+        crashes[f'VEHICLE TYPE CODE {i}'] = vehicle
+    crashes['COLLISION_ID'] = np.arange(first_id, first_id + n)
+
+    return pd.DataFrame(crashes)[list(CRASH_DTYPES)]
+
+
+def write_synthetic_data(sizes=('10k',), output_dir=SYNTHETIC_DIR, seed=0):
+    """Write a shared synthetic shelter file and one crash file per size; returns their paths.
+
+    The same seed always produces the same files, and a smaller file is not a prefix of a larger one.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    bus_stop_file = os.path.join(output_dir, 'bus_stop_locations.csv')
+    bus_stops = generate_bus_stops(seed=seed)
+    bus_stops.to_csv(bus_stop_file, index=False)
+
+    # Hot spots are fixed per seed so every size shares the same city
+    rng = np.random.default_rng([seed, 1])
+    hotspots = np.stack([
+        np.column_stack([rng.normal(b[3], b[5], HOTSPOTS_PER_BOROUGH), rng.normal(b[4], b[6], HOTSPOTS_PER_BOROUGH)])
+        for b in BOROUGHS
+    ])
+
+    crash_files = {}
+    for size in sizes:
+        rows = parse_size(size)
+        crash_file = os.path.join(output_dir, f"crash_collisions_{size}.csv")
+        chunk_seeds = np.random.SeedSequence([seed, rows]).spawn(-(-rows // CHUNK_ROWS))
+        for i, chunk_seed in enumerate(chunk_seeds):
+            start = i * CHUNK_ROWS
+            chunk = generate_crash_chunk(np.random.default_rng(chunk_seed), min(CHUNK_ROWS, rows - start),
+                                         bus_stops, hotspots, first_id=4_000_000 + start)
+            chunk.to_csv(crash_file, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        crash_files[size] = crash_file
+        print(f"Wrote {rows} synthetic crashes to '{crash_file}'.")
+    return bus_stop_file, crash_files
+
+
+def main():
+    # `synthetic_data.py [SIZE ...]`, e.g. `synthetic_data.py 10k 1M`
+    sizes = sys.argv[1:] or list(SIZES)
+    write_synthetic_data(sizes)
+
+
+if __name__ == "__main__":
+    main()
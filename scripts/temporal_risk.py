@@ -0,0 +1,144 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from adjacency import ADJACENCY_DIR
+
+
+# Crash columns the cube needs
+CRASH_COLUMNS = ['CRASH DATE', 'CRASH TIME', 'LATITUDE', 'LONGITUDE', 'x_ft', 'y_ft', 'NUMBER OF PERSONS INJURED']
+
+# Cube file; the Shelter_ID of every cube row is saved next to it
+CUBE_FILE = 'data/temporal_risk.npy'
+
+# Last axis of the cube
+METRICS = ['crashes', 'injuries']
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _stop_ids_file(cube_file):
+    return os.path.splitext(cube_file)[0] + '.stops.npy'
+
+
+def parse_weekday(dates):
+    """Day of week (Mon=0) of MM/DD/YYYY strings, -1 where missing or malformed.
+
+    Only the distinct dates (a few thousand over the whole history) are parsed; every row then
+    just looks its answer up by code.
+    """
+    codes, uniques = pd.factorize(pd.Series(dates), use_na_sentinel=True)
+    weekdays = pd.to_datetime(pd.Series(uniques), format='%m/%d/%Y', errors='coerce').dt.dayofweek
+    lookup = np.append(weekdays.fillna(-1).to_numpy(dtype=np.int8), np.int8(-1))
+    return lookup[codes]
+
+
+def parse_hour(times):
+    """Hour of H:MM / HH:MM strings as integers, -1 where missing or malformed."""
+    codes, uniques = pd.factorize(pd.Series(times), use_na_sentinel=True)
+    hours = pd.to_numeric(pd.Series(uniques, dtype='object').str.split(':').str[0], errors='coerce')
+    hours = hours.where(hours.between(0, 23))
+    lookup = np.append(hours.fillna(-1).to_numpy(dtype=np.int8), np.int8(-1))
+    return lookup[codes]
+
+
+def build_risk_cube(crashes, bus_stops, radius_ft=150, adjacency_dir=None):
+    """Count crashes and injuries within `radius_ft` of every stop by hour of day and day of week.
+
+    Matches come from the stop x crash adjacency (persisted in `adjacency_dir` when given), shared
+    with the other per-stop metrics. Returns an int32 array shaped (stops, 24, 7, len(METRICS)) in
+    bus_stops row order.
+    """
+    hour = parse_hour(crashes['CRASH TIME'])
+    weekday = parse_weekday(crashes['CRASH DATE'])
+    injuries = crashes['NUMBER OF PERSONS INJURED'].fillna(0).to_numpy()
+
+    pairs = pipeline.join(crashes, bus_stops, radius_ft=radius_ft, adjacency_dir=adjacency_dir)
+    crash_index = pairs['crash_index'].to_numpy()
+    stop_index = pairs['stop_index'].to_numpy()
+
+    # Drop matches whose crash has no usable timestamp
+    valid = (hour[crash_index] >= 0) & (weekday[crash_index] >= 0)
+    crash_index, stop_index = crash_index[valid], stop_index[valid]
+
+    # One flat bin per (stop, hour, weekday)
+    cells = len(bus_stops) * 24 * 7
+    flat = (stop_index * 24 + hour[crash_index]) * 7 + weekday[crash_index]
+    cube = np.empty((len(bus_stops), 24, 7, len(METRICS)), dtype=np.int32)
+    cube[..., 0] = np.bincount(flat, minlength=cells).reshape(-1, 24, 7)
+    cube[..., 1] = np.bincount(flat, weights=injuries[crash_index], minlength=cells).reshape(-1, 24, 7)
+    return cube
+
+
+def save_risk_cube(cube, bus_stops, cube_file=CUBE_FILE):
+    os.makedirs(os.path.dirname(cube_file) or '.', exist_ok=True)
+    np.save(cube_file, cube)
+    np.save(_stop_ids_file(cube_file), bus_stops['Shelter_ID'].astype(str).to_numpy(dtype=str))
+
+
+def load_risk_cube(cube_file=CUBE_FILE):
+    """Memory-map a saved cube and return it with the Shelter_ID of each row."""
+    cube = np.load(cube_file, mmap_mode='r')
+    stop_ids = np.load(_stop_ids_file(cube_file))
+    return cube, stop_ids
+
+
+def peak_hours(cube, stop_ids, shelter_id, top_n=3, metric='crashes', weekday=None):
+    """Busiest hours of day at one shelter, optionally for a single weekday (0=Mon or 'Mon')."""
+    matches = np.flatnonzero(stop_ids == str(shelter_id))
+    if len(matches) == 0:
+        raise ValueError(f"Unknown Shelter_ID '{shelter_id}'.")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of {METRICS}.")
+
+    stop = np.asarray(cube[matches[0]])
+    if weekday is not None:
+        day = WEEKDAYS.index(weekday) if isinstance(weekday, str) else int(weekday)
+        stop = stop[:, day:day + 1]
+    by_hour = stop.sum(axis=1)
+
+    hours = pd.DataFrame({'hour': np.arange(24), 'crashes': by_hour[:, 0], 'injuries': by_hour[:, 1]})
+    hours = hours[hours[metric] > 0]
+    return hours.sort_values([metric, 'hour'], ascending=[False, True]).head(top_n).reset_index(drop=True)
+
+
+def peak_weekday_hours(cube, stop_ids, shelter_id, top_n=5, metric='crashes'):
+    """Busiest (weekday, hour) slots at one shelter."""
+    matches = np.flatnonzero(stop_ids == str(shelter_id))
+    if len(matches) == 0:
+        raise ValueError(f"Unknown Shelter_ID '{shelter_id}'.")
+
+    values = np.asarray(cube[matches[0], :, :, METRICS.index(metric)])
+    order = np.argsort(values, axis=None, kind='stable')[::-1][:top_n]
+    hour, day = np.unravel_index(order, values.shape)
+    slots = pd.DataFrame({'weekday': [WEEKDAYS[d] for d in day], 'hour': hour, metric: values[hour, day]})
+    return slots[slots[metric] > 0].reset_index(drop=True)
+
+
+def main():
+    # File paths
+    crash_file = 'data/crash_collisions.csv'
+    bus_stop_file = 'data/bus_stop_locations.csv'
+
+    # Build the cube unless one is already saved; `temporal_risk.py --rebuild` forces it
+    if '--rebuild' in sys.argv or not os.path.exists(CUBE_FILE):
+        crashes, bus_stops = pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
+        crashes, bus_stops = pipeline.project(*pipeline.clean_data(crashes, bus_stops))
+        save_risk_cube(build_risk_cube(crashes, bus_stops, adjacency_dir=ADJACENCY_DIR), bus_stops)
+        print(f"Risk cube for {len(bus_stops)} bus stops saved to '{CUBE_FILE}'.")
+
+    cube, stop_ids = load_risk_cube()
+
+    # `temporal_risk.py SHELTER_ID` shows that shelter; otherwise the one with the most crashes
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    shelter_id = args[0] if args else stop_ids[np.asarray(cube[..., 0]).sum(axis=(1, 2)).argmax()]
+    print(f"Peak hours for bus stop {shelter_id}:")
+    print(peak_hours(cube, stop_ids, shelter_id))
+    print(peak_weekday_hours(cube, stop_ids, shelter_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from parallel_join import default_workers
+
+
+# Zoom levels of the pyramid
+MIN_ZOOM = 10
+MAX_ZOOM = 18
+
+# Tile edge in pixels, and the pixel grid crashes are snapped to inside a tile
+TILE_PIXELS = 256
+PIXEL_GRID = 2
+
+# Crash columns the exporter needs
+CRASH_COLUMNS = ['LATITUDE', 'LONGITUDE', 'NUMBER OF PERSONS INJURED']
+
+# Tiles are grouped into batches of this many per worker task
+TILES_PER_TASK = 2000
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>NYC crashes and bus shelters</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map', {{minZoom: {min_zoom}, maxZoom: {max_zoom}}}).setView([40.7128, -74.0060], 12);
+L.tileLayer('https://{{s}}.basemaps.cartocdn.com/light_all/{{z}}/{{x}}/{{y}}.png', {{
+    attribution: '&copy; OpenStreetMap contributors &copy; CARTO'
+}}).addTo(map);
+
+// Only the tiles in view are fetched; a missing tile simply has no crashes
+var CrashTiles = L.GridLayer.extend({{
+    createTile: function (coords, done) {{
+        var tile = document.createElement('canvas');
+        tile.width = tile.height = {tile_pixels};
+        fetch(coords.z + '/' + coords.x + '/' + coords.y + '.json')
+            .then(function (response) {{ return response.ok ? response.json() : {{points: [], stops: []}}; }})
+            .then(function (data) {{
+                var ctx = tile.getContext('2d');
+                data.points.forEach(function (p) {{
+                    ctx.fillStyle = p[3] > 0 ? 'rgba(200, 0, 0, 0.7)' : 'rgba(255, 140, 0, 0.6)';
+                    var r = Math.min(1.5 + Math.log2(p[2]), 6);
+                    ctx.beginPath();
+                    ctx.arc(p[0], p[1], r, 0, 2 * Math.PI);
+                    ctx.fill();
+                }});
+                ctx.fillStyle = 'rgba(0, 60, 220, 0.9)';
+                data.stops.forEach(function (s) {{ ctx.fillRect(s[0] - 3, s[1] - 3, 6, 6); }});
+                done(null, tile);
+            }})
+            .catch(function (error) {{ done(error, tile); }});
+        return tile;
+    }}
+}});
+new CrashTiles({{minZoom: {min_zoom}, maxZoom: {max_zoom}}}).addTo(map);
+</script>
+</body>
+</html>
+"""
+
+
+def pixel_xy(longitude, latitude, zoom):
+    """Global Web Mercator pixel coordinates of lon/lat at `zoom`."""
+    scale = TILE_PIXELS * 2 ** zoom
+    lat = np.radians(np.asarray(latitude, dtype='float64'))
+    x = (np.asarray(longitude, dtype='float64') + 180) / 360 * scale
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * scale
+    return x, y
+
+
+def _tile_points(crashes, bus_stops):
+    """Stack crashes (kind 0) and bus stops (kind 1) into one frame of tile features."""
+    crash_points = pd.DataFrame({
+        'kind': 0,
+        'longitude': crashes['longitude'].to_numpy(),
+        'latitude': crashes['latitude'].to_numpy(),
+        'injured': crashes['NUMBER OF PERSONS INJURED'].fillna(0).to_numpy().astype(np.int64),
+        'label': ''
+    })
+    stop_points = pd.DataFrame({
+        'kind': 1,
+        'longitude': bus_stops['longitude'].to_numpy(),
+        'latitude': bus_stops['latitude'].to_numpy(),
+        'injured': 0,
+        'label': bus_stops['Shelter_ID'].astype(str).to_numpy()
+    })
+    points = pd.concat([crash_points, stop_points], ignore_index=True)
+    # One 64-bit hash per feature; a tile's fingerprint is the (wrapping) sum over its features
+    points['hash'] = pd.util.hash_pandas_object(points, index=False).to_numpy()
+    return points
+
+
+def _zoom_tiles(points, zoom):
+    """Sort features by tile at `zoom`; return the order, tile ids, group starts and fingerprints."""
+    x, y = pixel_xy(points['longitude'], points['latitude'], zoom)
+    tile_x = (x // TILE_PIXELS).astype(np.int64)
+    tile_y = (y // TILE_PIXELS).astype(np.int64)
+    keys = (tile_x << 20) | tile_y
+
+    order = np.argsort(keys, kind='stable')
+    tiles, starts = np.unique(keys[order], return_index=True)
+    fingerprints = np.add.reduceat(points['hash'].to_numpy()[order], starts) if len(order) else np.array([], dtype=np.uint64)
+    counts = np.diff(np.append(starts, len(order)))
+    return order, tiles, starts, fingerprints, counts
+
+
+def _write_tile_batch(task):
+    """Worker: build and write a batch of tiles at one zoom level."""
+    output_dir, zoom, tiles, groups, longitude, latitude, injured, kind, label = task
+    for tile, (start, end) in zip(tiles, groups):
+        tile_x, tile_y = int(tile >> 20), int(tile & ((1 << 20) - 1))
+        x, y = pixel_xy(longitude[start:end], latitude[start:end], zoom)
+
+        # Pixel position inside the tile, snapped to the PIXEL_GRID
+        px = (np.floor((x - tile_x * TILE_PIXELS) / PIXEL_GRID) * PIXEL_GRID + PIXEL_GRID / 2).astype(np.int64)
+        py = (np.floor((y - tile_y * TILE_PIXELS) / PIXEL_GRID) * PIXEL_GRID + PIXEL_GRID / 2).astype(np.int64)
+        is_crash = kind[start:end] == 0
+
+        # Crashes on the same snapped pixel collapse into one point with a count
+        cells, cell_ids = np.unique(np.column_stack([px[is_crash], py[is_crash]]), axis=0, return_inverse=True)
+        cell_ids = cell_ids.ravel()
+        counts = np.bincount(cell_ids, minlength=len(cells))
+        injuries = np.bincount(cell_ids, weights=injured[start:end][is_crash], minlength=len(cells)).astype(np.int64)
+        points = np.column_stack([cells, counts, injuries]).tolist() if len(cells) else []
+        stops = [[int(a), int(b), s] for a, b, s in zip(px[~is_crash], py[~is_crash], label[start:end][~is_crash])]
+
+        tile_dir = os.path.join(output_dir, str(zoom), str(tile_x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f"{tile_y}.json"), 'w') as f:
+            json.dump({'points': points, 'stops': stops}, f, separators=(',', ':'))
+    return len(tiles)
+
+
+def export_tiles(crashes, bus_stops, output_dir='outputs/tiles', min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, workers=None):
+    """Write a z{min_zoom}-z{max_zoom} pyramid of crash/bus-stop tiles plus a viewer page.
+
+    A manifest keeps a fingerprint of the features in every tile, so re-running only rewrites tiles
+    whose crashes or stops changed and removes tiles that became empty.
+    """
+    manifest_file = os.path.join(output_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    points = _tile_points(crashes, bus_stops)
+    longitude = points['longitude'].to_numpy()
+    latitude = points['latitude'].to_numpy()
+    injured = points['injured'].to_numpy()
+    kind = points['kind'].to_numpy()
+    label = points['label'].to_numpy()
+
+    tasks = []
+    new_manifest = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        order, tiles, starts, fingerprints, counts = _zoom_tiles(points, zoom)
+        ends = starts + counts
+
+        # Only tiles whose fingerprint moved need rebuilding
+        changed = []
+        for i, tile in enumerate(tiles):
+            name = f"{zoom}/{tile >> 20}/{tile & ((1 << 20) - 1)}"
+            fingerprint = f"{fingerprints[i]:016x}:{counts[i]}"
+            new_manifest[name] = fingerprint
+            if manifest.get(name) != fingerprint:
+                changed.append(i)
+
+        # Hand each worker a contiguous slice of the sorted features
+        for batch_start in range(0, len(changed), TILES_PER_TASK):
+            batch = changed[batch_start:batch_start + TILES_PER_TASK]
+            rows = np.concatenate([order[starts[i]:ends[i]] for i in batch])
+            offsets = np.cumsum([0] + [counts[i] for i in batch])
+            groups = list(zip(offsets[:-1], offsets[1:]))
+            tasks.append((output_dir, zoom, tiles[batch], groups,
+                          longitude[rows], latitude[rows], injured[rows], kind[rows], label[rows]))
+
+    workers = workers or default_workers()
+    if workers == 1 or len(tasks) <= 1:
+        written = sum(_write_tile_batch(task) for task in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            written = sum(executor.map(_write_tile_batch, tasks))
+
+    # Drop tiles that no longer have any features
+    removed = 0
+    for name in set(manifest) - set(new_manifest):
+        path = os.path.join(output_dir, name + '.json')
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(manifest_file, 'w') as f:
+        json.dump(new_manifest, f)
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write(VIEWER_HTML.format(min_zoom=min_zoom, max_zoom=max_zoom, tile_pixels=TILE_PIXELS))
+
+    print(f"{len(new_manifest)} tiles in pyramid: {written} written, {removed} removed, "
+          f"{len(new_manifest) - written} unchanged.")
+    return new_manifest
+
+
+def main():
+    # File paths
+    crash_file = 'data/crash_collisions.csv'
+    bus_stop_file = 'data/bus_stop_locations.csv'
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else 'outputs/tiles'
+
+    # Load and clean data, dropping points outside NYC (e.g. 0/0 placeholders) so they get no tiles
+    crashes, bus_stops = pipeline.load_data(crash_file, bus_stop_file, columns=CRASH_COLUMNS)
+    crashes, bus_stops = pipeline.clean_data(crashes, bus_stops, bounds=pipeline.NYC_BOUNDS)
+
+    # Build (or update) the pyramid; serve it with e.g. `python -m http.server -d outputs/tiles`
+    export_tiles(crashes, bus_stops, output_dir)
+
+
+if __name__ == "__main__":
+    main()
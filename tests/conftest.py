@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+
+@pytest.fixture(scope='session')
+def synthetic_files(tmp_path_factory):
+    """A small synthetic shelter file and crash file, shared by the whole session."""
+    from synthetic_data import write_synthetic_data
+
+    bus_stop_file, crash_files = write_synthetic_data(['3000'], output_dir=str(tmp_path_factory.mktemp('synthetic')))
+    return crash_files['3000'], bus_stop_file
+
+
+@pytest.fixture
+def crash_copy(synthetic_files, tmp_path):
+    """The synthetic crash CSV copied to a fresh directory, so stores built next to it do not leak between tests."""
+    import shutil
+
+    crash_file = str(tmp_path / 'crash_collisions.csv')
+    shutil.copy(synthetic_files[0], crash_file)
+    return crash_file, synthetic_files[1]
@@ -0,0 +1,14 @@
+import pandas as pd
+
+import pipeline
+from array_store import run_arrays
+
+
+def test_arrays_match_csv_pipeline(crash_copy, tmp_path):
+    crash_file, bus_stop_file = crash_copy
+    expected = pipeline.run_pipeline(crash_file, bus_stop_file, cache_dir=str(tmp_path / 'cache'), adjacency_dir=None)
+    result = run_arrays(crash_file, bus_stop_file, adjacency_dir=None)
+
+    assert result['summary'] == expected['summary']
+    pd.testing.assert_frame_equal(result['aggregates'], expected['aggregates'])
+    pd.testing.assert_frame_equal(result['top_stops'], expected['top_stops'])
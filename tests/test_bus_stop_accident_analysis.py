@@ -0,0 +1,45 @@
+import pytest
+
+import pipeline
+from bus_stop_accident_analysis import (
+    calculate_accidents_near_bus_stops, calculate_accidents_near_bus_stops_streaming, calculate_accident_radius_sweep,
+    load_data, clean_data
+)
+from crash_store import ingest_crashes, read_bus_stops
+
+
+@pytest.mark.parametrize('store', [False, True])
+@pytest.mark.parametrize('chunksize', [500, 1000, 7000])
+def test_streaming_matches_in_memory(crash_copy, tmp_path, store, chunksize):
+    crash_file, bus_stop_file = crash_copy
+    if store:
+        ingest_crashes(crash_file)
+    crashes, bus_stops = clean_data(*load_data(crash_file, bus_stop_file))
+    expected = calculate_accidents_near_bus_stops(crashes, bus_stops.copy())
+
+    streamed_stops = bus_stops.copy()
+    assert calculate_accidents_near_bus_stops_streaming(crash_file, streamed_stops, chunksize=chunksize) == expected
+
+    # Per-stop totals match the shared pipeline's aggregates too
+    aggregates = pipeline.run_pipeline(crash_file, bus_stop_file, cache_dir=str(tmp_path / 'cache'),
+                                         adjacency_dir=None)['aggregates']
+    assert streamed_stops['crash_count'].tolist() == aggregates['crash_count'].tolist()
+    for column in pipeline.AGGREGATE_COLUMNS:
+        assert streamed_stops[column].tolist() == aggregates[column].tolist()
+
+
+def test_streaming_without_any_match(crash_copy):
+    crash_file, bus_stop_file = crash_copy
+    _, bus_stops = pipeline.clean_data(pipeline.load_data(crash_file, bus_stop_file)[0], read_bus_stops(bus_stop_file))
+    with_accidents, without_accidents, total = calculate_accidents_near_bus_stops_streaming(
+        crash_file, bus_stops, distance=0.001, chunksize=1000
+    )
+    assert (with_accidents, without_accidents, total) == (0, len(bus_stops), len(bus_stops))
+
+
+def test_radius_sweep_matches_single_radius(synthetic_files):
+    crashes, bus_stops = clean_data(*load_data(*synthetic_files))
+    sweep = calculate_accident_radius_sweep(crashes, bus_stops, radii=[50, 150, 300]).set_index('radius_ft')
+    for radius in (50, 150, 300):
+        with_accidents, _, _ = calculate_accidents_near_bus_stops(crashes, bus_stops.copy(), distance=radius)
+        assert sweep.loc[radius, 'bus_stops_with_accidents'] == with_accidents
@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from cli import build_parser
+
+
+def test_profile_before_subcommand():
+    args = build_parser().parse_args(['--profile', 'top'])
+    assert args.profile
+    assert args.command == 'top'
+    assert args.profile_report is None
+
+
+def test_profile_report_path():
+    args = build_parser().parse_args(['--profile-report', 'stages.csv', 'proximity', '--radius', '200'])
+    assert args.profile_report == 'stages.csv'
+    assert args.command == 'proximity'
+    assert args.radius == 200
+
+
+def test_no_profile_by_default():
+    args = build_parser().parse_args(['top'])
+    assert not args.profile
+    assert args.profile_report is None
+    assert args.profile_stage is None
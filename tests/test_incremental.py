@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from incremental import build_state, apply_delta
+
+
+VALUE_COLUMNS = ['crash_count', 'has_accident', 'NUMBER OF PEDESTRIANS INJURED', 'NUMBER OF MOTORIST KILLED']
+
+
+def _split(crash_file, tmp_path, delta_rows):
+    """Write the crash file without `delta_rows` as the base and those rows as the delta CSV."""
+    crashes = pd.read_csv(crash_file, low_memory=False)
+    base_file = str(tmp_path / 'base.csv')
+    delta_file = str(tmp_path / 'delta.csv')
+    crashes.drop(index=delta_rows).to_csv(base_file, index=False)
+    crashes.loc[delta_rows].to_csv(delta_file, index=False)
+    return crashes, base_file, delta_file
+
+
+def _assert_matches_rebuild(crash_file, bus_stop_file, state_dir, tmp_path):
+    aggregates = pd.read_parquet(f"{state_dir}/aggregates.parquet")
+    rebuilt = build_state(crash_file, bus_stop_file, state_dir=str(tmp_path / 'rebuilt'))
+    pd.testing.assert_frame_equal(aggregates[VALUE_COLUMNS], rebuilt[VALUE_COLUMNS], check_dtype=False)
+
+
+@pytest.mark.parametrize('delta_size', [1, 200])
+def test_only_new_crashes_match_rebuild(crash_copy, tmp_path, delta_size):
+    crash_file, bus_stop_file = crash_copy
+    crashes = pd.read_csv(crash_file, low_memory=False)
+    _, base_file, delta_file = _split(crash_file, tmp_path, crashes.index[-delta_size:])
+
+    state_dir = str(tmp_path / 'state')
+    build_state(base_file, bus_stop_file, state_dir=state_dir)
+    apply_delta(delta_file, bus_stop_file, state_dir=state_dir)
+    _assert_matches_rebuild(crash_file, bus_stop_file, state_dir, tmp_path)
+
+
+def test_delta_without_matches(crash_copy, tmp_path):
+    crash_file, bus_stop_file = crash_copy
+    crashes = pd.read_csv(crash_file, low_memory=False)
+    # New crashes far from every shelter: nothing to retract and nothing to add
+    delta = crashes.head(3).assign(LATITUDE=40.0, LONGITUDE=-75.0, COLLISION_ID=[1, 2, 3])
+    delta_file = str(tmp_path / 'delta.csv')
+    delta.to_csv(delta_file, index=False)
+
+    state_dir = str(tmp_path / 'state')
+    before = build_state(crash_file, bus_stop_file, state_dir=state_dir)
+    apply_delta(delta_file, bus_stop_file, state_dir=state_dir)
+    after = pd.read_parquet(f"{state_dir}/aggregates.parquet")
+    pd.testing.assert_frame_equal(after[VALUE_COLUMNS], before[VALUE_COLUMNS], check_dtype=False)
+
+
+def test_updated_crashes_match_rebuild(crash_copy, tmp_path):
+    crash_file, bus_stop_file = crash_copy
+    state_dir = str(tmp_path / 'state')
+    build_state(crash_file, bus_stop_file, state_dir=state_dir)
+
+    # Re-send some collisions with more injuries, and write the same edit into the full file
+    crashes = pd.read_csv(crash_file, low_memory=False)
+    edited = crashes.index[:300]
+    crashes.loc[edited, 'NUMBER OF PEDESTRIANS INJURED'] += 2
+    delta_file = str(tmp_path / 'delta.csv')
+    crashes.loc[edited].to_csv(delta_file, index=False)
+    updated_file = str(tmp_path / 'updated.csv')
+    crashes.to_csv(updated_file, index=False)
+
+    apply_delta(delta_file, bus_stop_file, state_dir=state_dir)
+    _assert_matches_rebuild(updated_file, bus_stop_file, state_dir, tmp_path)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+from adjacency import load_adjacency, pairs as adjacency_pairs
+from parallel_join import parallel_join_within
+from spatial_index import join_within
+
+
+def _points(synthetic_files):
+    crashes, bus_stops = pipeline.load_data(*synthetic_files, columns=pipeline.CRASH_COLUMNS)
+    crashes, bus_stops = pipeline.project(*pipeline.clean_data(crashes, bus_stops))
+    return crashes[['x_ft', 'y_ft']].to_numpy(), bus_stops[['x_ft', 'y_ft']].to_numpy()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('tile_size_ft', [150, 1000, 5280])
+def test_parallel_join_matches_serial(synthetic_files, workers, tile_size_ft):
+    crashes_xy, stops_xy = _points(synthetic_files)
+    expected = join_within(crashes_xy, stops_xy, 150)
+    assert not expected.empty
+    pd.testing.assert_frame_equal(
+        parallel_join_within(crashes_xy, stops_xy, 150, workers=workers, tile_size_ft=tile_size_ft), expected
+    )
+
+
+def test_parallel_join_without_matches(synthetic_files):
+    crashes_xy, stops_xy = _points(synthetic_files)
+    pd.testing.assert_frame_equal(parallel_join_within(crashes_xy, stops_xy, 0.001, workers=2),
+                                  join_within(crashes_xy, stops_xy, 0.001))
+
+
+def test_persisted_adjacency_matches_fresh_build(synthetic_files, tmp_path):
+    crashes_xy, stops_xy = _points(synthetic_files)
+    expected = join_within(crashes_xy, stops_xy, 150)
+    adjacency_dir = str(tmp_path / 'adjacency')
+    # Built in parallel and persisted, then read back from disk
+    for workers in (2, None):
+        pairs = adjacency_pairs(load_adjacency(crashes_xy, stops_xy, 150, workers=workers, adjacency_dir=adjacency_dir))
+        assert np.array_equal(pairs['crash_index'], expected['crash_index'])
+        assert np.array_equal(pairs['stop_index'], expected['stop_index'])
+        assert np.allclose(pairs['distance_ft'], expected['distance_ft'])
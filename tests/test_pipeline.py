@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import pipeline
+
+
+def _frames(crash_file, bus_stop_file):
+    crashes, bus_stops = pipeline.load_data(crash_file, bus_stop_file,
+                                            columns=pipeline.CRASH_COLUMNS + pipeline.AGGREGATE_COLUMNS)
+    return pipeline.project(*pipeline.clean_data(crashes, bus_stops))
+
+
+def test_stop_totals_without_matches():
+    totals = pipeline.stop_totals(np.array([], dtype=np.int64), np.zeros((0, 3)), 4)
+    assert totals.shape == (4, 4)
+    assert not totals.any()
+
+
+def test_stop_totals_single_column():
+    totals = pipeline.stop_totals(np.array([0, 2, 2]), np.array([1, 2, 3]), 3)
+    assert totals.tolist() == [[1, 1], [0, 0], [2, 5]]
+
+
+def test_aggregate_empty_join(synthetic_files):
+    crashes, bus_stops = _frames(*synthetic_files)
+    pairs = pipeline.join(crashes, bus_stops, radius_ft=0.001)
+    assert pairs.empty
+    aggregates = pipeline.aggregate(crashes, bus_stops, pairs)
+    assert len(aggregates) == len(bus_stops)
+    assert (aggregates['crash_count'] == 0).all()
+    assert not aggregates['has_accident'].any()
+
+
+def test_join_matches_brute_force(synthetic_files):
+    crashes, bus_stops = _frames(*synthetic_files)
+    pairs = pipeline.join(crashes, bus_stops, radius_ft=150)
+
+    crashes_xy = crashes[['x_ft', 'y_ft']].to_numpy()
+    stops_xy = bus_stops[['x_ft', 'y_ft']].to_numpy()
+    counts = np.array([(np.hypot(*(crashes_xy - stop).T) <= 150).sum() for stop in stops_xy])
+    assert np.array_equal(np.bincount(pairs['stop_index'], minlength=len(stops_xy)), counts)
+    pd.testing.assert_series_equal(
+        pairs['distance_ft'],
+        pd.Series(np.hypot(*(crashes_xy[pairs['crash_index']] - stops_xy[pairs['stop_index']]).T), name='distance_ft')
+    )
+
+
+def test_aggregate_stage_times_only_aggregate(synthetic_files, tmp_path):
+    def stages():
+        instrumentation.enable(str(tmp_path / 'stages.json'), trace_memory=False)
+        try:
+            pipeline.run_pipeline(*synthetic_files, cache_dir=str(tmp_path / 'cache'), adjacency_dir=None)
+            return [(record['stage'], record['depth'], record.get('cache_hit'))
+                    for record in instrumentation._recorder.records]
+        finally:
+            instrumentation.finish()
+
+    assert stages() == [('load', 0, None), ('clean', 0, None), ('project', 0, None), ('join', 0, None),
+                        ('aggregate', 0, False)]
+    assert stages() == [('aggregate', 0, True)]
@@ -0,0 +1,47 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from array_store import export_arrays
+from query_service import QueryService, load_index
+
+
+@pytest.fixture
+def service(crash_copy):
+    crash_file, bus_stop_file = crash_copy
+    export_arrays(crash_file)
+    return QueryService(load_index(crash_file, bus_stop_file))
+
+
+def _dispatch_all(service, targets):
+    async def run():
+        return await asyncio.gather(*(service.dispatch(target) for target in targets))
+    return asyncio.run(run())
+
+
+def test_near_matches_brute_force(service):
+    stop = service.index.bus_stops.iloc[0]
+    (status, payload), = _dispatch_all(service, [f"/near?lat={stop['latitude']}&lon={stop['longitude']}&radius=300"])
+    assert status == 200
+    distance_ft = np.hypot(*(service.index.xy - service.index.stops_xy[0]).T)
+    assert payload['crash_count'] == int((distance_ft <= 300).sum())
+
+
+@pytest.mark.parametrize('query', ['lat=nan&lon=-73.9', 'lat=40.7&lon=inf', 'lat=95&lon=-73.9', 'lat=40.7&lon=-200'])
+def test_bad_point_does_not_fail_its_batch(service, query):
+    stop = service.index.bus_stops.iloc[0]
+    good = f"/near?lat={stop['latitude']}&lon={stop['longitude']}"
+    responses = _dispatch_all(service, [good, f"/near?{query}", good.replace('/near?', '/near?radius=200&')])
+    assert [status for status, _ in responses] == [200, 400, 200]
+
+
+def test_unprojectable_point_is_not_batched(service):
+    async def run():
+        batcher = service.batcher
+        futures = [batcher.submit(service.index.stops_xy[0], 150), batcher.submit(np.array([np.inf, 0.0]), 150)]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    found, error = asyncio.run(run())
+    assert isinstance(found, np.ndarray)
+    assert getattr(error, 'status', None) == 400
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import pipeline
+from crash_store import read_crashes, read_bus_stops
+from street_matcher import build_intersection_index, fill_missing_coordinates, normalize_streets
+
+
+def _bus_stops():
+    return pd.DataFrame({
+        'BoroName': ['Manhattan', 'Brooklyn'],
+        'On_Street': ['West 96th Street', 'Flatbush Avenue'],
+        'Cross_Stre': ['Broadway', 'Atlantic Ave'],
+        'Latitude': [40.7938, 40.6843],
+        'Longitude': [-73.9723, -73.9772]
+    })
+
+
+def _crashes():
+    return pd.DataFrame({
+        'BOROUGH': ['MANHATTAN', 'MANHATTAN', 'BROOKLYN', 'QUEENS'],
+        'ON STREET NAME': ['BROADWAY', 'W 96 ST', 'ATLANTIC AVENUE', 'NOWHERE ROAD'],
+        'CROSS STREET NAME': ['WEST 96 STREET', 'BROADWAY', 'FLATBUSH AV', 'MAIN STREET'],
+        'LATITUDE': [np.nan, 40.7940, np.nan, np.nan],
+        'LONGITUDE': [np.nan, -73.9721, np.nan, np.nan]
+    })
+
+
+def test_normalize_streets():
+    assert list(normalize_streets(['West 96th Street', 'W 96 ST', 'flatbush avenue'])) == ['W 96 ST', 'W 96 ST', 'FLATBUSH AV']
+
+
+def test_recovers_crash_at_intersection():
+    crashes = _crashes()
+    index = build_intersection_index(_bus_stops(), crashes)
+    matched = fill_missing_coordinates(crashes, index, min_confidence=0)
+
+    assert matched['match_level'].iloc[:3].tolist() == ['borough', 'geocoded', 'borough']
+    assert pd.isna(matched.loc[3, 'match_level'])
+    # The shelter and the geocoded crash at the same corner are averaged
+    assert np.isclose(matched.loc[0, 'LATITUDE'], (40.7938 + 40.7940) / 2)
+    assert np.isclose(matched.loc[2, 'LATITUDE'], 40.6843) and np.isclose(matched.loc[2, 'LONGITUDE'], -73.9772)
+    assert np.isnan(matched.loc[3, 'LATITUDE'])
+    # The input frame is left alone
+    assert crashes['LATITUDE'].isna().sum() == 3
+
+
+def test_confidence_floor_leaves_crashes_missing():
+    crashes = _crashes()
+    matched = fill_missing_coordinates(crashes, build_intersection_index(_bus_stops(), crashes), min_confidence=1.0)
+    assert matched['LATITUDE'].isna().sum() == 3
+
+
+def test_clean_data_recovers_synthetic_crashes(synthetic_files):
+    crash_file, bus_stop_file = synthetic_files
+    columns = pipeline.CRASH_COLUMNS + pipeline.STREET_COLUMNS
+    crashes, bus_stops = read_crashes(crash_file, columns=columns), read_bus_stops(bus_stop_file)
+
+    plain, _ = pipeline.clean_data(crashes, bus_stops)
+    recovered, _ = pipeline.clean_data(crashes, bus_stops, recover_min_confidence=0.2)
+    assert len(recovered) > len(plain)
+    assert recovered[['x_ft', 'y_ft']].notna().all().all()